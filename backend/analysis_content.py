@@ -0,0 +1,900 @@
+"""
+Text content of the deterministic diagnostic analysis (`analyze_diagnostic`).
+
+Every block of text lives in `TEMPLATES`, keyed by section and score band
+(e.g. "recommendation.acquisition.low", "transition.structureAnalysis.high").
+Placeholders use `str.format` syntax and are filled from the per-request
+variables: first_name, city, total, structure, acquisition, value,
+structure_pct, acquisition_pct, value_pct, structure_gap, weakest.
+
+The complete analysis is compiled per band layout (`compile_analysis`) into
+a plain function that builds the final JSON-ready structure, so a request
+only picks bands and substitutes: one function call renders every section
+of the response.
+
+The same table is published to clients as a versioned content bundle
+(`CONTENT_BUNDLE`, identified by `CONTENT_VERSION`, a digest of its JSON):
+a client holding the bundle only needs a layout's section IDs
+(`compile_analysis(...).sections`) and the variables to render it.
+"""
+import hashlib
+import json
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Callable, Dict, Mapping, Tuple
+
+
+class Var:
+    """Placeholder for a non-text value (e.g. an int percentage), inserted as is"""
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+def _analysis(score: str, percentage: str, status: str, diagnostic: str, quick_wins: list) -> dict:
+    return {
+        "score": score,
+        "percentage": Var(percentage),
+        "status": status,
+        "diagnostic": diagnostic,
+        "quickWins": quick_wins
+    }
+
+
+# ============================================
+# RECOMMANDATION PERSONNALISÉE (goodtimeRecommendation)
+# ============================================
+
+_RESULTS_HEADER = """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+💎 CE QUE TU PEUX ATTENDRE
+
+En mettant en place les bonnes actions :
+"""
+
+_RESULTS_ORGANIZATION = {
+    "early": """✅ Une organisation qui tourne de façon fluide
+✅ Du temps libéré pour te concentrer sur le développement""",
+    "mature": """✅ Une organisation encore plus efficace et scalable
+✅ Plus de temps pour les projets stratégiques"""
+}
+
+_RESULTS_ACQUISITION = {
+    "developing": """
+✅ Un flux régulier de nouveaux propriétaires intéressés
+✅ Un système d'acquisition qui travaille pour toi""",
+    "established": """
+✅ Une acquisition amplifiée et optimisée
+✅ Une croissance maîtrisée et prévisible"""
+}
+
+_RESULTS_COMMON = """
+✅ Une activité solide et pérenne
+✅ Des coûts optimisés et une meilleure rentabilité
+✅ La sérénité d'avoir les bonnes fondations"""
+
+RECOMMENDATION_TEMPLATES = {
+    # Intro selon le profil - toujours valorisante
+    "recommendation.intro.strong": """🎯 CE QUE GOODTIME VA T'APPORTER
+
+{first_name}, bravo pour le travail accompli. Avec {structure}/20 en structure et {acquisition}/18 en acquisition, tu fais partie des conciergeries les mieux organisées du marché.
+
+Tu as construit des bases solides. La question maintenant : comment aller encore plus loin ? Comment passer de "ça tourne bien" à "ça cartonne" ?
+
+On accompagne les conciergeries performantes comme la tienne pour maximiser leur potentiel et accélérer leur croissance.""",
+    "recommendation.intro.structured": """🎯 CE QUE GOODTIME VA T'APPORTER
+
+{first_name}, tu as fait un vrai travail de structuration ({structure}/20). C'est une base solide sur laquelle construire.
+
+Le prochain levier de croissance pour toi, c'est l'acquisition ({acquisition}/18). Les propriétaires cherchent des conciergeries comme la tienne - il s'agit maintenant de te rendre visible auprès d'eux.
+
+C'est exactement notre spécialité : construire des systèmes d'acquisition qui génèrent des leads qualifiés de façon prévisible.""",
+    "recommendation.intro.acquirer": """🎯 CE QUE GOODTIME VA T'APPORTER
+
+{first_name}, tu as une vraie force : tu sais attirer des propriétaires ({acquisition}/18 en acquisition). C'est un talent que beaucoup de conciergeries n'ont pas.
+
+Pour capitaliser sur cette force, l'étape suivante est de renforcer ton organisation ({structure}/20). Ça te permettra d'absorber plus de volume sereinement et de libérer du temps pour ce que tu fais de mieux.
+
+On va t'aider à consolider tes fondations pour que ta croissance soit fluide.""",
+    "recommendation.intro.early": """🎯 CE QUE GOODTIME VA T'APPORTER
+
+{first_name}, comme beaucoup de gérants de conciergerie, tu portes beaucoup de casquettes au quotidien. C'est normal quand on construit son activité.
+
+La bonne nouvelle : il existe des méthodes éprouvées pour structurer ton organisation et te libérer du temps. C'est exactement ce qu'on fait chez Goodtime : on t'accompagne pour mettre en place des systèmes qui tournent, même quand tu n'es pas derrière.
+
+Tu as déjà l'essentiel : l'expertise terrain et la connaissance de tes clients. On t'apporte la méthode et les outils.""",
+    "recommendation.intro.default": """🎯 CE QUE GOODTIME VA T'APPORTER
+
+{first_name}, ton diagnostic révèle un profil avec de vraies opportunités de développement : {structure}/20 en structure, {acquisition}/18 en acquisition, {value}/6 en valeur.
+
+On travaille avec des conciergeries à différents stades de maturité. Notre rôle : identifier les leviers de croissance les plus impactants pour TA situation et t'accompagner dans leur mise en place.""",
+
+    # Structure - adaptée au niveau
+    "recommendation.structure.low": """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🔧 GAGNER DU TEMPS AU QUOTIDIEN
+
+Avec {structure}/20 en structure, il y a une belle marge de progression pour te simplifier la vie.
+
+Ce qu'on met en place avec toi :
+• Des process clairs et simples que ton équipe/prestataires peuvent suivre facilement
+• Un système de gestion centralisé qui te fait gagner des heures chaque semaine
+• Une organisation où tu peux te concentrer sur ce qui compte vraiment
+
+Notre équipe peut aussi prendre en charge certaines tâches (back-office, support) pour accélérer cette transition.""",
+    "recommendation.structure.mid": """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🔧 OPTIMISER CE QUI FONCTIONNE
+
+Ta structure est bien en place ({structure}/20). Il reste quelques ajustements pour la rendre encore plus efficace :
+• Identifier et éliminer les derniers points de friction
+• Automatiser ce qui peut encore l'être
+• Préparer ton organisation à absorber plus de volume
+
+On t'aide à passer de "ça fonctionne" à "c'est fluide et scalable".""",
+    "recommendation.structure.high": """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+✅ UNE STRUCTURE SOLIDE
+
+Avec {structure}/20, tu as fait un excellent travail d'organisation. C'est une vraie force.
+
+On va capitaliser sur cette base pour travailler les autres leviers de croissance.""",
+
+    # Acquisition - adaptée au niveau
+    "recommendation.acquisition.low": """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🚀 DÉVELOPPER TON ACQUISITION
+
+Avec {acquisition}/18 en acquisition, c'est LE levier qui peut transformer ton activité.
+
+C'est notre spécialité. On va CONSTRUIRE avec toi :
+• Un site web optimisé qui te rend visible des propriétaires de {city}
+• Une fiche Google Business qui génère des contacts réguliers
+• Une stratégie de contenu qui te positionne comme une référence locale
+• Un process de conversion pour transformer les contacts en clients
+
+Ce système T'APPARTIENT. Et si tu préfères, on peut l'opérer pour toi.""",
+    "recommendation.acquisition.developing": """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🚀 STRUCTURER TON ACQUISITION
+
+Avec {acquisition}/18, tu génères déjà des contacts. L'objectif maintenant : rendre ça prévisible.
+
+On va structurer et amplifier ce qui fonctionne :
+• Optimiser tes canaux actuels (SEO, Google Business, réseaux)
+• Mettre en place un vrai suivi des prospects
+• Activer de nouveaux canaux adaptés à {city}
+• Créer de la régularité dans ton flux de nouveaux propriétaires""",
+    "recommendation.acquisition.established": """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🚀 AMPLIFIER TON ACQUISITION
+
+Ton acquisition fonctionne bien ({acquisition}/18). L'opportunité : passer à l'échelle supérieure.
+
+On peut activer des leviers plus puissants :
+• Campagnes publicitaires ciblées propriétaires
+• Partenariats stratégiques (agents immobiliers, notaires)
+• Expansion géographique si tu veux sortir de {city}
+• Automatisation pour convertir encore mieux""",
+    "recommendation.acquisition.high": """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+✅ UNE ACQUISITION PERFORMANTE
+
+Avec {acquisition}/18, ton système d'acquisition fonctionne très bien. Bravo !
+
+On peut t'aider à l'optimiser (réduire le coût par contact, améliorer la conversion) ou à le dupliquer si tu veux t'étendre géographiquement.""",
+
+    # Valeur - seulement si pertinent
+    "recommendation.value.low": """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+💎 CONSTRUIRE UN ACTIF DURABLE
+
+Avec {value}/6 en valeur, il y a une opportunité de renforcer la pérennité de ton activité.
+
+On travaille sur :
+• La formalisation de tes contrats propriétaires
+• La création de process reproductibles
+• La documentation de ton modèle pour qu'il soit solide dans la durée""",
+
+    # Optimisation des coûts - profil avancé / en développement
+    "recommendation.costs.advanced": """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+💰 OPTIMISATION DE TES COÛTS
+
+Avec une structure déjà en place, on peut travailler sur l'optimisation de ta rentabilité :
+• Audit de tes coûts prestataires (ménage, linge, maintenance) et renégociation
+• Mutualisation des ressources pour réduire le coût par logement
+• Automatisation des tâches répétitives pour gagner en efficacité
+• Accès à notre réseau de prestataires partenaires à tarifs négociés
+
+Nos clients constatent en moyenne 15-25% d'économies sur leurs coûts opérationnels.""",
+    "recommendation.costs.developing": """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+💰 OPTIMISER TES COÛTS DÈS LE DÉPART
+
+Bonne nouvelle : en structurant ton activité, tu vas aussi réduire tes coûts.
+
+Ce qu'on met en place :
+• Des process efficaces qui évitent les erreurs coûteuses
+• Une meilleure négociation avec tes prestataires grâce à notre expertise
+• Accès à notre réseau de partenaires à tarifs préférentiels
+• Des outils qui te font gagner du temps (= de l'argent)
+
+Structurer ne coûte pas plus cher - ça permet de dépenser plus intelligemment.""",
+
+    "recommendation.system": """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🔧 LE SYSTÈME GOODTIME
+
+On n'est pas des consultants qui donnent des conseils et disparaissent. On est des partenaires opérationnels.
+
+Concrètement, on implémente chez toi :
+• Nos outils éprouvés (process, templates, systèmes de gestion)
+• Notre équipe si tu veux déléguer certaines fonctions
+• Nos méthodes testées sur des dizaines de conciergeries
+• Notre réseau de prestataires partenaires à tarifs négociés
+
+Tu n'es plus seul. Tu as une équipe qui travaille AVEC toi.""",
+    "recommendation.process": """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+📅 COMMENT ÇA SE PASSE ?
+
+1️⃣ APPEL DÉCOUVERTE (30 min)
+On échange sur ta situation, tes objectifs, et on voit ensemble comment on peut t'aider.
+
+2️⃣ AUDIT PERSONNALISÉ
+On analyse en détail ta conciergerie pour identifier les meilleures opportunités.
+
+3️⃣ PLAN D'ACTION SUR MESURE
+Un plan adapté à TON profil avec des étapes claires sur 3 - 6 - 9 - 12 mois.
+
+4️⃣ ACCOMPAGNEMENT
+On déploie les outils, on t'accompagne dans la mise en place, et on ajuste en continu.""",
+    "recommendation.cta": """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+⚡ PRÊT À PASSER À L'ACTION ?
+
+Le marché de la location courte durée est en pleine croissance. Les propriétaires à {city} et ailleurs cherchent des conciergeries professionnelles sur qui compter.
+
+Tu as déjà l'expertise terrain. Avec les bons outils et le bon accompagnement, tu peux vraiment passer au niveau supérieur.
+
+👉 Si tu n'as pas encore réservé ton appel découverte, c'est le moment !
+
+C'est gratuit, sans engagement, et tu repartiras avec :
+• Une analyse détaillée de ta situation
+• Des recommandations concrètes adaptées à ton profil
+• Un plan d'action clair pour avancer"""
+}
+
+for _organization, _organization_lines in _RESULTS_ORGANIZATION.items():
+    for _acquisition, _acquisition_lines in _RESULTS_ACQUISITION.items():
+        RECOMMENDATION_TEMPLATES[f"recommendation.results.{_organization}.{_acquisition}"] = (
+            _RESULTS_HEADER + _organization_lines + _acquisition_lines + _RESULTS_COMMON
+        )
+
+
+# ============================================
+# BLOCAGE PRINCIPAL ET PRIORITÉ
+# ============================================
+
+BLOCKER_TEMPLATES = {
+    "blocker.none": {
+        "mainBlocker": "Aucun blocage majeur identifié",
+        "priority": "Optimisation des coûts, expansion géographique, ou préparation à la valorisation/revente."
+    },
+    "blocker.optimize_acquisition": {
+        "mainBlocker": "Optimisation du système d'acquisition",
+        "priority": "Amplifier et automatiser ton acquisition pour accélérer la croissance."
+    },
+    "blocker.optimize_structure": {
+        "mainBlocker": "Optimisation des process internes",
+        "priority": "Affiner et automatiser tes process pour gagner en efficacité."
+    },
+    "blocker.optimize_value": {
+        "mainBlocker": "Renforcement de la valorisation",
+        "priority": "Formaliser les éléments qui rendent ton entreprise autonome et valorisable."
+    },
+    "blocker.acquisition": {
+        "mainBlocker": "Développer un système d'acquisition prévisible",
+        "priority": "Mettre en place un moteur d'acquisition structuré pour générer des leads réguliers à {city}."
+    },
+    "blocker.structure": {
+        "mainBlocker": "Structurer l'organisation interne",
+        "priority": "Documenter les process clés et mettre en place des systèmes pour libérer du temps."
+    },
+    "blocker.value": {
+        "mainBlocker": "Construire une entreprise autonome",
+        "priority": "Réduire la dépendance au gérant et formaliser les contrats pour créer un actif pérenne."
+    },
+    "blocker.amplify_acquisition": {
+        "mainBlocker": "Amplifier l'acquisition",
+        "priority": "Structurer et accélérer ton système d'acquisition pour une croissance prévisible."
+    },
+    "blocker.strengthen_structure": {
+        "mainBlocker": "Optimiser l'organisation",
+        "priority": "Renforcer les process pour absorber plus de volume sereinement."
+    },
+    "blocker.prepare_value": {
+        "mainBlocker": "Préparer la valorisation",
+        "priority": "Formaliser les éléments qui rendent ton entreprise autonome et attractive."
+    }
+}
+
+
+# ============================================
+# DIAGNOSTIC SUMMARY
+# ============================================
+
+SUMMARY_TEMPLATES = {
+    "summary.excellence": """{first_name}, félicitations ! Avec {total}/44, tu fais partie des conciergeries les plus structurées du marché.
+
+Tu as mis en place une vraie organisation ({structure}/20), un système d'acquisition qui fonctionne ({acquisition}/18), et une entreprise qui peut tourner de façon autonome ({value}/6).
+
+À ce stade, les opportunités sont l'optimisation des coûts, l'expansion géographique, ou la préparation d'une valorisation/revente si c'est dans tes projets.""",
+    "summary.solid": """{first_name}, avec {total}/44, tu as construit une conciergerie solide.
+
+Ton organisation est en place ({structure}/20), ton acquisition fonctionne ({acquisition}/18). Tu fais clairement partie des conciergeries au-dessus de la moyenne.
+
+L'opportunité maintenant : optimiser ce qui existe et accélérer ta croissance sur des bases saines.""",
+    "summary.structured": """{first_name}, avec {total}/44, tu as une base organisationnelle solide ({structure}/20).
+
+Le principal levier de croissance pour toi est l'acquisition ({acquisition}/18). Tu as la structure pour absorber plus de volume - il s'agit maintenant de mettre en place un système pour attirer des propriétaires de façon régulière.""",
+    "summary.acquirer": """{first_name}, avec {total}/44, tu as une vraie force : tu sais attirer des propriétaires ({acquisition}/18).
+
+Pour capitaliser sur cette force, l'étape suivante est de renforcer ton organisation ({structure}/20). Ça te permettra d'absorber ta croissance sereinement et de libérer du temps pour le développement.""",
+    "summary.early": """{first_name}, avec {total}/44, tu es au début de la structuration de ta conciergerie.
+
+C'est une étape normale dans le développement d'une activité. Les deux leviers principaux pour toi sont l'organisation interne ({structure}/20) et l'acquisition ({acquisition}/18).
+
+La bonne nouvelle : avec les bonnes méthodes, tu peux progresser rapidement sur ces deux axes.""",
+    "summary.default": """{first_name}, avec {total}/44, ta conciergerie a des bases sur lesquelles construire.
+
+Structure : {structure}/20 | Acquisition : {acquisition}/18 | Valeur : {value}/6
+
+On va identifier ensemble les leviers les plus impactants pour ta situation."""
+}
+
+
+# ============================================
+# SEGMENT ARTISANAL (0-18 points)
+# ============================================
+
+_ARTISANAL_STRUCTURE_DIAGNOSTIC = """Ton organisation interne est ton plus gros frein. Tu passes probablement 80% de ton temps dans l'opérationnel : gérer les voyageurs, éteindre des feux, courir après le ménage, répondre aux propriétaires.
+
+Résultat : tu n'as jamais le temps de travailler SUR ton business au lieu de travailler DANS ton business.
+
+Ce que ça te coûte concrètement :
+• Des nuits et week-ends sacrifiés pour des urgences qui pourraient être évitées
+• Une croissance bridée : tu ne peux pas prendre plus de logements car tu es déjà au max
+• Un épuisement qui s'accumule et qui finira par te rattraper
+• Zéro valorisation : sans toi, ta conciergerie ne vaut rien"""
+
+_ARTISANAL_STRUCTURE_QUICK_WINS = [
+    "Documente ta checklist ménage en 1h - c'est la tâche qui te prend le plus de temps",
+    "Crée un message type pour les 5 questions voyageurs les plus fréquentes",
+    "Identifie LA personne qui pourrait te remplacer sur UNE tâche cette semaine"
+]
+
+_ARTISANAL_ACQUISITION_DIAGNOSTIC = """Tu vis au rythme du hasard. Tes nouveaux propriétaires arrivent par bouche-à-oreille, par chance, ou parce que tu as croisé quelqu'un au bon moment.
+
+Ce n'est pas un moteur d'acquisition, c'est de la loterie.
+
+Le problème : tu ne contrôles pas ta croissance. Un mois tu signes 3 propriétaires, le mois suivant zéro. Tu ne peux pas prévoir, pas planifier, pas investir sereinement.
+
+Ce que font les conciergeries structurées :
+• Elles ont un site web optimisé qui capte des leads locaux chaque semaine
+• Leur fiche Google Business génère des appels entrants réguliers
+• Elles ont un process de suivi des leads qui ne laisse personne filer"""
+
+_ARTISANAL_ACQUISITION_QUICK_WINS = [
+    "Crée ou optimise ta fiche Google Business cette semaine",
+    "Demande un avis Google à tes 3 meilleurs propriétaires",
+    "Note dans un tableau tous les leads reçus ce mois-ci et leur origine"
+]
+
+_ARTISANAL_VALUE_DIAGNOSTIC = """Parlons cash : combien vaut ta conciergerie aujourd'hui si tu veux la vendre ?
+
+La réponse honnête : presque rien. Peut-être quelques mois de chiffre d'affaires, au mieux.
+
+Pourquoi ? Parce qu'un acheteur potentiel voit :
+• Une activité qui dépend à 100% de toi
+• Des propriétaires qui sont "tes" clients, pas ceux de l'entreprise
+• Aucun process documenté, aucune organisation reproductible
+• Zéro prévisibilité sur l'acquisition de nouveaux logements
+
+Compare avec une conciergerie structurée qui se vend 3 à 5x son CA annuel :
+• Des process clairs que n'importe qui peut suivre
+• Des contrats propriétaires solides avec la structure, pas avec une personne
+• Un moteur d'acquisition qui génère des leads prévisibles
+• Un gérant qui pilote au lieu de tout faire lui-même"""
+
+_ARTISANAL_VALUE_QUICK_WINS = [
+    "Fais signer des contrats en bonne et due forme à tous tes propriétaires",
+    "Crée une adresse email pro (contact@taconciergerie.fr) pour toutes les communications",
+    "Commence à parler de 'nous' et de 'l'équipe' même si tu es seul"
+]
+
+ARTISANAL_TEMPLATES = {
+    "artisanal.structureAnalysis.low": _analysis("{structure}/20", "structure_pct", "critique", _ARTISANAL_STRUCTURE_DIAGNOSTIC, _ARTISANAL_STRUCTURE_QUICK_WINS),
+    "artisanal.structureAnalysis.high": _analysis("{structure}/20", "structure_pct", "fragile", _ARTISANAL_STRUCTURE_DIAGNOSTIC, _ARTISANAL_STRUCTURE_QUICK_WINS),
+    "artisanal.acquisitionAnalysis.low": _analysis("{acquisition}/18", "acquisition_pct", "inexistant", _ARTISANAL_ACQUISITION_DIAGNOSTIC, _ARTISANAL_ACQUISITION_QUICK_WINS),
+    "artisanal.acquisitionAnalysis.high": _analysis("{acquisition}/18", "acquisition_pct", "aléatoire", _ARTISANAL_ACQUISITION_DIAGNOSTIC, _ARTISANAL_ACQUISITION_QUICK_WINS),
+    "artisanal.valueAnalysis.low": _analysis("{value}/6", "value_pct", "nulle", _ARTISANAL_VALUE_DIAGNOSTIC, _ARTISANAL_VALUE_QUICK_WINS),
+    "artisanal.valueAnalysis.high": _analysis("{value}/6", "value_pct", "très faible", _ARTISANAL_VALUE_DIAGNOSTIC, _ARTISANAL_VALUE_QUICK_WINS),
+
+    # Leçon business sur l'investissement
+    "artisanal.investmentLesson": {
+        "titre": "La vérité que 95% des conciergeries refusent d'entendre",
+        "message": """{first_name}, il faut qu'on parle cash.
+
+Tu fais probablement partie des 95% de gérants de conciergerie qui considèrent l'investissement en communication et en acquisition comme une DÉPENSE. C'est l'erreur fatale qui condamne la majorité des conciergeries à rester des petites structures artisanales.
+
+Voici la réalité : l'investissement en acquisition n'est PAS une dépense. C'est un ACTIF.
+
+Pourquoi ? Parce que la conciergerie est un business de récurrent. Quand tu signes un propriétaire, tu ne le signes pas pour une prestation unique. Tu le signes pour des mois, voire des années de commissions récurrentes.
+
+Fais le calcul :
+• Un propriétaire te rapporte en moyenne 200-400€/mois de commission
+• Sur 12 mois, c'est 2 400 à 4 800€ de revenus récurrents
+• Sur 3 ans, c'est 7 200 à 14 400€
+
+Maintenant, combien ça coûte d'acquérir ce propriétaire ? Avec un système d'acquisition bien structuré : 100 à 300€ maximum.
+
+Le ROI est ÉNORME. Chaque euro investi en acquisition peut te rapporter 10, 20, voire 50 euros sur la durée de vie du client.
+
+Pourtant, tu hésites à investir 500€/mois en communication ? C'est comme refuser de mettre de l'essence dans une voiture qui pourrait te rapporter des milliers d'euros.
+
+Aucune entreprise sérieuse ne se développe sans investir dans sa croissance. C'est non négociable. Ce n'est pas une option, c'est une obligation si tu veux sortir du bricolage.""",
+        "keyPoints": [
+            "L'acquisition n'est pas une dépense, c'est un actif qui génère du récurrent",
+            "Le ROI de l'acquisition en conciergerie est parmi les plus élevés du marché",
+            "Ton ambition définit ton budget : plus tu veux grandir, plus tu dois investir",
+            "Pas de croissance saine et prévisible sans investissement structuré"
+        ]
+    },
+
+    # Roadmap 12 mois
+    "artisanal.roadmap": {
+        "titre": "Ton plan de transformation sur 12 mois",
+        "phases": [
+            {
+                "periode": "Mois 1-3 : Stabilisation",
+                "objectif": "Sortir la tête de l'eau",
+                "actions": [
+                    "Documenter les 5 process critiques (ménage, check-in, incidents, onboarding proprio, création annonce)",
+                    "Recruter ou former une personne pour déléguer le ménage ou le check-in",
+                    "Créer des templates de communication pour gagner 5h/semaine"
+                ]
+            },
+            {
+                "periode": "Mois 4-6 : Structuration",
+                "objectif": "Créer une vraie organisation",
+                "actions": [
+                    "Mettre en place un système centralisé de gestion des tâches",
+                    "Définir des rôles clairs (même si tu cumules plusieurs casquettes)",
+                    "Créer un tableau de bord avec tes KPIs clés (CA/logement, taux d'occupation, marge)"
+                ]
+            },
+            {
+                "periode": "Mois 7-9 : Acquisition",
+                "objectif": "Installer un moteur de croissance",
+                "actions": [
+                    "Optimiser ton site web pour le SEO local",
+                    "Activer ta fiche Google Business et collecter 20+ avis",
+                    "Créer un process de suivi des leads (CRM simple)"
+                ]
+            },
+            {
+                "periode": "Mois 10-12 : Valorisation",
+                "objectif": "Construire un actif",
+                "actions": [
+                    "Formaliser tous les contrats propriétaires",
+                    "Préparer un dossier de présentation de ta conciergerie",
+                    "Calculer ta vraie rentabilité par logement"
+                ]
+            }
+        ]
+    }
+}
+
+
+# ============================================
+# SEGMENT TRANSITION (19-32 points)
+# ============================================
+
+_TRANSITION_STRUCTURE_QUICK_WINS = [
+    "Audite tes 5 process critiques : sont-ils vraiment documentés ET utilisés ?",
+    "Crée un rituel hebdo de 30min pour suivre tes KPIs",
+    "Identifie les 2-3 tâches qui te replongent encore dans l'opérationnel"
+]
+
+_TRANSITION_ACQUISITION_QUICK_WINS = [
+    "Calcule combien de leads tu as reçus les 3 derniers mois et leur origine",
+    "Optimise ta fiche Google Business (photos, description, posts réguliers)",
+    "Mets en place un tableau de suivi des leads avec étapes de conversion"
+]
+
+_TRANSITION_VALUE_QUICK_WINS = [
+    "Revois tous tes contrats propriétaires : sont-ils au nom de ta structure ?",
+    "Crée une présentation de ta conciergerie comme si tu devais la vendre",
+    "Calcule ta vraie marge par logement (pas juste le CA)"
+]
+
+TRANSITION_TEMPLATES = {
+    "transition.structureAnalysis.high": _analysis("{structure}/20", "structure_pct", "en place mais perfectible", """Ta structure commence à tenir. Tu as des process, probablement un début d'équipe ou de prestataires fiables, et tu arrives à te dégager un peu de l'opérationnel.
+
+Mais attention : {structure_gap}% du chemin reste à faire. Les situations de crise te replongent encore dans l'opérationnel, et ta structure ne tiendrait probablement pas si tu t'absentais un mois.
+
+Ce qui te manque pour passer au niveau supérieur :
+• Des process vraiment documentés et utilisés par tous
+• Une vision claire de la performance de chaque logement
+• Un suivi régulier de tes indicateurs clés""", _TRANSITION_STRUCTURE_QUICK_WINS),
+    "transition.structureAnalysis.low": _analysis("{structure}/20", "structure_pct", "encore fragile", """Tu as posé des bases mais ta structure reste fragile. Au moindre imprévu, tu replonges dans l'opérationnel.
+
+Le risque : tu t'épuises à vouloir faire grandir quelque chose qui n'a pas les fondations pour supporter la charge. C'est comme construire un étage supplémentaire sur une maison dont les murs ne sont pas solides.
+
+Avant de penser croissance, il faut consolider :
+• Documenter et faire appliquer tes process critiques
+• Clarifier les rôles (même si tu portes plusieurs casquettes)
+• Mettre en place un vrai pilotage par les chiffres""", _TRANSITION_STRUCTURE_QUICK_WINS),
+    "transition.acquisitionAnalysis.high": _analysis("{acquisition}/18", "acquisition_pct", "des bases existent", """Tu as quelques canaux d'acquisition qui fonctionnent. C'est mieux que la majorité des conciergeries qui vivent uniquement du bouche-à-oreille.
+
+Mais avec {acquisition}/18, ton moteur d'acquisition n'est pas encore prévisible. Tu ne sais probablement pas combien de leads tu vas recevoir le mois prochain, ni quel sera ton taux de conversion.
+
+Pour passer au niveau supérieur :
+• Identifier et doubler ce qui fonctionne déjà
+• Créer un vrai pipeline de suivi des leads
+• Calculer ton coût d'acquisition par propriétaire signé""", _TRANSITION_ACQUISITION_QUICK_WINS),
+    "transition.acquisitionAnalysis.low": _analysis("{acquisition}/18", "acquisition_pct", "sous-exploité", """Ton acquisition est ton point faible. Tu as peut-être un site web, une fiche Google, mais ça ne génère pas de leads réguliers.
+
+C'est frustrant : tu sais que des propriétaires cherchent des conciergeries dans ta zone, mais ils ne te trouvent pas. Ils vont chez la concurrence ou ils restent sur Airbnb en direct.
+
+Ce que ça te coûte :
+• Une croissance au ralenti alors que le marché est là
+• Une dépendance au bouche-à-oreille qui peut s'arrêter du jour au lendemain
+• Des concurrents qui prennent les leads que tu devrais capter""", _TRANSITION_ACQUISITION_QUICK_WINS),
+    "transition.valueAnalysis.high": _analysis("{value}/6", "value_pct", "potentiel existant", """Tu as commencé à construire quelque chose qui a de la valeur. Des contrats existent, une certaine indépendance vis-à-vis de ta personne commence à se dessiner.
+
+Mais avec {value}/6, tu n'es pas encore dans la zone où un investisseur ou un acheteur dirait "je veux ça".
+
+Pour augmenter ta valorisation :
+• Formaliser tous tes contrats avec des engagements clairs
+• Réduire encore ta présence dans les relations propriétaires
+• Documenter ton modèle pour qu'il soit reproductible""", _TRANSITION_VALUE_QUICK_WINS),
+    "transition.valueAnalysis.low": _analysis("{value}/6", "value_pct", "à construire", """Aujourd'hui, ta conciergerie repose encore beaucoup sur toi. Un acheteur potentiel verrait :
+• Une activité qui tourne, mais avec des dépendances
+• Des propriétaires attachés à toi plus qu'à la structure
+• Un potentiel, mais du travail à faire pour le débloquer
+
+La bonne nouvelle : tu as les bases. En 6-12 mois de travail ciblé, tu peux multiplier ta valorisation par 2 ou 3.""", _TRANSITION_VALUE_QUICK_WINS),
+
+    # Leçon business sur l'investissement
+    "transition.investmentLesson": {
+        "titre": "Ce qui sépare les conciergeries qui stagnent de celles qui explosent",
+        "message": """{first_name}, tu es à un tournant.
+
+Tu as posé des bases, tu as une activité qui fonctionne. Mais tu ressens ce plafond de verre. Et je vais te dire pourquoi tu n'arrives pas à le franchir.
+
+95% des gérants de conciergerie font la même erreur : ils considèrent l'investissement en acquisition comme une dépense optionnelle. "Quand j'aurai plus de trésorerie, j'investirai dans la com." C'est exactement l'inverse qu'il faut faire.
+
+La conciergerie est un business de RÉCURRENT. Chaque propriétaire signé te rapporte des commissions pendant des mois, voire des années. Un propriétaire acquis pour 200€ peut te rapporter 5 000€, 10 000€ ou plus sur sa durée de vie.
+
+Le ROI de l'acquisition en conciergerie est parmi les plus élevés de tous les secteurs. Mais tu hésites à investir 1 000€/mois pour construire un moteur qui te rapportera 10x, 20x plus ?
+
+Voici la vérité : ton ambition définit ton budget.
+• Tu veux rester à ton niveau actuel ? Continue comme ça.
+• Tu veux doubler, tripler ? Il faut investir proportionnellement.
+
+Aucune entreprise sérieuse ne se développe sans investir dans sa croissance. Ce n'est pas un choix, c'est une loi du business.
+
+La différence entre toi et les conciergeries qui cartonnent ? Elles ont compris que l'investissement en acquisition est un ACTIF, pas une charge. Plus tu construis un moteur d'acquisition puissant, plus tu vas chercher de nouveaux leads, plus ton entreprise prend de la valeur.""",
+        "keyPoints": [
+            "L'acquisition est un actif qui s'apprécie, pas une dépense qui disparaît",
+            "Ton ambition définit ton budget d'investissement",
+            "Le récurrent de la conciergerie rend le ROI de l'acquisition exceptionnel",
+            "Pas de franchissement du plafond de verre sans investissement structuré"
+        ]
+    },
+
+    # Roadmap 12 mois
+    "transition.roadmap": {
+        "titre": "Ton plan d'accélération sur 12 mois",
+        "phases": [
+            {
+                "periode": "Mois 1-3 : Consolidation",
+                "objectif": "Renforcer ton point faible : {weakest}",
+                "actions": [
+                    "Audit complet de ta {weakest} actuelle",
+                    "Plan d'action ciblé sur les 3 quick wins prioritaires",
+                    "Mise en place d'un système opérationnel structuré"
+                ]
+            },
+            {
+                "periode": "Mois 4-6 : Systématisation",
+                "objectif": "Créer des systèmes qui tournent sans toi",
+                "actions": [
+                    "Automatiser tout ce qui peut l'être",
+                    "Former ton équipe/prestataires sur les process",
+                    "Installer un rituel de pilotage hebdomadaire"
+                ]
+            },
+            {
+                "periode": "Mois 7-9 : Croissance maîtrisée",
+                "objectif": "Scaler sur des bases solides",
+                "actions": [
+                    "Activer ton moteur d'acquisition à plein régime",
+                    "Recruter ou structurer pour absorber la croissance",
+                    "Optimiser ta marge par logement"
+                ]
+            },
+            {
+                "periode": "Mois 10-12 : Optimisation",
+                "objectif": "Maximiser la valeur",
+                "actions": [
+                    "Affiner tous les process pour l'excellence opérationnelle",
+                    "Préparer un dossier de valorisation complet",
+                    "Définir ta stratégie long terme (scale, revente, levée)"
+                ]
+            }
+        ]
+    }
+}
+
+
+# ============================================
+# SEGMENT MACHINE (33-44 points)
+# ============================================
+
+_MACHINE_STRUCTURE_DIAGNOSTIC = """Ta structure est clairement au-dessus de la moyenne. Tu as des process, une équipe ou des prestataires qui fonctionnent, et tu peux t'absenter sans que tout s'écroule.
+
+Les axes d'optimisation pour aller encore plus loin :
+• Industrialiser ce qui peut encore l'être
+• Créer des indicateurs avancés (pas juste du reporting, du prédictif)
+• Préparer ta structure à absorber un doublement de volume
+
+À ton niveau, chaque point d'optimisation a un impact direct sur ta valorisation."""
+
+_MACHINE_STRUCTURE_QUICK_WINS = [
+    "Identifie les 2-3 process qui ne sont pas encore au niveau industriel",
+    "Mets en place un dashboard temps réel de tes KPIs clés",
+    "Crée un plan de capacité : combien de logements tu peux absorber sans recrutement ?"
+]
+
+_MACHINE_ACQUISITION_DIAGNOSTIC = """Tu as un moteur d'acquisition qui fonctionne. Des leads arrivent, tu convertis, tu grandis.
+
+La question maintenant : comment passer à l'échelle supérieure ?
+
+Options pour accélérer :
+• Acquisition payante (Google Ads, Facebook Ads ciblé propriétaires)
+• Partenariats stratégiques (agents immobiliers, notaires, promoteurs)
+• Expansion géographique avec réplication de ton modèle
+• Rachat de portefeuilles de conciergeries moins structurées"""
+
+_MACHINE_ACQUISITION_QUICK_WINS = [
+    "Calcule ton CAC (coût d'acquisition client) précis par canal",
+    "Teste un budget pub de 500€ sur 30 jours pour valider le canal payant",
+    "Identifie 5 partenaires potentiels à contacter ce mois-ci"
+]
+
+_MACHINE_VALUE_DIAGNOSTIC = """Ta conciergerie a une vraie valeur patrimoniale. Ce n'est plus un job, c'est un actif.
+
+Un acheteur ou investisseur verrait :
+• Une structure qui tourne de façon autonome
+• Des process documentés et reproductibles
+• Un moteur d'acquisition prévisible
+• Des contrats solides avec les propriétaires
+
+Pour maximiser ta valorisation :
+• Documenter tout ce qui rend ton modèle unique et réplicable
+• Optimiser ta marge nette (c'est sur ça qu'on te valorise)
+• Préparer un data room complet pour les due diligences"""
+
+_MACHINE_VALUE_QUICK_WINS = [
+    "Crée un mémo de présentation de ta conciergerie (10 pages max)",
+    "Calcule ton EBITDA réel (en te versant un salaire de marché)",
+    "Liste ce qui te différencie de la concurrence en 5 points"
+]
+
+MACHINE_TEMPLATES = {
+    "machine.structureAnalysis.high": _analysis("{structure}/20", "structure_pct", "solide", _MACHINE_STRUCTURE_DIAGNOSTIC, _MACHINE_STRUCTURE_QUICK_WINS),
+    "machine.structureAnalysis.low": _analysis("{structure}/20", "structure_pct", "mature", _MACHINE_STRUCTURE_DIAGNOSTIC, _MACHINE_STRUCTURE_QUICK_WINS),
+    "machine.acquisitionAnalysis.high": _analysis("{acquisition}/18", "acquisition_pct", "performant", _MACHINE_ACQUISITION_DIAGNOSTIC, _MACHINE_ACQUISITION_QUICK_WINS),
+    "machine.acquisitionAnalysis.low": _analysis("{acquisition}/18", "acquisition_pct", "établi", _MACHINE_ACQUISITION_DIAGNOSTIC, _MACHINE_ACQUISITION_QUICK_WINS),
+    "machine.valueAnalysis.high": _analysis("{value}/6", "value_pct", "élevé", _MACHINE_VALUE_DIAGNOSTIC, _MACHINE_VALUE_QUICK_WINS),
+    "machine.valueAnalysis.low": _analysis("{value}/6", "value_pct", "bon", _MACHINE_VALUE_DIAGNOSTIC, _MACHINE_VALUE_QUICK_WINS),
+
+    # Leçon business sur l'investissement
+    "machine.investmentLesson": {
+        "titre": "Le levier que même les meilleurs sous-exploitent",
+        "message": """{first_name}, tu fais partie de l'élite. Mais même à ton niveau, il y a un levier que tu sous-exploites probablement.
+
+Tu as structuré, tu as délégué, tu as des process. Mais est-ce que ton moteur d'acquisition est vraiment à la hauteur de tes ambitions ?
+
+La plupart des conciergeries matures comme la tienne font une erreur : elles se reposent sur leur réputation et leur bouche-à-oreille. Ça fonctionne, mais ça ne scale pas.
+
+Voici ce que font les conciergeries qui doublent ou triplent leur nombre de logements en 18 mois : elles investissent MASSIVEMENT dans l'acquisition. Pas 500€/mois. Un budget cohérent avec leur ambition.
+
+Ton ambition définit ton budget. Tu veux doubler ? Investis en conséquence. Tu veux tripler ? Investis proportionnellement. C'est mathématique.
+
+À ton niveau, chaque euro investi en acquisition a un effet de levier considérable. Tu as la structure pour absorber la croissance. Tu as les process. Ce qui te manque peut-être, c'est un moteur d'acquisition qui tourne à plein régime et une équipe dédiée pour l'opérer.""",
+        "keyPoints": [
+            "À ton niveau, l'acquisition est le principal levier de croissance",
+            "Les conciergeries qui explosent investissent massivement et structurellement",
+            "Ton ambition définit ton budget : viser haut implique d'investir en conséquence",
+            "Déléguer l'acquisition permet de te concentrer sur ta zone de génie"
+        ]
+    },
+
+    # Roadmap 12 mois
+    "machine.roadmap": {
+        "titre": "Ton plan d'optimisation et de scale sur 12 mois",
+        "phases": [
+            {
+                "periode": "Mois 1-3 : Clarification stratégique",
+                "objectif": "Définir ta vision et ton plan",
+                "actions": [
+                    "Clarifier ton objectif : scale, revente, ou optimisation ?",
+                    "Faire une valorisation précise de ta conciergerie",
+                    "Identifier les leviers à activer en priorité"
+                ]
+            },
+            {
+                "periode": "Mois 4-6 : Optimisation",
+                "objectif": "Maximiser marge et efficacité",
+                "actions": [
+                    "Renégocier tes contrats prestataires",
+                    "Optimiser ta tarification et tes commissions",
+                    "Automatiser les derniers process manuels"
+                ]
+            },
+            {
+                "periode": "Mois 7-9 : Accélération",
+                "objectif": "Activer les leviers de croissance",
+                "actions": [
+                    "Lancer ton moteur d'acquisition payante",
+                    "Développer les partenariats stratégiques",
+                    "Préparer la structure pour absorber la croissance"
+                ]
+            },
+            {
+                "periode": "Mois 10-12 : Valorisation",
+                "objectif": "Préparer la sortie ou le refinancement",
+                "actions": [
+                    "Constituer un data room complet",
+                    "Solliciter des valorisations ou des offres",
+                    "Négocier en position de force"
+                ]
+            }
+        ]
+    }
+}
+
+
+TEMPLATES: Dict[str, Any] = {
+    **RECOMMENDATION_TEMPLATES,
+    **BLOCKER_TEMPLATES,
+    **SUMMARY_TEMPLATES,
+    **ARTISANAL_TEMPLATES,
+    **TRANSITION_TEMPLATES,
+    **MACHINE_TEMPLATES
+}
+
+
+# ============================================
+# COMPILATION
+# ============================================
+
+_formatter = Formatter()
+
+
+def _text_source(text: str) -> str:
+    """Texts with placeholders become an implicit concatenation of string
+    constants and f-string fields, which CPython builds in one BUILD_STRING
+    without parsing anything at render time."""
+    chunks = []
+    for literal, field, spec, conversion in _formatter.parse(text):
+        if literal:
+            chunks.append(repr(literal))
+        if field is not None:
+            if spec or conversion:
+                raise ValueError(f"Unsupported placeholder: {{{field}}}")
+            chunks.append('f"{v[' + repr(field) + ']}"')
+    return "(" + " ".join(chunks) + ")" if len(chunks) > 1 else (chunks[0] if chunks else "''")
+
+
+def _source(node: Any) -> str:
+    """Python expression building `node`, with placeholders read from `v`"""
+    if isinstance(node, Var):
+        return f"v[{node.name!r}]"
+    if isinstance(node, str):
+        return _text_source(node)
+    if isinstance(node, list):
+        return "[" + ", ".join(_source(item) for item in node) + "]"
+    if isinstance(node, dict):
+        return "{" + ", ".join(f"{key!r}: {_source(value)}" for key, value in node.items()) + "}"
+    raise TypeError(f"Unsupported template node: {type(node).__name__}")
+
+
+def compile_template(key: str, node: Any) -> Callable[[Mapping], Any]:
+    """Compile a template into a function of the variables mapping.
+
+    The function evaluates a single literal expression, so rendering costs the
+    same as the hand-written f-strings it replaces and always returns fresh
+    lists/dicts that callers may mutate.
+    """
+    return eval(compile(f"lambda v: {_source(node)}", f"<template {key}>", "eval"), {})
+
+
+@lru_cache(maxsize=None)
+def compile_analysis(
+    segment: str,
+    summary: str,
+    blocker: str,
+    recommendation: Tuple[str, ...],
+    structure_band: str,
+    acquisition_band: str,
+    value_band: str
+) -> Callable[[Mapping], dict]:
+    """Compile the full analysis for one band layout.
+
+    The number of layouts is bounded by the score bands (a few hundred at
+    most), so every reachable layout is compiled once and kept.
+    """
+    blocker_template = TEMPLATES[blocker]
+    layout = {
+        "segment": segment,
+        "diagSummary": TEMPLATES[summary],
+        "mainBlocker": blocker_template["mainBlocker"],
+        "priority": blocker_template["priority"],
+        "structureAnalysis": TEMPLATES[f"{segment}.structureAnalysis.{structure_band}"],
+        "acquisitionAnalysis": TEMPLATES[f"{segment}.acquisitionAnalysis.{acquisition_band}"],
+        "valueAnalysis": TEMPLATES[f"{segment}.valueAnalysis.{value_band}"],
+        "investmentLesson": TEMPLATES[f"{segment}.investmentLesson"],
+        "roadmap": TEMPLATES[f"{segment}.roadmap"],
+        "goodtimeRecommendation": "\n\n".join(TEMPLATES[key] for key in recommendation)
+    }
+    render_analysis = compile_template(f"{segment}:{summary}:{blocker}", layout)
+    # Template IDs of the static sections, for clients rendering from the bundle
+    render_analysis.sections = {
+        "structureAnalysis": f"{segment}.structureAnalysis.{structure_band}",
+        "acquisitionAnalysis": f"{segment}.acquisitionAnalysis.{acquisition_band}",
+        "valueAnalysis": f"{segment}.valueAnalysis.{value_band}",
+        "investmentLesson": f"{segment}.investmentLesson",
+        "roadmap": f"{segment}.roadmap",
+        "goodtimeRecommendation": list(recommendation)
+    }
+    return render_analysis
+
+
+# ============================================
+# CONTENT BUNDLE
+# ============================================
+
+def _bundle_node(node: Any) -> Any:
+    """JSON form of a template: texts keep their placeholders, Var becomes {"$var": name}"""
+    if isinstance(node, Var):
+        return {"$var": node.name}
+    if isinstance(node, list):
+        return [_bundle_node(item) for item in node]
+    if isinstance(node, dict):
+        return {key: _bundle_node(value) for key, value in node.items()}
+    return node
+
+
+def _content_version(templates: Mapping) -> str:
+    canonical = json.dumps(templates, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+_BUNDLE_TEMPLATES = {key: _bundle_node(node) for key, node in TEMPLATES.items()}
+
+# Changes whenever any text changes, so a bundle URL carrying it never goes stale
+CONTENT_VERSION = _content_version(_BUNDLE_TEMPLATES)
+
+CONTENT_BUNDLE = {
+    "version": CONTENT_VERSION,
+    # goodtimeRecommendation is a list of template IDs whose texts are joined
+    "joiners": {"goodtimeRecommendation": "\n\n"},
+    "templates": _BUNDLE_TEMPLATES
+}
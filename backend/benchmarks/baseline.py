@@ -0,0 +1,26 @@
+"""
+Before/after runs of the benchmarks against another git revision
+
+`run_baseline` extracts backend/ as of `rev` into a temporary directory and
+runs a benchmark script with that tree first on PYTHONPATH, so `server` and
+its modules are imported from the older revision.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def run_baseline(rev: str, script: str, *args: str):
+    """Run `script` with `args` (plus `--label rev`) against the backend as of `rev`"""
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = subprocess.run(
+            ["git", "archive", rev, "backend"],
+            cwd=BACKEND_DIR.parent, check=True, capture_output=True
+        ).stdout
+        subprocess.run(["tar", "-x", "-C", tmp], input=archive, check=True)
+        env = dict(os.environ, PYTHONPATH=os.path.join(tmp, "backend"))
+        subprocess.run([sys.executable, script, *args, "--label", rev], env=env, check=True)
@@ -0,0 +1,76 @@
+"""
+Microbenchmark for the deterministic analysis (`analyze_diagnostic`)
+
+Measures the per-call cost over a spread of score vectors covering the
+three segments and every score band.
+
+Usage (from backend/):
+    python -m benchmarks.bench_analyze_diagnostic [--calls 2000] [--repeats 50]
+    python -m benchmarks.bench_analyze_diagnostic --baseline-rev HEAD~1
+
+`--baseline-rev` also runs the benchmark against the backend of another git
+revision (checked out in a temporary directory) for a before/after view.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench_database")
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+import server  # noqa: E402
+
+USER = server.UserInfo(
+    firstName="Jean", lastName="Martin", email="jean@conciergerie.fr",
+    phone="0698765432", city="Lyon", units="30"
+)
+
+
+def score_vectors():
+    for structure in range(0, 21, 3):
+        for acquisition in range(0, 19, 3):
+            for value in range(0, 7, 2):
+                yield {
+                    "total": structure + acquisition + value,
+                    "structure": structure,
+                    "acquisition": acquisition,
+                    "value": value
+                }
+
+
+async def run(calls: int, repeats: int):
+    vectors = list(score_vectors())
+    per_call = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i in range(calls):
+            await server.analyze_diagnostic(USER, {}, vectors[i % len(vectors)])
+        per_call.append((time.perf_counter() - start) / calls)
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--baseline-rev", help="git revision to benchmark for comparison")
+    parser.add_argument("--label", default="working tree")
+    args = parser.parse_args()
+
+    if args.baseline_rev:
+        # Imported here: the baseline run loads benchmarks/ from the older
+        # revision, which may predate the helper
+        from benchmarks.baseline import run_baseline
+        run_baseline(args.baseline_rev, __file__, "--calls", str(args.calls), "--repeats", str(args.repeats))
+
+    per_call = asyncio.run(run(args.calls, args.repeats))
+    print(f"analyze_diagnostic [{args.label}]: {args.calls} calls x {args.repeats} repeats")
+    print(f"  best   {min(per_call) * 1e6:8.2f} us/call")
+    print(f"  median {statistics.median(per_call) * 1e6:8.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
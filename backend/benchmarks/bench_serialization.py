@@ -0,0 +1,96 @@
+"""
+Allocation benchmark for one /api/diagnostic/analyze request
+
+Runs sequential requests through the in-process app (stand-ins of
+benchmarks.load_analyze, GPT answering instantly) and reports, per request,
+the peak memory allocated while handling it (tracemalloc), the wall time
+(measured in a separate pass, without tracemalloc) and the response size,
+decoded and as transferred with `--accept-encoding`.
+
+Usage (from backend/):
+    python -m benchmarks.bench_serialization [--requests 300] [--accept-encoding identity]
+    python -m benchmarks.bench_serialization --baseline-rev HEAD~1
+
+`--baseline-rev` also runs the benchmark against the backend of another git
+revision (checked out in a temporary directory) for a before/after view.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import tracemalloc
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench_database")
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+import logging  # noqa: E402
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+from benchmarks.load_analyze import diagnostic_payloads, stand_ins  # noqa: E402
+
+WARMUP = 20
+
+
+async def run(requests: int, accept_encoding: str):
+    payloads = diagnostic_payloads(WARMUP + 2 * requests)
+    warmup, traced, timed = payloads[:WARMUP], payloads[WARMUP:WARMUP + requests], payloads[WARMUP + requests:]
+    peaks, durations, sizes, transferred = [], [], [], []
+
+    async with stand_ins(openai_latency=0.0, openai_error_rate=0.0):
+        # Webhooks stay queued: delivery workers would allocate during the measurement
+        await server.webhook_outbox.stop()
+        transport = httpx.ASGITransport(app=server.app)
+        headers = {"Accept-Encoding": accept_encoding}
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+            for payload in warmup:
+                await client.post("/api/diagnostic/analyze", json=payload)
+
+            tracemalloc.start()
+            for payload in traced:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                response = await client.post("/api/diagnostic/analyze", json=payload)
+                peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+                sizes.append(len(response.content))
+                transferred.append(response.num_bytes_downloaded)
+            tracemalloc.stop()
+
+            for payload in timed:
+                start = time.perf_counter()
+                await client.post("/api/diagnostic/analyze", json=payload)
+                durations.append(time.perf_counter() - start)
+
+    return peaks, durations, sizes, transferred
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--accept-encoding", default="br, gzip")
+    parser.add_argument("--baseline-rev", help="git revision to benchmark for comparison")
+    parser.add_argument("--label", default="working tree")
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    if args.baseline_rev:
+        # Imported here: the baseline run loads benchmarks/ from the older
+        # revision, which may predate the helper
+        from benchmarks.baseline import run_baseline
+        run_baseline(
+            args.baseline_rev, __file__,
+            "--requests", str(args.requests), "--accept-encoding", args.accept_encoding
+        )
+
+    peaks, durations, sizes, transferred = asyncio.run(run(args.requests, args.accept_encoding))
+    print(f"analyze request [{args.label}]: {args.requests} requests, Accept-Encoding: {args.accept_encoding}")
+    print(f"  peak allocated  median {statistics.median(peaks) / 1024:8.1f} KiB   max {max(peaks) / 1024:8.1f} KiB")
+    print(f"  wall time       median {statistics.median(durations) * 1e3:8.2f} ms    best {min(durations) * 1e3:8.2f} ms")
+    print(f"  response body   median {statistics.median(sizes) / 1024:8.1f} KiB   transferred {statistics.median(transferred) / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Local stand-ins for the backend's upstreams, for load tests
+
+FakeOpenAI      /v1/chat/completions (plain and streamed) with a configurable
+                latency and error rate
+WebhookReceiver accepts the n8n audit webhook and counts deliveries
+
+Both are ASGI apps: the load driver wires them in-process through
+httpx.ASGITransport, or they can be served on ports to back a real
+deployment. Start that deployment with OPENAI_BASE_URL and WEBHOOK_AUDIT_URL
+pointing at the fakes, or its synthetic leads reach OpenAI and the
+production n8n workflow:
+
+    python -m benchmarks.fakes openai --port 9100 --latency 0.8 --error-rate 0.02
+    python -m benchmarks.fakes webhook --port 9200
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 \
+    WEBHOOK_AUDIT_URL=http://127.0.0.1:9200/webhook/audit uvicorn server:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANALYSIS = {
+    "diagSummary": "Jean, ta conciergerie tourne mais repose encore largement sur toi : la structure est fragile et l'acquisition dépend du bouche-à-oreille.",
+    "mainBlocker": "Acquisition non maîtrisée",
+    "priority": "Mettre en place un process d'acquisition local mesurable sur 90 jours.",
+    "goodtimeRecommendation": "Goodtime t'aide à structurer tes process clés puis à installer un moteur d'acquisition local prévisible."
+}
+
+
+class FakeOpenAI:
+    """Chat completions answering `ANALYSIS` after `latency` (+/- `jitter`) seconds
+
+    A share `error_rate` of calls fails with a 500, like an overloaded API.
+    """
+
+    def __init__(self, *, latency: float = 0.5, jitter: float = 0.0, error_rate: float = 0.0, chunk_size: int = 16, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chunk_size = chunk_size
+        self._random = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+        self.app = FastAPI()
+        self.app.post("/v1/chat/completions")(self.completions)
+
+    def _completion(self, content: str) -> dict:
+        return {
+            "id": f"chatcmpl-bench{self.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4o-mini",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 500, "completion_tokens": len(content) // 4, "total_tokens": 500 + len(content) // 4}
+        }
+
+    async def _chunks(self, content: str):
+        for start in range(0, len(content), self.chunk_size):
+            chunk = {
+                "id": f"chatcmpl-bench{self.calls}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": "gpt-4o-mini",
+                "choices": [{"index": 0, "delta": {"content": content[start:start + self.chunk_size]}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    async def completions(self, request: Request):
+        body = await request.json()
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter)))
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            return JSONResponse({"error": {"message": "Simulated upstream error", "type": "server_error"}}, status_code=500)
+
+        content = json.dumps(ANALYSIS, ensure_ascii=False)
+        if body.get("stream"):
+            return StreamingResponse(self._chunks(content), media_type="text/event-stream")
+        return self._completion(content)
+
+
+class WebhookReceiver:
+    """Accepts audit webhooks after `latency` seconds, failing a share `error_rate` of them"""
+
+    def __init__(self, *, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.received = 0
+        self.errors = 0
+        self.app = FastAPI()
+        self.app.post("/webhook/{name}")(self.receive)
+
+    async def receive(self, name: str, request: Request):
+        await request.body()
+        await asyncio.sleep(self.latency)
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            return JSONResponse({"message": "Simulated webhook error"}, status_code=500)
+        self.received += 1
+        return {"message": "Workflow was started"}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve a fake upstream for load tests")
+    parser.add_argument("service", choices=["openai", "webhook"])
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.service == "openai":
+        fake = FakeOpenAI(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    else:
+        fake = WebhookReceiver(latency=args.latency, error_rate=args.error_rate)
+    uvicorn.run(fake.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Load test for POST /api/diagnostic/analyze
+
+Drives the endpoint with `--concurrency` clients until `--requests` analyses
+are done, and reports throughput and latency percentiles. By default the
+app runs in-process against local stand-ins: mongomock for Mongo,
+benchmarks.fakes.FakeOpenAI (configurable latency and error rate) and a
+fake n8n webhook receiver. With `--target`, a running deployment is driven
+instead.
+
+Usage (from backend/):
+    python -m benchmarks.load_analyze [--requests 500] [--concurrency 20]
+        [--openai-latency 0.5] [--openai-error-rate 0.02]
+    python -m benchmarks.load_analyze --check        # scenarios of thresholds.json
+    python -m benchmarks.load_analyze --target http://localhost:8001
+
+`--check` exits non-zero when a scenario misses its thresholds. A `--target`
+deployment must run against the fakes (see benchmarks/fakes.py), never the
+production OpenAI key and n8n webhook.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench_database")
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+
+import server  # noqa: E402
+from benchmarks.fakes import FakeOpenAI, WebhookReceiver  # noqa: E402
+
+THRESHOLDS_PATH = Path(__file__).resolve().parent / "thresholds.json"
+
+
+def diagnostic_payloads(count: int, seed: int = 0) -> List[dict]:
+    """Distinct leads with random answers, so the LLM cache does not absorb the load"""
+    rng = random.Random(seed)
+    return [
+        {
+            "userInfo": {
+                "firstName": "Jean",
+                "lastName": f"Martin{i}",
+                "email": f"lead{i}@conciergerie.fr",
+                "phone": "0698765432",
+                "city": rng.choice(["Lyon", "Nice", "Annecy", "Bordeaux"]),
+                "units": str(rng.randint(3, 120))
+            },
+            "answers": {str(q): rng.randint(0, 2) for q in range(1, 23)}
+        }
+        for i in range(count)
+    ]
+
+
+@asynccontextmanager
+async def stand_ins(openai_latency: float, openai_error_rate: float, webhook_latency: float = 0.0):
+    """Wire the server module to mongomock, the fake OpenAI and the fake webhook receiver"""
+    from mongomock_motor import AsyncMongoMockClient
+    from openai import AsyncOpenAI
+
+    from circuit_breaker import CircuitBreaker
+    from content_store import ContentStore
+    from llm_cache import LLMResponseCache
+    from webhook_outbox import WebhookOutbox
+
+    fake_openai = FakeOpenAI(latency=openai_latency, jitter=openai_latency / 4, error_rate=openai_error_rate)
+    receiver = WebhookReceiver(latency=webhook_latency)
+    openai_http = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_openai.app))
+
+    db = AsyncMongoMockClient()["bench_database"]
+    replaced = {name: getattr(server, name) for name in ("db", "openai_client", "openai_breaker", "llm_cache", "content_store", "webhook_outbox")}
+    server.db = db
+    server.openai_client = AsyncOpenAI(
+        api_key="sk-bench",
+        base_url="http://fake-openai/v1",
+        http_client=openai_http,
+        max_retries=0,
+        timeout=server.OPENAI_TIMEOUT
+    )
+    server.openai_breaker = CircuitBreaker(
+        "openai",
+        failure_threshold=server.openai_breaker.failure_threshold,
+        slow_call_seconds=server.openai_breaker.slow_call_seconds,
+        reset_timeout=server.openai_breaker.reset_timeout
+    )
+    server.llm_cache = LLMResponseCache(db.llm_cache, ttl_seconds=3600, version=server.llm_cache.version)
+    server.content_store = ContentStore(db.content_blocks, version=server.content_store.version)
+    server.webhook_outbox = WebhookOutbox(
+        db.webhook_outbox,
+        poll_interval=0.1,
+        transport=httpx.ASGITransport(app=receiver.app)
+    )
+    await server.webhook_outbox.start()
+    try:
+        yield fake_openai, receiver
+    finally:
+        await server.webhook_outbox.stop()
+        await openai_http.aclose()
+        for name, value in replaced.items():
+            setattr(server, name, value)
+
+
+async def drain_outbox(timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        stats = await server.webhook_outbox.stats()
+        if stats.get("pending", 0) == 0 and stats.get("delivering", 0) == 0:
+            return
+        await asyncio.sleep(0.05)
+
+
+async def drive(client: httpx.AsyncClient, payloads: List[dict], concurrency: int) -> Dict[str, float]:
+    """POST every payload with `concurrency` clients; latency percentiles in ms"""
+    latencies = []
+    statuses = Counter()
+    pending = iter(payloads)
+
+    async def worker():
+        for payload in pending:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/api/diagnostic/analyze", json=payload)
+                statuses[response.status_code] += 1
+            except httpx.HTTPError:
+                statuses["error"] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99]).tolist()
+    return {
+        "requests": len(payloads),
+        "concurrency": concurrency,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(payloads) / duration, 1),
+        "p50_ms": round(p50, 1),
+        "p95_ms": round(p95, 1),
+        "p99_ms": round(p99, 1),
+        "error_rate": round(1 - statuses[200] / len(payloads), 4)
+    }
+
+
+async def run_scenario(
+    requests: int,
+    concurrency: int,
+    openai_latency: float,
+    openai_error_rate: float = 0.0,
+    target: Optional[str] = None
+) -> Dict[str, float]:
+    payloads = diagnostic_payloads(requests + concurrency)
+    warmup, payloads = payloads[:concurrency], payloads[concurrency:]
+
+    if target:
+        async with httpx.AsyncClient(base_url=target, timeout=120) as client:
+            await drive(client, warmup, concurrency)
+            return await drive(client, payloads, concurrency)
+
+    async with stand_ins(openai_latency, openai_error_rate) as (fake_openai, receiver):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            await drive(client, warmup, concurrency)
+            await drain_outbox()
+            calls_before, received_before = fake_openai.calls, receiver.received
+            report = await drive(client, payloads, concurrency)
+        await drain_outbox()
+        report["openai_calls"] = fake_openai.calls - calls_before
+        report["webhooks_delivered"] = receiver.received - received_before
+        return report
+
+
+def load_thresholds(path: Path = THRESHOLDS_PATH) -> Dict[str, dict]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def check(report: Dict[str, float], limits: dict) -> List[str]:
+    """Threshold violations of a scenario report (empty when it passes)"""
+    violations = []
+    for metric, maximum in limits.get("max", {}).items():
+        if report[metric] > maximum:
+            violations.append(f"{metric} = {report[metric]} > {maximum}")
+    for metric, minimum in limits.get("min", {}).items():
+        if report[metric] < minimum:
+            violations.append(f"{metric} = {report[metric]} < {minimum}")
+    return violations
+
+
+def print_report(name: str, report: Dict[str, float], as_json: bool = False):
+    if as_json:
+        print(json.dumps({name: report}))
+        return
+    print(f"{name}: {report['requests']} requests, concurrency {report['concurrency']}")
+    print(f"  throughput {report['throughput_rps']:8.1f} req/s   errors {report['error_rate']:.2%}")
+    print(f"  p50 {report['p50_ms']:8.1f} ms   p95 {report['p95_ms']:8.1f} ms   p99 {report['p99_ms']:8.1f} ms")
+    if "openai_calls" in report:
+        print(f"  openai calls {report['openai_calls']}   webhooks delivered {report['webhooks_delivered']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--target", help="base URL of a running backend to drive instead of the in-process app")
+    parser.add_argument("--check", action="store_true", help="run the scenarios of thresholds.json and enforce them")
+    parser.add_argument("--json", action="store_true", help="print reports as JSON")
+    args = parser.parse_args()
+
+    # Per-request logs (expected GPT fallbacks included) would dominate the measurement
+    logging.disable(logging.ERROR)
+
+    if not args.check:
+        report = asyncio.run(run_scenario(
+            args.requests, args.concurrency, args.openai_latency, args.openai_error_rate, args.target
+        ))
+        print_report("analyze", report, args.json)
+        return
+
+    failed = False
+    for name, scenario in load_thresholds().items():
+        report = asyncio.run(run_scenario(**scenario["scenario"]))
+        violations = check(report, scenario)
+        print_report(name, report, args.json)
+        for violation in violations:
+            print(f"  FAIL {violation}")
+        failed = failed or bool(violations)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Circuit breaker for an unreliable upstream (the OpenAI API).
+
+closed     calls go through; `failure_threshold` consecutive failures or slow
+           calls (longer than `slow_call_seconds`) open the circuit
+open       calls are rejected immediately with CircuitOpenError, so callers
+           take their fallback path without waiting for a timeout
+half_open  after `reset_timeout`, up to `half_open_max_calls` probe calls go
+           through: a healthy probe closes the circuit, a failed or slow one
+           opens it again
+"""
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+from metrics import CIRCUIT_STATE, CIRCUIT_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    # Label of diagnostic_gpt_fallbacks_total for calls rejected by the breaker
+    fallback_reason = "circuit_open"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        slow_call_seconds: Optional[float] = None,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        CIRCUIT_STATE.labels(name).set(_STATE_VALUES[CLOSED])
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def _transition(self, state: str):
+        logger.warning(f"Circuit '{self.name}' {self._state} -> {state}")
+        self._state = state
+        self._probes = 0
+        if state == OPEN:
+            self._opened_at = self._clock()
+        if state == CLOSED:
+            self._failures = 0
+        CIRCUIT_STATE.labels(self.name).set(_STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.labels(self.name, state).inc()
+
+    def _acquire(self) -> bool:
+        """Admit a call or raise CircuitOpenError; True if the call is a half-open probe"""
+        state = self.state
+        if state == CLOSED:
+            return False
+        if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+            self._probes += 1
+            return True
+        raise CircuitOpenError(f"Circuit '{self.name}' is {state}")
+
+    def check(self):
+        """Raise CircuitOpenError if the circuit is open, without taking a probe
+
+        Lets callers fail fast before queueing for a resource the guarded call
+        needs.
+        """
+        if self.state == OPEN:
+            raise CircuitOpenError(f"Circuit '{self.name}' is {OPEN}")
+
+    def _record_failure(self, probe: bool):
+        if probe:
+            self._transition(OPEN)
+            return
+        self._failures += 1
+        if self._state == CLOSED and self._failures >= self.failure_threshold:
+            self._transition(OPEN)
+
+    def _record_success(self, probe: bool):
+        if probe:
+            self._transition(CLOSED)
+        elif self._state == CLOSED:
+            self._failures = 0
+
+    @asynccontextmanager
+    async def guard(self):
+        """Run the enclosed upstream call under the breaker"""
+        probe = self._acquire()
+        start = self._clock()
+        outcome = None
+        try:
+            yield
+            slow = self.slow_call_seconds is not None and self._clock() - start > self.slow_call_seconds
+            outcome = "slow" if slow else "ok"
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            if outcome is None:
+                # Cancelled by our caller: says nothing about the upstream
+                if probe and self._state == HALF_OPEN:
+                    self._probes = max(0, self._probes - 1)
+            elif outcome == "ok":
+                self._record_success(probe)
+            else:
+                self._record_failure(probe)
+
+    def snapshot(self) -> dict:
+        state = self.state
+        snapshot = {
+            "state": state,
+            "consecutiveFailures": self._failures,
+            "failureThreshold": self.failure_threshold,
+            "slowCallSeconds": self.slow_call_seconds
+        }
+        if state == OPEN:
+            snapshot["retryInSeconds"] = round(max(0.0, self.reset_timeout - (self._clock() - self._opened_at)), 3)
+        return snapshot
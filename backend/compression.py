@@ -0,0 +1,148 @@
+"""
+Response compression negotiated from the request's Accept-Encoding.
+
+Brotli (when the `brotli` package is installed) is preferred over gzip.
+Left as-is: bodies under `minimum_size` bytes, responses that already have a
+Content-Encoding, and responses sent in several chunks (the SSE and NDJSON
+streams, whose events must reach the client as soon as they are produced).
+
+Every response that could be compressed carries `Vary: Accept-Encoding`,
+and a compressed body gets its own ETag (`"tag"` -> `"tag-br"`), so caches
+never serve one encoding for another. Handlers comparing If-None-Match
+compare `base_etag` of each tag.
+"""
+import gzip
+import importlib.util
+from typing import Optional
+
+BROTLI_AVAILABLE = importlib.util.find_spec("brotli") is not None
+if BROTLI_AVAILABLE:
+    import brotli
+
+ENCODINGS = ("br", "gzip") if BROTLI_AVAILABLE else ("gzip",)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Preferred supported encoding accepted by the client (q > 0), if any"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag of the `encoding` form of a representation (weak tags stay weak)"""
+    return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') else etag
+
+
+def base_etag(etag: str) -> str:
+    """Inverse of `encoded_etag`: the handler's tag for an encoding-specific one"""
+    for encoding in ENCODINGS:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def _with_vary(headers: list) -> list:
+    headers = list(headers)
+    for index, (name, value) in enumerate(headers):
+        if name.lower() == b"vary":
+            if b"accept-encoding" not in value.lower() and value.strip() != b"*":
+                headers[index] = (name, value + b", Accept-Encoding")
+            return headers
+    return headers + [(b"vary", b"Accept-Encoding")]
+
+
+def _with_etag(headers: list, transform) -> list:
+    return [(name, transform(value.decode("latin-1")).encode("latin-1") if name.lower() == b"etag" else value) for name, value in headers]
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing complete response bodies"""
+
+    def __init__(self, app, *, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        # On analysis JSON, quality 4 matches gzip's ratio for less CPU; the
+        # highest qualities shave ~10% more bytes for ~60x the CPU
+        self.brotli_quality = brotli_quality
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = dict(scope["headers"])
+        encoding = choose_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if_none_match = request_headers.get(b"if-none-match", b"").decode("latin-1")
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                return
+
+            headers = start.get("headers", [])
+            body = message.get("body", b"")
+            if message.get("more_body", False) or any(name.lower() == b"content-encoding" for name, _ in headers):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            if start["status"] == 304:
+                # Revalidation of a representation the client may hold
+                # compressed: answer with the tag it sent
+                if encoding is not None:
+                    tagged = _with_etag(headers, lambda etag: encoded_etag(etag, encoding))
+                    if any(name.lower() == b"etag" and value.decode("latin-1") in if_none_match for name, value in tagged):
+                        headers = tagged
+                await send({**start, "headers": _with_vary(headers)})
+                await send(message)
+                return
+
+            if len(body) < self.minimum_size:
+                # Never compressed at this size, whatever the client accepts
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            if encoding is None:
+                await send({**start, "headers": _with_vary(headers)})
+                await send(message)
+                return
+
+            compressed = self.compress(body, encoding)
+            headers = [(name, value) for name, value in _with_etag(headers, lambda etag: encoded_etag(etag, encoding)) if name.lower() != b"content-length"]
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode())
+            ]
+            await send({**start, "headers": _with_vary(headers)})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,176 @@
+"""
+Content-addressed storage of the analysis sections of saved diagnostics.
+
+The long sections (recommendation, block analyses, investment lesson,
+roadmap) are mostly identical across diagnostics of a segment. They are
+stored once in their own collection, keyed on the content version and a
+hash of the section, and diagnostic documents keep only the keys, in
+`contentRefs`. As in the LLM cache, the lead's name and city are replaced
+by placeholders before hashing, so leads with the same scores share blocks.
+
+`rehydrate` puts the sections back into a document read from Mongo; blocks
+are kept in an in-process LRU, so hot blocks are not re-read.
+"""
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import orjson
+from pymongo import UpdateOne
+
+from llm_cache import PERSONAL_FIELDS, _from_template, _to_template
+
+logger = logging.getLogger(__name__)
+
+STORED_SECTIONS = (
+    "goodtimeRecommendation", "structureAnalysis", "acquisitionAnalysis",
+    "valueAnalysis", "investmentLesson", "roadmap"
+)
+# Document fields the placeholders are filled from on read
+PERSONAL_DOCUMENT_FIELDS = tuple(PERSONAL_FIELDS.values())
+
+
+def _personal_values(doc: dict) -> Dict[str, str]:
+    values = {}
+    for placeholder, field in PERSONAL_FIELDS.items():
+        value = (doc.get(field) or "").strip()
+        if value:
+            values[placeholder] = value
+    return values
+
+
+def _map_texts(value: Any, transform: Callable[[str], str]) -> Any:
+    if isinstance(value, str):
+        return transform(value)
+    if isinstance(value, list):
+        return [_map_texts(item, transform) for item in value]
+    if isinstance(value, dict):
+        return {key: _map_texts(item, transform) for key, item in value.items()}
+    return value
+
+
+class ContentStore:
+    """Mongo collection of analysis sections keyed by content hash, with a read LRU"""
+
+    def __init__(self, collection, *, version: str, cache_size: int = 1024):
+        self.collection = collection
+        self.version = version
+        self.cache_size = cache_size
+        # key -> templated section; also the set of blocks known to be stored
+        self._blocks: "OrderedDict[str, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def ensure_indexes(self):
+        # Lets blocks of retired content versions be found and pruned
+        await self.collection.create_index("version")
+
+    def key_for(self, section: Any) -> str:
+        digest = hashlib.sha256(orjson.dumps(section, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        return f"{self.version}:{digest}"
+
+    def _remember(self, key: str, section: Any):
+        self._blocks[key] = section
+        self._blocks.move_to_end(key)
+        while len(self._blocks) > self.cache_size:
+            self._blocks.popitem(last=False)
+
+    def _split(self, doc: dict, new_blocks: Dict[str, Any]) -> dict:
+        """`doc` with its stored sections replaced by keys; unseen blocks go to `new_blocks`"""
+        personal = _personal_values(doc)
+        refs = {}
+        for field in STORED_SECTIONS:
+            section = doc.get(field)
+            if section is None:
+                continue
+            templated = _map_texts(section, lambda text: _to_template(text, personal))
+            if _map_texts(templated, lambda text: _from_template(text, personal)) != section:
+                # Text already containing a placeholder would not read back
+                # identically: keep that section inline
+                continue
+            key = self.key_for(templated)
+            refs[field] = key
+            if key not in self._blocks:
+                new_blocks[key] = templated
+        if not refs:
+            return doc
+        split = {field: value for field, value in doc.items() if field not in refs}
+        split["contentRefs"] = refs
+        return split
+
+    async def dehydrate_many(self, docs: List[dict]) -> List[dict]:
+        """Documents to insert in place of `docs`, once their new blocks are stored
+
+        If the blocks cannot be written, the documents are returned unchanged
+        (sections inline) so the diagnostics are still saved.
+        """
+        new_blocks: Dict[str, Any] = {}
+        split = [self._split(doc, new_blocks) for doc in docs]
+        if new_blocks:
+            now = datetime.now(timezone.utc)
+            try:
+                await self.collection.bulk_write([
+                    UpdateOne(
+                        {"_id": key},
+                        {"$setOnInsert": {"version": self.version, "section": section, "created_at": now}},
+                        upsert=True
+                    )
+                    for key, section in new_blocks.items()
+                ], ordered=False)
+            except Exception as e:
+                logger.warning(f"Failed to store content blocks, saving sections inline: {e}")
+                return docs
+            for key, section in new_blocks.items():
+                self._remember(key, section)
+        return split
+
+    async def dehydrate(self, doc: dict) -> dict:
+        return (await self.dehydrate_many([doc]))[0]
+
+    async def _load(self, keys: Iterable[str]) -> Dict[str, Any]:
+        blocks = {}
+        missing = []
+        for key in set(keys):
+            if key in self._blocks:
+                self._blocks.move_to_end(key)
+                blocks[key] = self._blocks[key]
+                self.hits += 1
+            else:
+                missing.append(key)
+        if missing:
+            self.misses += len(missing)
+            async for entry in self.collection.find({"_id": {"$in": missing}}):
+                blocks[entry["_id"]] = entry["section"]
+                self._remember(entry["_id"], entry["section"])
+        return blocks
+
+    async def rehydrate_many(self, docs: List[dict]) -> List[dict]:
+        """Put the referenced sections back into documents read from Mongo (in place)
+
+        Documents saved with inline sections are left as they are. A block
+        that cannot be found leaves its section as None.
+        """
+        blocks = await self._load(key for doc in docs for key in doc.get("contentRefs", {}).values())
+        for doc in docs:
+            refs = doc.pop("contentRefs", None)
+            if not refs:
+                continue
+            personal = _personal_values(doc)
+            for field, key in refs.items():
+                section = blocks.get(key)
+                if section is None:
+                    logger.warning(f"Content block {key} of diagnostic {doc.get('id')} not found")
+                    doc[field] = None
+                    continue
+                doc[field] = _map_texts(section, lambda text: _from_template(text, personal))
+        return docs
+
+    async def rehydrate(self, doc: Optional[dict]) -> Optional[dict]:
+        if doc is None:
+            return None
+        return (await self.rehydrate_many([doc]))[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._blocks), "maxSize": self.cache_size}
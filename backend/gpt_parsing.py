@@ -0,0 +1,177 @@
+"""
+Parsing helpers for GPT output.
+
+The analysis is requested with a strict JSON schema (`RESPONSE_FORMAT`), so
+the completion normally validates as-is (`valid`). Older cached prompts or
+models that ignore the schema may still wrap it in markdown, add prose
+around it or put raw newlines in strings: these are repaired (`repaired`).
+Only when not even diagSummary can be recovered does parsing fail
+(`invalid`), sending the request to the deterministic fallback.
+"""
+import json
+import re
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+from metrics import GPT_PARSE_RESULTS
+
+_ESCAPES = {
+    '"': '"',
+    '\\': '\\',
+    '/': '/',
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t'
+}
+
+
+class GPTParseError(ValueError):
+    # Label of diagnostic_gpt_fallbacks_total
+    fallback_reason = "invalid_response"
+
+
+class JSONStringFieldExtractor:
+    """Incrementally decodes one string field out of a streamed JSON object.
+
+    Feed the completion chunks as they arrive; each call returns the part of
+    the field's value decoded so far that was not returned before, so the
+    text can be forwarded token by token before the JSON is complete.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self._key = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self._buffer = ""
+        self._position: Optional[int] = None
+        self.done = False
+
+    @property
+    def started(self) -> bool:
+        return self._position is not None
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        if self.done:
+            return ""
+        if self._position is None:
+            match = self._key.search(self._buffer)
+            if match is None:
+                return ""
+            self._position = match.end()
+
+        decoded = []
+        buffer = self._buffer
+        position = self._position
+        while position < len(buffer):
+            char = buffer[position]
+            if char == '"':
+                self.done = True
+                position += 1
+                break
+            if char != '\\':
+                decoded.append(char)
+                position += 1
+                continue
+            # Escape sequence: wait for the rest if it was split across chunks
+            if position + 1 >= len(buffer):
+                break
+            escape = buffer[position + 1]
+            if escape == 'u':
+                if position + 6 > len(buffer):
+                    break
+                code = self._hex(buffer, position + 2)
+                if 0xD800 <= code < 0xDC00:
+                    # High surrogate: needs its low half (\uDCxx) too
+                    if position + 12 > len(buffer):
+                        break
+                    if buffer[position + 6:position + 8] != "\\u" or not 0xDC00 <= self._hex(buffer, position + 8) < 0xE000:
+                        raise GPTParseError(f"Unpaired surrogate in {self.field!r}")
+                    low = self._hex(buffer, position + 8)
+                    decoded.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                    position += 12
+                else:
+                    decoded.append(chr(code))
+                    position += 6
+            else:
+                decoded.append(_ESCAPES.get(escape, escape))
+                position += 2
+        self._position = position
+        return "".join(decoded)
+
+    def _hex(self, buffer: str, position: int) -> int:
+        digits = buffer[position:position + 4]
+        if len(digits) != 4 or any(digit not in "0123456789abcdefABCDEF" for digit in digits):
+            raise GPTParseError(f"Malformed \\u escape in {self.field!r}: {digits!r}")
+        return int(digits, 16)
+
+
+ANALYSIS_FIELDS = ("diagSummary", "mainBlocker", "priority", "goodtimeRecommendation")
+
+# Structured output: the API only returns JSON matching this schema
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "diagnostic_analysis",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {field: {"type": "string"} for field in ANALYSIS_FIELDS},
+            "required": list(ANALYSIS_FIELDS),
+            "additionalProperties": False
+        }
+    }
+}
+
+
+class GPTAnalysis(BaseModel):
+    """Analysis written by GPT; only diagSummary is needed downstream"""
+    model_config = ConfigDict(extra="ignore")
+
+    diagSummary: str = Field(min_length=1)
+    mainBlocker: Optional[str] = None
+    priority: Optional[str] = None
+    goodtimeRecommendation: Optional[str] = None
+
+
+_CODE_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL)
+
+
+def _repair(text: str) -> Optional[GPTAnalysis]:
+    fenced = _CODE_FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        try:
+            # strict=False accepts raw newlines/tabs inside strings
+            return GPTAnalysis.model_validate(json.loads(text[start:end + 1], strict=False))
+        except (ValueError, ValidationError):
+            pass
+    # Broken JSON (e.g. truncated by max_tokens): keep diagSummary if it is complete
+    extractor = JSONStringFieldExtractor("diagSummary")
+    try:
+        summary = extractor.feed(text)
+    except GPTParseError:
+        return None
+    if extractor.done and summary:
+        return GPTAnalysis(diagSummary=summary)
+    return None
+
+
+def parse_analysis(text: str) -> GPTAnalysis:
+    """Decode the JSON analysis returned by GPT (raises GPTParseError)"""
+    try:
+        analysis = GPTAnalysis.model_validate_json(text)
+        GPT_PARSE_RESULTS.labels("valid").inc()
+        return analysis
+    except ValidationError:
+        pass
+    analysis = _repair(text.strip())
+    if analysis is None:
+        GPT_PARSE_RESULTS.labels("invalid").inc()
+        raise GPTParseError(f"Unparseable GPT analysis: {text[:100]!r}")
+    GPT_PARSE_RESULTS.labels("repaired").inc()
+    return analysis
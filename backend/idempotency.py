@@ -0,0 +1,73 @@
+"""
+Deduplication of repeated diagnostic submissions.
+
+A submission is identified by the client's Idempotency-Key header or, when
+there is none, by a fingerprint of the lead's email and answers: double
+clicks, frontend retries and n8n replays of the same diagnostic map to the
+same key. While a submission is running, duplicates join it (`SingleFlight`,
+per process); once it is saved, they are answered from the stored diagnostic
+(see `server.find_submission`).
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from metrics import IDEMPOTENT_REPLAYS
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """An Idempotency-Key reused for a different diagnostic"""
+
+
+def request_fingerprint(email: str, answers: Dict[str, int]) -> str:
+    normalized = {
+        "email": email.strip().lower(),
+        # Keys sorted as strings: unknown, non-numeric ones are accepted (and
+        # ignored by scoring)
+        "answers": sorted(answers.items())
+    }
+    return hashlib.sha256(json.dumps(normalized, separators=(",", ":")).encode()).hexdigest()
+
+
+def submission_key(header: Optional[str], fingerprint: str) -> str:
+    if header:
+        if len(header) > MAX_KEY_LENGTH:
+            raise ValueError(f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters")
+        return f"key:{header}"
+    return f"auto:{fingerprint}"
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution
+
+    The execution runs in its own task, so a caller going away does not
+    cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Tuple[str, asyncio.Task]] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: str, fingerprint: str, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Result of `call`, or of the running call with the same key; and whether it was joined"""
+        running = self._calls.get(key)
+        if running is not None:
+            running_fingerprint, task = running
+            if running_fingerprint != fingerprint:
+                raise IdempotencyConflict(key)
+            IDEMPOTENT_REPLAYS.labels("in_flight").inc()
+            return await asyncio.shield(task), True
+
+        task = asyncio.create_task(call())
+        self._calls[key] = (fingerprint, task)
+        task.add_done_callback(lambda _: self._forget(key, task))
+        return await asyncio.shield(task), False
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._calls.get(key, (None, None))[1] is task:
+            del self._calls[key]
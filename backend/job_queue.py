@@ -0,0 +1,196 @@
+"""
+Mongo-backed job queue for asynchronous diagnostic analyses.
+
+Submitting stores the request as a `queued` job and returns its ID right away;
+a pool of background workers claims jobs, runs the handler and stores the
+result. Finished jobs are removed by a TTL index on `finished_at`,
+`ttl_seconds` after they finish; queued and running jobs never expire.
+
+On `stop`, workers stop claiming jobs and those mid-job get up to
+`drain_seconds` to finish it, so a handler is not cut off after its side
+effects (saved diagnostic, queued webhook) and re-run by another instance.
+
+Job lifecycle: queued -> running -> done | failed
+A job whose worker died mid-run (lease expired) is claimed again, up to
+`max_attempts` times.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+FINISHED = (DONE, FAILED)
+
+
+class JobQueue:
+    """Mongo job store with a pool of background workers"""
+
+    def __init__(
+        self,
+        collection,
+        handler: Callable[[dict], Awaitable[dict]],
+        *,
+        workers: int = 4,
+        ttl_seconds: int = 24 * 3600,
+        lease_seconds: float = 120.0,
+        max_attempts: int = 3,
+        poll_interval: float = 2.0,
+        drain_seconds: float = 60.0
+    ):
+        self.collection = collection
+        self.handler = handler
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.drain_seconds = drain_seconds
+        self._tasks = []
+        # Workers currently running a job
+        self._busy = set()
+        self._wakeup = asyncio.Event()
+        self._finished: Dict[str, asyncio.Event] = {}
+        self._running = False
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+        # The TTL used to be on created_at, which also expired queued and
+        # running jobs
+        indexes = await self.collection.index_information()
+        if "expireAfterSeconds" in indexes.get("created_at_1", {}):
+            await self.collection.drop_index("created_at_1")
+        await self.collection.create_index("finished_at", expireAfterSeconds=self.ttl_seconds)
+
+    async def submit(self, payload: dict) -> str:
+        now = datetime.now(timezone.utc)
+        job = {
+            "_id": str(uuid.uuid4()),
+            "status": QUEUED,
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now
+        }
+        await self.collection.insert_one(job)
+        self._wakeup.set()
+        return job["_id"]
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"_id": job_id}, {"payload": 0})
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """The job once finished (or as it is when `timeout` expires); None if unknown
+
+        Jobs run by this process wake the waiter immediately; jobs run by
+        another process are picked up by polling every `poll_interval`.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        event = self._finished.setdefault(job_id, asyncio.Event())
+        try:
+            while True:
+                job = await self.get(job_id)
+                remaining = deadline - loop.time()
+                if job is None or job["status"] in FINISHED or remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=min(self.poll_interval, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._finished.pop(job_id, None)
+
+    async def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        logger.info(f"Job queue started with {self.workers} worker(s)")
+
+    async def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        busy = [task for task in self._tasks if task in self._busy]
+        for task in self._tasks:
+            if task not in self._busy:
+                task.cancel()
+        if busy:
+            logger.info(f"Waiting for {len(busy)} running job(s) to finish")
+            await asyncio.wait(busy, timeout=self.drain_seconds)
+        # Jobs still running are reclaimed after their lease
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def stats(self) -> Dict[str, int]:
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        async for row in self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+    async def _run(self):
+        while self._running:
+            try:
+                job = await self._claim()
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                self._busy.add(asyncio.current_task())
+                try:
+                    await self.process(job)
+                finally:
+                    self._busy.discard(asyncio.current_task())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job queue worker error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _claim(self) -> Optional[dict]:
+        """Atomically take the oldest queued job (or one whose worker died)"""
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": QUEUED},
+                {"status": RUNNING, "updated_at": {"$lte": now - self.lease}}
+            ]},
+            {"$set": {"status": RUNNING, "updated_at": now}, "$inc": {"attempts": 1}},
+            sort=[("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def process(self, job: dict):
+        """Run one claimed job and store its outcome"""
+        if job["attempts"] > self.max_attempts:
+            update = {"status": FAILED, "error": f"Abandoned after {self.max_attempts} attempts"}
+        else:
+            try:
+                update = {"status": DONE, "result": await self.handler(job["payload"])}
+            except Exception as e:
+                logger.error(f"Job {job['_id']} failed: {e}")
+                update = {"status": FAILED, "error": str(e) or type(e).__name__}
+        update["updated_at"] = update["finished_at"] = datetime.now(timezone.utc)
+        await self.collection.update_one({"_id": job["_id"]}, {"$set": update})
+
+        event = self._finished.get(job["_id"])
+        if event is not None:
+            event.set()
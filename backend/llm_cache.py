@@ -0,0 +1,128 @@
+"""
+Persistent cache of GPT analyses, stored in Mongo with a TTL.
+
+Entries are keyed on a normalized hash of the answers, scores and segment
+(plus the lead's unit count, which the prompt exposes to the model). The
+lead's name and city are replaced by placeholders before storing and put
+back after lookup, so one completion serves every lead with the same
+diagnostic. Values are matched regardless of case (a lead typing "jean"
+still gets "Jean" replaced), and an analysis that cannot be fully
+de-personalized is not cached.
+"""
+import hashlib
+import json
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PERSONAL_FIELDS = {
+    "first_name": "firstName",
+    "last_name": "lastName",
+    "city": "city"
+}
+
+
+def _personal_values(user_info) -> Dict[str, str]:
+    values = {}
+    for placeholder, attribute in PERSONAL_FIELDS.items():
+        value = (getattr(user_info, attribute, "") or "").strip()
+        if value:
+            values[placeholder] = value
+    return values
+
+
+def _to_template(text: str, personal: Dict[str, str]) -> str:
+    # Longest values first so "Jean-Marc" is not cut by "Jean"
+    for placeholder, value in sorted(personal.items(), key=lambda item: -len(item[1])):
+        text = re.sub(rf"(?<!\w){re.escape(value)}(?!\w)", "{" + placeholder + "}", text, flags=re.IGNORECASE)
+    return text
+
+
+def _leaks_personal(templated: dict, personal: Dict[str, str]) -> bool:
+    """True if a templated analysis would carry this lead's details to others"""
+    texts = [value.casefold() for value in templated.values() if isinstance(value, str)]
+    if any(value.casefold() in text for value in personal.values() for text in texts):
+        return True
+    # The summary addresses the lead by name: if the name was not found, GPT
+    # wrote it in a form the templating missed
+    return "first_name" in personal and "{first_name}" not in templated.get("diagSummary", "")
+
+
+def _from_template(text: str, personal: Dict[str, str]) -> str:
+    for placeholder in PERSONAL_FIELDS:
+        text = text.replace("{" + placeholder + "}", personal.get(placeholder, ""))
+    return text
+
+
+class LLMResponseCache:
+    """Mongo-backed cache of GPT analyses with TTL expiry"""
+
+    def __init__(self, collection, *, ttl_seconds: int, version: str):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    async def ensure_indexes(self):
+        if self.enabled:
+            await self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+
+    def key_for(self, answers: Dict[str, int], scores: Dict[str, int], segment: str, units: str) -> str:
+        normalized = {
+            "version": self.version,
+            "segment": segment,
+            "answers": sorted(answers.items()),
+            "scores": [scores.get(name, 0) for name in ("total", "structure", "acquisition", "value")],
+            "units": (units or "").strip()
+        }
+        return hashlib.sha256(json.dumps(normalized, separators=(",", ":")).encode()).hexdigest()
+
+    async def get(self, key: str, user_info) -> Optional[dict]:
+        """Cached analysis personalized for `user_info`, or None on a miss"""
+        if not self.enabled:
+            return None
+        try:
+            entry = await self.collection.find_one({"_id": key}, {"analysis": 1})
+        except Exception as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        personal = _personal_values(user_info)
+        return {
+            field: _from_template(value, personal) if isinstance(value, str) else value
+            for field, value in entry["analysis"].items()
+        }
+
+    async def put(self, key: str, analysis: dict, user_info):
+        if not self.enabled:
+            return
+        personal = _personal_values(user_info)
+        templated = {
+            field: _to_template(value, personal) if isinstance(value, str) else value
+            for field, value in analysis.items()
+        }
+        if _leaks_personal(templated, personal):
+            logger.info("GPT analysis not cached: personal details could not be templated")
+            return
+        try:
+            await self.collection.replace_one(
+                {"_id": key},
+                {"analysis": templated, "created_at": datetime.now(timezone.utc)},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"LLM cache store failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
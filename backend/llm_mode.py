@@ -0,0 +1,71 @@
+"""
+Whether an analysis gets its summary from GPT or only the deterministic one.
+
+Modes (LLM_MODE, switchable at runtime through the admin endpoint):
+    gpt            every analysis calls GPT (default)
+    deterministic  GPT is skipped entirely, e.g. to shed load at peak traffic
+    rollout        `rollout_percent` % of leads get GPT, the others the
+                   deterministic analysis; a lead always lands in the same
+                   variant, so conversions can be compared per variant
+
+A request may opt out of GPT by asking for the deterministic variant. It
+cannot opt in: asking for GPT is ignored, so clients cannot bypass load
+shedding or pick their own rollout variant.
+"""
+import hashlib
+import logging
+from typing import Optional
+
+from metrics import LLM_VARIANTS
+
+logger = logging.getLogger(__name__)
+
+GPT = "gpt"
+DETERMINISTIC = "deterministic"
+ROLLOUT = "rollout"
+
+MODES = (GPT, DETERMINISTIC, ROLLOUT)
+VARIANTS = (GPT, DETERMINISTIC)
+
+
+class GPTDisabled(Exception):
+    # Label of diagnostic_gpt_fallbacks_total
+    fallback_reason = "disabled"
+
+
+def rollout_bucket(email: str) -> int:
+    """Stable 0-99 bucket of a lead"""
+    digest = hashlib.sha256(email.strip().lower().encode()).digest()
+    return int.from_bytes(digest[:8], "big") % 100
+
+
+class LLMModeSwitch:
+    def __init__(self, mode: str = GPT, rollout_percent: int = 100):
+        self.mode = GPT
+        self.rollout_percent = 100
+        self.set(mode, rollout_percent)
+
+    def set(self, mode: str, rollout_percent: Optional[int] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown LLM mode '{mode}' (expected one of {', '.join(MODES)})")
+        if rollout_percent is not None:
+            if not 0 <= rollout_percent <= 100:
+                raise ValueError("rollout_percent must be between 0 and 100")
+            self.rollout_percent = rollout_percent
+        if mode != self.mode:
+            logger.warning(f"LLM mode {self.mode} -> {mode}")
+        self.mode = mode
+
+    def variant_for(self, email: str, requested: Optional[str] = None) -> str:
+        """Variant served to a lead, counted in diagnostic_llm_variants_total"""
+        if self.mode == DETERMINISTIC or requested == DETERMINISTIC:
+            variant = DETERMINISTIC
+        elif self.mode == ROLLOUT:
+            variant = GPT if rollout_bucket(email) < self.rollout_percent else DETERMINISTIC
+        else:
+            variant = GPT
+        LLM_VARIANTS.labels(variant).inc()
+        return variant
+
+    def snapshot(self) -> dict:
+        return {"mode": self.mode, "rolloutPercent": self.rollout_percent}
@@ -0,0 +1,108 @@
+"""
+Prometheus metrics for the diagnostic pipeline, served on /metrics.
+
+Stages of an analysis (label `stage` of diagnostic_stage_duration_seconds):
+    prompt         generate_analysis_prompt
+    openai         GPT completion, including the wait for a concurrency slot
+    deterministic  analyze_diagnostic
+    persist        Mongo insert + webhook enqueue
+"""
+import asyncio
+import json
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+STAGES = ("prompt", "openai", "deterministic", "persist")
+
+STAGE_LATENCY = Histogram(
+    "diagnostic_stage_duration_seconds",
+    "Time spent in each stage of a diagnostic analysis",
+    ["stage"],
+    # From sub-millisecond template rendering to GPT calls hitting OPENAI_TIMEOUT
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+)
+_STAGE_TIMERS = {stage: STAGE_LATENCY.labels(stage) for stage in STAGES}
+
+GPT_FALLBACKS = Counter(
+    "diagnostic_gpt_fallbacks_total",
+    "Analyses served with the deterministic summary because the GPT step failed or was disabled (LLM mode)",
+    ["reason"]
+)
+WEBHOOK_FAILURES = Counter(
+    "webhook_failures_total",
+    "Audit webhook failures: enqueue (not written to the outbox), retry (delivery attempt failed), dead (gave up)",
+    ["kind"]
+)
+DB_SAVE_FAILURES = Counter(
+    "diagnostic_db_save_failures_total",
+    "Diagnostics that could not be written to Mongo"
+)
+LATENCY_BUDGET_EXCEEDED = Counter(
+    "diagnostic_latency_budget_exceeded_total",
+    "Analyses answered with the deterministic summary because GPT missed ANALYZE_LATENCY_BUDGET"
+)
+LLM_VARIANTS = Counter(
+    "diagnostic_llm_variants_total",
+    "Analyses by LLM variant assigned (gpt or deterministic), see llm_mode.py",
+    ["variant"]
+)
+IDEMPOTENT_REPLAYS = Counter(
+    "diagnostic_idempotent_replays_total",
+    "Duplicate submissions answered without a new analysis: in_flight (joined a running one) or stored (saved diagnostic)",
+    ["source"]
+)
+GPT_PARSE_RESULTS = Counter(
+    "gpt_parse_results_total",
+    "GPT analyses by parse outcome: valid (schema-conformant), repaired (salvaged from malformed output), invalid",
+    ["outcome"]
+)
+GPT_TOKENS = Histogram(
+    "gpt_tokens_per_request",
+    "Tokens billed per GPT completion: prompt, cached_prompt (served from the provider's prompt cache), completion",
+    ["kind"],
+    buckets=(0, 50, 100, 200, 300, 400, 600, 800, 1000, 1500, 2000, 3000)
+)
+CIRCUIT_STATE = Gauge(
+    "circuit_breaker_state",
+    "Circuit breaker state: 0 closed, 1 half-open, 2 open",
+    ["name"]
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state changes, by state entered",
+    ["name", "state"]
+)
+
+# Export every series from the start, at 0, so rate() works before the first failure
+for _reason in ("timeout", "circuit_open", "invalid_response", "disabled", "error"):
+    GPT_FALLBACKS.labels(_reason)
+for _kind in ("enqueue", "retry", "dead"):
+    WEBHOOK_FAILURES.labels(_kind)
+for _variant in ("gpt", "deterministic"):
+    LLM_VARIANTS.labels(_variant)
+for _outcome in ("valid", "repaired", "invalid"):
+    GPT_PARSE_RESULTS.labels(_outcome)
+
+
+def stage(name: str):
+    """Context manager timing one pipeline stage"""
+    return _STAGE_TIMERS[name].time()
+
+
+def fallback_reason(error: Exception) -> str:
+    if hasattr(error, "fallback_reason"):
+        return error.fallback_reason
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, (json.JSONDecodeError, KeyError, AttributeError)):
+        return "invalid_response"
+    return "error"
+
+
+def record_gpt_fallback(error: Exception):
+    GPT_FALLBACKS.labels(fallback_reason(error)).inc()
+
+
+def render_latest():
+    """Body and content type of the /metrics response"""
+    return generate_latest(), CONTENT_TYPE_LATEST
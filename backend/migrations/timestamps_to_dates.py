@@ -0,0 +1,90 @@
+"""
+One-shot migration: ISO-string `timestamp` fields -> native BSON dates
+
+Converts `diagnostics` and `status_checks` documents written before
+timestamps were stored as datetimes. Documents already migrated are not
+matched, so the script can be re-run safely (e.g. after an interrupted run).
+
+Usage (from backend/, with MONGO_URL and DB_NAME set or in backend/.env):
+    python -m migrations.timestamps_to_dates [--dry-run] [--batch-size 1000]
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+COLLECTIONS = ("diagnostics", "status_checks")
+STRING_TIMESTAMP = {"timestamp": {"$type": "string"}}
+
+
+def parse_timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        # Naive strings were written as UTC
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+async def migrate_collection(collection, batch_size: int = 1000, dry_run: bool = False) -> dict:
+    """Convert one collection in batches; returns converted/failed counts"""
+    counts = {"converted": 0, "failed": 0}
+    if dry_run:
+        counts["converted"] = await collection.count_documents(STRING_TIMESTAMP)
+        return counts
+
+    failed_ids = []
+    while True:
+        query = {**STRING_TIMESTAMP, "_id": {"$nin": failed_ids}} if failed_ids else STRING_TIMESTAMP
+        docs = await collection.find(query, {"timestamp": 1}).limit(batch_size).to_list(batch_size)
+        if not docs:
+            return counts
+        operations = []
+        for doc in docs:
+            try:
+                timestamp = parse_timestamp(doc["timestamp"])
+            except ValueError:
+                failed_ids.append(doc["_id"])
+                continue
+            # Filter on the original value: a concurrent write wins
+            operations.append(UpdateOne(
+                {"_id": doc["_id"], "timestamp": doc["timestamp"]},
+                {"$set": {"timestamp": timestamp}}
+            ))
+        if operations:
+            result = await collection.bulk_write(operations, ordered=False)
+            counts["converted"] += result.modified_count
+        counts["failed"] = len(failed_ids)
+
+
+async def migrate(db, batch_size: int = 1000, dry_run: bool = False) -> dict:
+    return {
+        name: await migrate_collection(db[name], batch_size, dry_run)
+        for name in COLLECTIONS
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dry-run", action="store_true", help="only count the documents to convert")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        results = asyncio.run(migrate(client[os.environ['DB_NAME']], args.batch_size, args.dry_run))
+    finally:
+        client.close()
+
+    for name, counts in results.items():
+        verb = "to convert" if args.dry_run else "converted"
+        print(f"{name}: {counts['converted']} {verb}, {counts['failed']} unparseable")
+
+
+if __name__ == "__main__":
+    main()
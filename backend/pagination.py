@@ -0,0 +1,76 @@
+"""
+Keyset (cursor) pagination over Mongo collections sorted newest first.
+
+Pages are ordered on (timestamp, _id) descending; the cursor is the sort key
+of the last document returned, so each page is a range scan on the
+(timestamp, _id) index instead of a growing skip.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING
+
+SORT = [("timestamp", DESCENDING), ("_id", DESCENDING)]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(doc: dict) -> str:
+    key = json.dumps([doc["timestamp"].isoformat(), str(doc["_id"])], separators=(",", ":"))
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, object_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(timestamp), ObjectId(object_id)
+    except (ValueError, TypeError, InvalidId) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def timestamp_range(start: Optional[datetime], end: Optional[datetime]) -> dict:
+    """Query on `timestamp` >= start and < end (either bound optional)"""
+    bounds = {}
+    if start is not None:
+        bounds["$gte"] = start
+    if end is not None:
+        bounds["$lt"] = end
+    return {"timestamp": bounds} if bounds else {}
+
+
+def after_cursor(query: dict, cursor: Optional[str]) -> dict:
+    """Restrict `query` to the documents that come after `cursor`"""
+    if not cursor:
+        return query
+    timestamp, object_id = decode_cursor(cursor)
+    page = {"$or": [
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$lt": object_id}}
+    ]}
+    return {"$and": [query, page]} if query else page
+
+
+async def fetch_page(collection, query: dict, projection: dict, limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """One page of documents and the cursor of the next page (None on the last one)
+
+    `_id` and `timestamp` are always read to build the cursor; `_id` is dropped
+    from the returned documents, as is `timestamp` unless it was projected.
+    """
+    keep_timestamp = projection.get("timestamp", 0) == 1
+    fields = {**projection, "_id": 1, "timestamp": 1}
+    docs = await collection.find(after_cursor(query, cursor), fields).sort(SORT).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    docs = docs[:limit]
+    for doc in docs:
+        del doc["_id"]
+        if not keep_timestamp:
+            doc.pop("timestamp", None)
+    return docs, next_cursor
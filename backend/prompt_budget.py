@@ -0,0 +1,62 @@
+"""
+Token accounting for the GPT analysis prompt.
+
+`count_tokens` measures text offline with tiktoken's o200k_base encoding (the
+gpt-4o family's), falling back to an estimate of 4 characters per token when
+tiktoken or its encoding file is not available. `record_usage` reports what
+the API actually billed for a completion, as returned in `completion.usage`.
+"""
+import importlib.util
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from metrics import GPT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+ENCODING = "o200k_base"
+CHARS_PER_TOKEN = 4
+# Chat format overhead: per message, plus the reply priming
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if importlib.util.find_spec("tiktoken") is None:
+        return None
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(ENCODING)
+    except Exception as e:
+        # The encoding file is downloaded on first use: unavailable offline
+        logger.warning(f"tiktoken encoding {ENCODING} unavailable, estimating tokens: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Prompt tokens of a chat completion request"""
+    return sum(count_tokens(message["content"]) + TOKENS_PER_MESSAGE for message in messages) + TOKENS_PER_REPLY
+
+
+def record_usage(usage) -> Optional[Dict[str, int]]:
+    """Count the tokens billed for one completion; None if the API sent no usage"""
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    tokens = {
+        "prompt": usage.prompt_tokens,
+        "cached_prompt": (getattr(details, "cached_tokens", None) or 0),
+        "completion": usage.completion_tokens
+    }
+    for kind, count in tokens.items():
+        GPT_TOKENS.labels(kind).observe(count)
+    return tokens
@@ -0,0 +1,73 @@
+"""
+Server-side scoring of diagnostic answers.
+
+Each answer is worth 0-2 points. The blocks of the questionnaire are rows of a
+weight matrix, so one diagnostic and a whole import batch are scored the same
+way: answers (n x 22) @ WEIGHTS.T -> block scores (n x 3).
+"""
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+QUESTION_COUNT = 22
+QUESTION_IDS = [str(q) for q in range(1, QUESTION_COUNT + 1)]
+
+# Block name -> first and last question (inclusive)
+BLOCKS = {
+    "structure": (1, 10),
+    "acquisition": (11, 19),
+    "value": (20, 22)
+}
+
+WEIGHTS = np.zeros((len(BLOCKS), QUESTION_COUNT), dtype=np.int64)
+for _row, (_first, _last) in enumerate(BLOCKS.values()):
+    WEIGHTS[_row, _first - 1:_last] = 1
+
+MAX_ANSWER = 2
+BLOCK_MAX = {name: (last - first + 1) * MAX_ANSWER for name, (first, last) in BLOCKS.items()}
+
+# Upper bound (inclusive) of each segment's total score; above the last is "machine"
+SEGMENTS = ("artisanal", "transition", "machine")
+SEGMENT_THRESHOLDS = (18, 32)
+
+
+def answers_matrix(answer_sets: Sequence[Dict[str, int]]) -> np.ndarray:
+    """One row per diagnostic, one column per question; missing answers count 0
+
+    Out-of-range answers are clamped to 0-2 before the matrix is built: any
+    int is accepted on input, and values beyond int64 would not fit in it.
+    """
+    rows = [[min(max(answers.get(q_id, 0), 0), MAX_ANSWER) for q_id in QUESTION_IDS] for answers in answer_sets]
+    return np.array(rows, dtype=np.int64).reshape(len(answer_sets), QUESTION_COUNT)
+
+
+def segments_for(totals: np.ndarray) -> List[str]:
+    indexes = np.searchsorted(SEGMENT_THRESHOLDS, totals, side="left")
+    return [SEGMENTS[index] for index in indexes.tolist()]
+
+
+def segment_for(total: int) -> str:
+    """Scalar version of `segments_for`, for callers that already have a total"""
+    return SEGMENTS[bisect_left(SEGMENT_THRESHOLDS, total)]
+
+
+def weakest_block(scores: Dict[str, int]) -> str:
+    """Block with the lowest percentage of its maximum (first one on ties)"""
+    return min(BLOCKS, key=lambda name: round(scores.get(name, 0) / BLOCK_MAX[name] * 100))
+
+
+def compute_scores(answer_sets: Sequence[Dict[str, int]]) -> List[Tuple[Dict[str, int], str]]:
+    """Scores and segment of each answer set, computed in one pass"""
+    if not answer_sets:
+        return []
+    blocks = answers_matrix(answer_sets) @ WEIGHTS.T
+    totals = blocks.sum(axis=1)
+    segments = segments_for(totals)
+    names = list(BLOCKS)
+    results = []
+    for row, total, segment in zip(blocks.tolist(), totals.tolist(), segments):
+        scores = {"total": total}
+        scores.update(zip(names, row))
+        results.append((scores, segment))
+    return results
@@ -1,37 +1,231 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Body, Header, Query, Response, WebSocket
+from fastapi.responses import ORJSONResponse, Response as PlainResponse, StreamingResponse
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import hmac
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Dict, Optional
+from pydantic import BaseModel, Field, ConfigDict, ValidationError, field_validator
+from typing import Any, List, Dict, Literal, Optional, Tuple
 import uuid
-from datetime import datetime, timezone
-from openai import OpenAI
-import json
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import importlib.util
 import httpx
-
-# Webhook URL for sending audit data
-WEBHOOK_AUDIT_URL = "https://n8n.srv903010.hstgr.cloud/webhook/leon_audit_done"
-
+from openai import AsyncOpenAI
+from pymongo import ASCENDING, DESCENDING
+import asyncio
+import orjson
+
+from analysis_content import CONTENT_BUNDLE, CONTENT_VERSION, compile_analysis
+from circuit_breaker import CircuitBreaker
+from compression import CompressionMiddleware, base_etag
+from content_store import PERSONAL_DOCUMENT_FIELDS, STORED_SECTIONS, ContentStore
+from idempotency import IdempotencyConflict, SingleFlight, request_fingerprint, submission_key
+from job_queue import DONE, FAILED, FINISHED, JobQueue
+from llm_cache import LLMResponseCache
+from llm_mode import DETERMINISTIC, GPTDisabled, LLMModeSwitch
+from metrics import DB_SAVE_FAILURES, IDEMPOTENT_REPLAYS, LATENCY_BUDGET_EXCEEDED, WEBHOOK_FAILURES, record_gpt_fallback, render_latest, stage
+from pagination import InvalidCursor, fetch_page, timestamp_range
+from prompt_budget import record_usage
+from scoring import BLOCK_MAX, BLOCKS, MAX_ANSWER, compute_scores, segment_for, weakest_block
+from tracing import FileSpanExporter, HTTPSpanExporter, TracingMiddleware, current_span, span, tracer
+from gpt_parsing import RESPONSE_FORMAT, JSONStringFieldExtractor, parse_analysis
+from webhook_outbox import WebhookOutbox
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Webhook URL for sending audit data (point it at a fake receiver for load tests)
+WEBHOOK_AUDIT_URL = os.environ.get('WEBHOOK_AUDIT_URL', 'https://n8n.srv903010.hstgr.cloud/webhook/leon_audit_done')
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
+# Outbound HTTP (OpenAI, webhooks, trace export) shares one keep-alive pool,
+# created and closed by the app lifespan. HTTP/2 is used when `h2` is installed.
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY', '30'))
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(10.0)
+    )
+
+
 # OpenAI client - using real OpenAI API
-openai_client = OpenAI(
-    api_key=os.environ.get('OPENAI_API_KEY')
+# Async client so a GPT round-trip never blocks the event loop; the semaphore
+# caps how many completions are in flight at once and the timeout bounds both
+# the wait for a slot and the call itself.
+OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', '30'))
+OPENAI_MAX_CONCURRENCY = int(os.environ.get('OPENAI_MAX_CONCURRENCY', '16'))
+# The four JSON fields take ~350 tokens in practice
+OPENAI_MAX_TOKENS = int(os.environ.get('OPENAI_MAX_TOKENS', '600'))
+
+
+def create_openai_client(http_client: Optional[httpx.AsyncClient] = None) -> AsyncOpenAI:
+    return AsyncOpenAI(
+        api_key=os.environ.get('OPENAI_API_KEY'),
+        timeout=OPENAI_TIMEOUT,
+        max_retries=0,
+        http_client=http_client
+    )
+
+
+# Replaced by a client on the shared pool when the app starts
+openai_client = create_openai_client()
+llm_semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+
+# When OpenAI keeps failing or answering slowly, skip it (deterministic
+# summary right away) and probe again after OPENAI_BREAKER_RESET_SECONDS
+openai_breaker = CircuitBreaker(
+    "openai",
+    failure_threshold=int(os.environ.get('OPENAI_BREAKER_FAILURES', '5')),
+    slow_call_seconds=float(os.environ.get('OPENAI_BREAKER_SLOW_CALL_SECONDS', '15')),
+    reset_timeout=float(os.environ.get('OPENAI_BREAKER_RESET_SECONDS', '30'))
+)
+
+# GPT analyses are cached in Mongo, keyed on the diagnostic rather than the
+# lead. Bump PROMPT_VERSION whenever generate_analysis_prompt changes.
+PROMPT_VERSION = "2"
+llm_cache = LLMResponseCache(
+    db.llm_cache,
+    ttl_seconds=int(os.environ.get('LLM_CACHE_TTL_SECONDS', str(7 * 24 * 3600))),
+    version=f"gpt-4o-mini:{PROMPT_VERSION}"
 )
 
+# /diagnostic/analyze answers within this many seconds (0 = wait for GPT): a
+# GPT summary still pending by then is stored on the diagnostic when it lands
+ANALYZE_LATENCY_BUDGET = float(os.environ.get('ANALYZE_LATENCY_BUDGET', '2.5'))
+
+# Repeated /diagnostic/analyze submissions (double clicks, retries after the
+# frontend's 60 s timeout, n8n replays) within this many seconds get the
+# first one's diagnostic instead of a new analysis (0 = no deduplication)
+IDEMPOTENCY_WINDOW = int(os.environ.get('IDEMPOTENCY_WINDOW_SECONDS', '900'))
+submissions = SingleFlight()
+
+# Deterministic analysis skeletons cached per score vector (at most 45x21x19x7)
+ANALYSIS_CACHE_SIZE = int(os.environ.get('ANALYSIS_CACHE_SIZE', '4096'))
+
+# The analysis texts are also served as a versioned bundle; the unversioned
+# URL is revalidated after this many seconds, versioned URLs never change
+CONTENT_BUNDLE_MAX_AGE = int(os.environ.get('CONTENT_BUNDLE_MAX_AGE', '300'))
+CONTENT_BUNDLE_JSON = orjson.dumps(CONTENT_BUNDLE)
+CONTENT_ETAG = f'"{CONTENT_VERSION}"'
+
+# Long analysis sections are stored once in db.content_blocks and referenced
+# from db.diagnostics; hot blocks stay in an in-process LRU
+content_store = ContentStore(
+    db.content_blocks,
+    version=CONTENT_VERSION,
+    cache_size=int(os.environ.get('CONTENT_CACHE_SIZE', '1024'))
+)
+
+# Batch imports: items analyzed in parallel per batch (GPT calls still share
+# llm_semaphore with the rest of the service)
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '5000'))
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '8'))
+
+# GPT can be turned off (LLM_MODE=deterministic) or served to a share of
+# leads (LLM_MODE=rollout); switchable at runtime with the admin token
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+llm_mode = LLMModeSwitch(
+    os.environ.get('LLM_MODE', 'gpt'),
+    int(os.environ.get('LLM_ROLLOUT_PERCENT', '100'))
+)
+
+# Audit webhooks are queued in Mongo and delivered by background workers;
+# delivered entries are pruned after a week, dead ones after 90 days
+webhook_outbox = WebhookOutbox(
+    db.webhook_outbox,
+    workers=int(os.environ.get('WEBHOOK_WORKERS', '2')),
+    max_attempts=int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', '8')),
+    delivered_ttl=int(os.environ.get('WEBHOOK_DELIVERED_TTL_SECONDS', str(7 * 24 * 3600))),
+    dead_ttl=int(os.environ.get('WEBHOOK_DEAD_TTL_SECONDS', str(90 * 24 * 3600)))
+)
+
+# Request tracing: TRACE_EXPORT is a file path (JSON lines) or a collector URL.
+# With TRACE_MIN_DURATION_MS, only requests at least that slow are exported.
+TRACE_EXPORT = os.environ.get('TRACE_EXPORT', '')
+if TRACE_EXPORT.startswith(('http://', 'https://')):
+    span_exporter = HTTPSpanExporter(TRACE_EXPORT)
+elif TRACE_EXPORT:
+    span_exporter = FileSpanExporter(TRACE_EXPORT)
+else:
+    span_exporter = None
+tracer.configure(span_exporter, min_duration=float(os.environ.get('TRACE_MIN_DURATION_MS', '0')) / 1000)
+
+# Job mode: analyses submitted to /diagnostic/jobs run on a worker pool;
+# finished jobs (and their results) are kept JOB_TTL_SECONDS. On shutdown
+# running jobs get JOB_DRAIN_SECONDS to finish.
+JOB_WAIT_TIMEOUT = float(os.environ.get('JOB_WAIT_TIMEOUT', '300'))
+job_queue = JobQueue(
+    db.diagnostic_jobs,
+    lambda payload: run_diagnostic_job(payload),
+    workers=int(os.environ.get('JOB_WORKERS', '4')),
+    ttl_seconds=int(os.environ.get('JOB_TTL_SECONDS', str(24 * 3600))),
+    drain_seconds=float(os.environ.get('JOB_DRAIN_SECONDS', '60'))
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the shared HTTP pool and background workers; close everything on shutdown"""
+    global openai_client
+    
+    http_client = create_http_client()
+    app.state.http_client = http_client
+    openai_client = create_openai_client(http_client)
+    
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logger.warning(f"Failed to create indexes: {e}")
+    try:
+        await webhook_outbox.ensure_indexes()
+    except Exception as e:
+        logger.warning(f"Failed to create webhook outbox indexes: {e}")
+    try:
+        await job_queue.ensure_indexes()
+    except Exception as e:
+        logger.warning(f"Failed to create job queue indexes: {e}")
+    await webhook_outbox.start(http_client)
+    await job_queue.start()
+    if span_exporter is not None:
+        await span_exporter.start(http_client)
+    
+    try:
+        yield
+    finally:
+        # Running jobs finish (bounded by JOB_DRAIN_SECONDS); any cut off are
+        # reclaimed after their lease by the next instance
+        await job_queue.stop()
+        # Let running streams, batches and late GPT summaries finish and save
+        if analysis_tasks:
+            await asyncio.wait(list(analysis_tasks), timeout=OPENAI_TIMEOUT)
+        await webhook_outbox.stop()
+        if span_exporter is not None:
+            await span_exporter.stop()
+        await http_client.aclose()
+        client.close()
+
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -61,7 +255,18 @@ class UserInfo(BaseModel):
 class DiagnosticRequest(BaseModel):
     userInfo: UserInfo
     answers: Dict[str, int]
-    scores: Dict[str, int]
+    # Ignored on input: replaced by the scores computed from `answers`
+    scores: Optional[Dict[str, int]] = None
+    # "deterministic" skips GPT ("gpt" is accepted but does not override the
+    # mode); replaced by the variant assigned by `llm_mode`
+    llm: Optional[Literal["gpt", "deterministic"]] = None
+    
+    @field_validator("answers")
+    @classmethod
+    def clamp_answers(cls, answers: Dict[str, int]) -> Dict[str, int]:
+        # Out-of-range answers count as the nearest bound, as in scoring;
+        # clamped here so oversized ints never reach numpy, BSON or orjson
+        return {q_id: min(max(value, 0), MAX_ANSWER) for q_id, value in answers.items()}
 
 class DiagnosticResponse(BaseModel):
     firstName: str
@@ -86,68 +291,80 @@ class DiagnosticResponse(BaseModel):
     roadmap: Optional[dict] = None
 
 
-# Questions data for context
-QUESTIONS_CONTEXT = """
-BLOC 1 - STRUCTURE INTERNE (Q1-Q10, max 20 pts):
-- Q1: Rôle au quotidien (opérationnel vs pilotage)
-- Q2: Capacité à s'absenter 10 jours
-- Q3: Clarté des rôles et responsabilités
-- Q4: Répartition des fonctions clés
-- Q5: Process écrits pour situations critiques
-- Q6: Gestion des tâches (outils)
-- Q7: Qualité du stack outils (PMS, automatisations)
-- Q8: Synchronisation des informations
-- Q9: Vision logement par logement (performance)
-- Q10: Suivi des indicateurs clés (CA, marge, occupation)
-
-BLOC 2 - MOTEUR D'ACQUISITION (Q11-Q19, max 18 pts):
-- Q11: Origine des nouveaux propriétaires
-- Q12: Capacité d'absorption de nouveaux logements
-- Q13: Site internet (SEO local)
-- Q14: Fiche Google My Business
-- Q15: Réseaux sociaux côté propriétaires
-- Q16: Gestion des leads propriétaires (CRM)
-- Q17: Nurturing des "pas maintenant"
-- Q18: Maîtrise des chiffres d'acquisition
-- Q19: Prévisibilité globale de l'acquisition
-
-BLOC 3 - VALEUR & REVENDABILITÉ (Q20-Q22, max 6 pts):
-- Q20: Dépendance à la personne du gérant
-- Q21: Qualité du portefeuille propriétaires (contrats)
-- Q22: Regard d'un banquier/investisseur sur le business
-
-SCORING:
-- 0 = situation problématique/artisanale
-- 1 = en cours de structuration mais fragile
-- 2 = bien structuré/professionnel
-
-SEGMENTS:
-- 0-18 pts: "artisanal" (conciergerie artisanale fragile)
-- 19-32 pts: "transition" (entreprise en transition)
-- 33-44 pts: "machine" (machine en devenir)
-"""
-
-
-def generate_analysis_prompt(user_info: UserInfo, answers: Dict[str, int], scores: Dict[str, int]) -> str:
-    """Generate the prompt for GPT analysis"""
-    
-    # Determine segment
-    total_score = scores.get('total', 0)
-    if total_score <= 18:
-        segment = "artisanal"
-    elif total_score <= 32:
-        segment = "transition"
-    else:
-        segment = "machine"
+# Questions data for context, by block of scoring.BLOCKS
+BLOCK_TITLES = {
+    "structure": "STRUCTURE INTERNE",
+    "acquisition": "MOTEUR D'ACQUISITION",
+    "value": "VALEUR & REVENDABILITÉ"
+}
+
+QUESTION_LABELS = {
+    "1": "Rôle au quotidien (opérationnel vs pilotage)",
+    "2": "Capacité à s'absenter 10 jours",
+    "3": "Clarté des rôles et responsabilités",
+    "4": "Répartition des fonctions clés",
+    "5": "Process écrits pour situations critiques",
+    "6": "Gestion des tâches (outils)",
+    "7": "Qualité du stack outils (PMS, automatisations)",
+    "8": "Synchronisation des informations",
+    "9": "Vision logement par logement (performance)",
+    "10": "Suivi des indicateurs clés (CA, marge, occupation)",
+    "11": "Origine des nouveaux propriétaires",
+    "12": "Capacité d'absorption de nouveaux logements",
+    "13": "Site internet (SEO local)",
+    "14": "Fiche Google My Business",
+    "15": "Réseaux sociaux côté propriétaires",
+    "16": "Gestion des leads propriétaires (CRM)",
+    "17": "Nurturing des \"pas maintenant\"",
+    "18": "Maîtrise des chiffres d'acquisition",
+    "19": "Prévisibilité globale de l'acquisition",
+    "20": "Dépendance à la personne du gérant",
+    "21": "Qualité du portefeuille propriétaires (contrats)",
+    "22": "Regard d'un banquier/investisseur sur le business"
+}
+
+BLOCKS_CONTEXT = "\n".join(
+    f"- {BLOCK_TITLES[name]} (Q{first}-Q{last}, max {BLOCK_MAX[name]} pts)"
+    for name, (first, last) in BLOCKS.items()
+)
+
+# Identical on every call; everything specific to the lead goes in the user
+# message. At ~300 tokens it is below the 1024-token minimum of OpenAI's prompt
+# caching, so it is billed in full on every call: keeping it short is the saving
+ANALYSIS_SYSTEM_PROMPT = f"""Tu es un expert en structuration de conciergeries Airbnb/location courte durée. Tu fournis des analyses business directes et professionnelles en français.
+
+Le diagnostic compte 22 questions en 3 blocs :
+{BLOCKS_CONTEXT}
+
+SCORING: 0 = situation problématique/artisanale, 1 = en cours de structuration mais fragile, 2 = bien structuré/professionnel
+
+SEGMENTS: 0-18 pts "artisanal" (conciergerie artisanale fragile), 19-32 pts "transition" (entreprise en transition), 33-44 pts "machine" (machine en devenir)
+
+Génère une analyse personnalisée en français avec:
+1. "diagSummary": 2-3 phrases qui résument la situation actuelle de manière directe et personnalisée (utilise le prénom)
+2. "mainBlocker": le principal blocage identifié en 2-6 mots maximum
+3. "priority": la priorité n°1 à traiter sur 90 jours (1 phrase concrète)
+4. "goodtimeRecommendation": 3-5 phrases expliquant comment Goodtime peut aider concrètement (structuration + moteur d'acquisition local)
+
+Ton: professionnel, direct, orienté business, pas "fun" ni enfantin. Sois franc et lucide.
+
+Réponds UNIQUEMENT avec un JSON valide contenant ces 4 champs."""
+
+
+def generate_analysis_prompt(user_info: UserInfo, answers: Dict[str, int], scores: Dict[str, int], segment: str) -> str:
+    """Generate the lead-specific part of the GPT prompt
     
-    # Build answers summary
-    answers_summary = []
-    for q_id, value in sorted(answers.items(), key=lambda x: int(x[0])):
-        answers_summary.append(f"Q{q_id}: {value}/2")
+    Only the questions of the weakest block are detailed: the other blocks are
+    summed up by their scores.
+    """
+    weakest = weakest_block(scores)
+    first, last = BLOCKS[weakest]
+    answers_summary = [
+        f"- Q{q}: {QUESTION_LABELS[str(q)]} : {answers.get(str(q), 0)}/2"
+        for q in range(first, last + 1)
+    ]
     
-    prompt = f"""Tu es un expert en structuration de conciergeries Airbnb/location courte durée.
-
-Analyse ce diagnostic pour {user_info.firstName} {user_info.lastName} :
+    return f"""Diagnostic de {user_info.firstName} {user_info.lastName} :
 
 PROFIL:
 - Ville: {user_info.city}
@@ -156,476 +373,275 @@ PROFIL:
 SCORES:
 - Total: {scores.get('total', 0)}/44
 - Structure interne: {scores.get('structure', 0)}/20
-- Moteur d'acquisition: {scores.get('acquisition', 0)}/18  
+- Moteur d'acquisition: {scores.get('acquisition', 0)}/18
 - Valeur & revendabilité: {scores.get('value', 0)}/6
 
-RÉPONSES DÉTAILLÉES:
-{chr(10).join(answers_summary)}
-
-CONTEXTE DES QUESTIONS:
-{QUESTIONS_CONTEXT}
-
 SEGMENT DÉTERMINÉ: {segment}
 
-Génère une analyse personnalisée en français avec:
-
-1. "diagSummary": 2-3 phrases qui résument la situation actuelle de manière directe et personnalisée (utilise le prénom)
+BLOC LE PLUS FAIBLE - {BLOCK_TITLES[weakest]}, réponses détaillées:
+{chr(10).join(answers_summary)}"""
 
-2. "mainBlocker": le principal blocage identifié en 2-6 mots maximum
-
-3. "priority": la priorité n°1 à traiter sur 90 jours (1 phrase concrète)
 
-4. "goodtimeRecommendation": 3-5 phrases expliquant comment Goodtime peut aider concrètement (structuration + moteur d'acquisition local)
+def gpt_messages(prompt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
 
-Ton: professionnel, direct, orienté business, pas "fun" ni enfantin. Sois franc et lucide.
 
-Réponds UNIQUEMENT avec un JSON valide (sans markdown, sans ```json):
-{{
-  "diagSummary": "...",
-  "mainBlocker": "...",
-  "priority": "...",
-  "goodtimeRecommendation": "..."
-}}"""
+async def request_gpt_analysis(prompt: str) -> str:
+    """Run the GPT completion under the shared concurrency limit and timeout
+    
+    OPENAI_TIMEOUT bounds the slot wait and the call together; the circuit
+    breaker only sees the call, so queueing behind other leads is not
+    mistaken for a slow or failing upstream.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + OPENAI_TIMEOUT
     
-    return prompt, segment
+    # An open circuit rejects the call without waiting for a slot
+    openai_breaker.check()
+    await asyncio.wait_for(llm_semaphore.acquire(), timeout=OPENAI_TIMEOUT)
+    try:
+        async with openai_breaker.guard():
+            with span("openai.completion", model="gpt-4o-mini") as completion_span:
+                completion = await asyncio.wait_for(
+                    openai_client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=gpt_messages(prompt),
+                        temperature=0.7,
+                        max_tokens=OPENAI_MAX_TOKENS,
+                        response_format=RESPONSE_FORMAT
+                    ),
+                    timeout=max(0.0, deadline - loop.time())
+                )
+                tokens = record_usage(getattr(completion, "usage", None))
+                if completion_span and tokens:
+                    completion_span.set("tokens", tokens)
+    finally:
+        llm_semaphore.release()
+    return completion.choices[0].message.content.strip()
 
 
-async def analyze_diagnostic(user_info: UserInfo, answers: Dict[str, int], scores: Dict[str, int]) -> dict:
-    """Generate comprehensive analysis based on scores"""
+async def stream_gpt_analysis(prompt: str):
+    """Yield the GPT completion text as it is generated
     
-    total_score = scores.get('total', 0)
-    structure_score = scores.get('structure', 0)
-    acquisition_score = scores.get('acquisition', 0)
-    value_score = scores.get('value', 0)
+    Same concurrency limit and breaker as `request_gpt_analysis`;
+    OPENAI_TIMEOUT bounds the whole stream (slot wait included), not each
+    chunk.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + OPENAI_TIMEOUT
     
-    # Determine segment
-    if total_score <= 18:
-        segment = "artisanal"
-    elif total_score <= 32:
-        segment = "transition"
-    else:
-        segment = "machine"
+    def remaining():
+        return max(0.0, deadline - loop.time())
     
-    first_name = user_info.firstName
-    units = user_info.units if user_info.units else "plusieurs"
+    openai_breaker.check()
+    await asyncio.wait_for(llm_semaphore.acquire(), timeout=remaining())
+    stream = None
+    try:
+        async with openai_breaker.guard():
+            stream = await asyncio.wait_for(
+                openai_client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=gpt_messages(prompt),
+                    temperature=0.7,
+                    max_tokens=OPENAI_MAX_TOKENS,
+                    response_format=RESPONSE_FORMAT,
+                    stream=True,
+                    # Usage arrives in a last chunk without choices
+                    stream_options={"include_usage": True}
+                ),
+                timeout=remaining()
+            )
+            chunks = aiter(stream)
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(anext(chunks), timeout=remaining())
+                except StopAsyncIteration:
+                    break
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                tokens = record_usage(getattr(chunk, "usage", None))
+                if tokens and current_span():
+                    current_span().set("tokens", tokens)
+    finally:
+        if stream is not None:
+            await stream.close()
+        llm_semaphore.release()
+
+
+def parse_gpt_analysis(gpt_response: str) -> dict:
+    """Decode the JSON analysis returned by GPT, repairing malformed output when possible"""
+    return parse_analysis(gpt_response).model_dump(exclude_none=True)
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def build_analysis_skeleton(segment: str, total_score: int, structure_score: int, acquisition_score: int, value_score: int):
+    """Score-dependent part of the analysis, memoized per score vector
+    
+    Returns the compiled renderer for the band layout and the score variables.
+    Personal fields (first name, city) are filled in by `analyze_diagnostic`,
+    so one cache entry serves every lead with the same scores.
+    """
     
     # Calculate percentages for detailed analysis
     structure_pct = round((structure_score / 20) * 100)
     acquisition_pct = round((acquisition_score / 18) * 100)
     value_pct = round((value_score / 6) * 100)
     
-    # Identify weakest and strongest areas
+    # Identify weakest area
     scores_map = {
         "structure": structure_pct,
         "acquisition": acquisition_pct,
         "value": value_pct
     }
     weakest = min(scores_map, key=scores_map.get)
-    strongest = max(scores_map, key=scores_map.get)
+    
+    variables = {
+        "total": total_score,
+        "structure": structure_score,
+        "acquisition": acquisition_score,
+        "value": value_score,
+        "structure_pct": structure_pct,
+        "acquisition_pct": acquisition_pct,
+        "value_pct": value_pct,
+        "structure_gap": 100 - structure_pct,
+        "weakest": weakest
+    }
     
     # ============================================
     # GÉNÉRATION DE LA RECOMMANDATION PERSONNALISÉE
     # ============================================
     
-    def generate_personalized_recommendation():
-        """Génère une recommandation 100% personnalisée basée sur les scores réels"""
+    def select_recommendation_sections():
+        """Choisit les sections de la recommandation selon les scores réels"""
         
         sections = []
         
         # INTRO personnalisée selon le profil - TOUJOURS VALORISANTE
         if structure_pct >= 70 and acquisition_pct >= 70:
-            intro = f"""🎯 CE QUE GOODTIME VA T'APPORTER
-
-{first_name}, bravo pour le travail accompli. Avec {structure_score}/20 en structure et {acquisition_score}/18 en acquisition, tu fais partie des conciergeries les mieux organisées du marché.
-
-Tu as construit des bases solides. La question maintenant : comment aller encore plus loin ? Comment passer de "ça tourne bien" à "ça cartonne" ?
-
-On accompagne les conciergeries performantes comme la tienne pour maximiser leur potentiel et accélérer leur croissance."""
-        
+            sections.append("recommendation.intro.strong")
         elif structure_pct >= 60 and acquisition_pct < 50:
-            intro = f"""🎯 CE QUE GOODTIME VA T'APPORTER
-
-{first_name}, tu as fait un vrai travail de structuration ({structure_score}/20). C'est une base solide sur laquelle construire.
-
-Le prochain levier de croissance pour toi, c'est l'acquisition ({acquisition_score}/18). Les propriétaires cherchent des conciergeries comme la tienne - il s'agit maintenant de te rendre visible auprès d'eux.
-
-C'est exactement notre spécialité : construire des systèmes d'acquisition qui génèrent des leads qualifiés de façon prévisible."""
-        
+            sections.append("recommendation.intro.structured")
         elif structure_pct < 50 and acquisition_pct >= 60:
-            intro = f"""🎯 CE QUE GOODTIME VA T'APPORTER
-
-{first_name}, tu as une vraie force : tu sais attirer des propriétaires ({acquisition_score}/18 en acquisition). C'est un talent que beaucoup de conciergeries n'ont pas.
-
-Pour capitaliser sur cette force, l'étape suivante est de renforcer ton organisation ({structure_score}/20). Ça te permettra d'absorber plus de volume sereinement et de libérer du temps pour ce que tu fais de mieux.
-
-On va t'aider à consolider tes fondations pour que ta croissance soit fluide."""
-        
+            sections.append("recommendation.intro.acquirer")
         elif structure_pct < 40:
-            intro = f"""🎯 CE QUE GOODTIME VA T'APPORTER
-
-{first_name}, comme beaucoup de gérants de conciergerie, tu portes beaucoup de casquettes au quotidien. C'est normal quand on construit son activité.
-
-La bonne nouvelle : il existe des méthodes éprouvées pour structurer ton organisation et te libérer du temps. C'est exactement ce qu'on fait chez Goodtime : on t'accompagne pour mettre en place des systèmes qui tournent, même quand tu n'es pas derrière.
-
-Tu as déjà l'essentiel : l'expertise terrain et la connaissance de tes clients. On t'apporte la méthode et les outils."""
-        
+            sections.append("recommendation.intro.early")
         else:
-            intro = f"""🎯 CE QUE GOODTIME VA T'APPORTER
-
-{first_name}, ton diagnostic révèle un profil avec de vraies opportunités de développement : {structure_score}/20 en structure, {acquisition_score}/18 en acquisition, {value_score}/6 en valeur.
-
-On travaille avec des conciergeries à différents stades de maturité. Notre rôle : identifier les leviers de croissance les plus impactants pour TA situation et t'accompagner dans leur mise en place."""
-        
-        sections.append(intro)
+            sections.append("recommendation.intro.default")
         
         # SECTION STRUCTURE - adaptée au niveau
         if structure_pct < 60:
-            structure_section = f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🔧 GAGNER DU TEMPS AU QUOTIDIEN
-
-Avec {structure_score}/20 en structure, il y a une belle marge de progression pour te simplifier la vie.
-
-Ce qu'on met en place avec toi :
-• Des process clairs et simples que ton équipe/prestataires peuvent suivre facilement
-• Un système de gestion centralisé qui te fait gagner des heures chaque semaine
-• Une organisation où tu peux te concentrer sur ce qui compte vraiment
-
-Notre équipe peut aussi prendre en charge certaines tâches (back-office, support) pour accélérer cette transition."""
-            sections.append(structure_section)
-        
-        elif structure_pct >= 60 and structure_pct < 80:
-            structure_section = f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🔧 OPTIMISER CE QUI FONCTIONNE
-
-Ta structure est bien en place ({structure_score}/20). Il reste quelques ajustements pour la rendre encore plus efficace :
-• Identifier et éliminer les derniers points de friction
-• Automatiser ce qui peut encore l'être
-• Préparer ton organisation à absorber plus de volume
-
-On t'aide à passer de "ça fonctionne" à "c'est fluide et scalable"."""
-            sections.append(structure_section)
-        
-        elif structure_pct >= 80:
-            structure_section = f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-✅ UNE STRUCTURE SOLIDE
-
-Avec {structure_score}/20, tu as fait un excellent travail d'organisation. C'est une vraie force.
-
-On va capitaliser sur cette base pour travailler les autres leviers de croissance."""
-            sections.append(structure_section)
+            sections.append("recommendation.structure.low")
+        elif structure_pct < 80:
+            sections.append("recommendation.structure.mid")
+        else:
+            sections.append("recommendation.structure.high")
         
         # SECTION ACQUISITION - adaptée au niveau
         if acquisition_pct < 40:
-            acquisition_section = f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🚀 DÉVELOPPER TON ACQUISITION
-
-Avec {acquisition_score}/18 en acquisition, c'est LE levier qui peut transformer ton activité.
-
-C'est notre spécialité. On va CONSTRUIRE avec toi :
-• Un site web optimisé qui te rend visible des propriétaires de {user_info.city}
-• Une fiche Google Business qui génère des contacts réguliers
-• Une stratégie de contenu qui te positionne comme une référence locale
-• Un process de conversion pour transformer les contacts en clients
-
-Ce système T'APPARTIENT. Et si tu préfères, on peut l'opérer pour toi."""
-            sections.append(acquisition_section)
-        
+            sections.append("recommendation.acquisition.low")
         elif acquisition_pct < 60:
-            acquisition_section = f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🚀 STRUCTURER TON ACQUISITION
-
-Avec {acquisition_score}/18, tu génères déjà des contacts. L'objectif maintenant : rendre ça prévisible.
-
-On va structurer et amplifier ce qui fonctionne :
-• Optimiser tes canaux actuels (SEO, Google Business, réseaux)
-• Mettre en place un vrai suivi des prospects
-• Activer de nouveaux canaux adaptés à {user_info.city}
-• Créer de la régularité dans ton flux de nouveaux propriétaires"""
-            sections.append(acquisition_section)
-        
+            sections.append("recommendation.acquisition.developing")
         elif acquisition_pct < 80:
-            acquisition_section = f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🚀 AMPLIFIER TON ACQUISITION
-
-Ton acquisition fonctionne bien ({acquisition_score}/18). L'opportunité : passer à l'échelle supérieure.
-
-On peut activer des leviers plus puissants :
-• Campagnes publicitaires ciblées propriétaires
-• Partenariats stratégiques (agents immobiliers, notaires)
-• Expansion géographique si tu veux sortir de {user_info.city}
-• Automatisation pour convertir encore mieux"""
-            sections.append(acquisition_section)
-        
+            sections.append("recommendation.acquisition.established")
         else:
-            acquisition_section = f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-✅ UNE ACQUISITION PERFORMANTE
-
-Avec {acquisition_score}/18, ton système d'acquisition fonctionne très bien. Bravo !
-
-On peut t'aider à l'optimiser (réduire le coût par contact, améliorer la conversion) ou à le dupliquer si tu veux t'étendre géographiquement."""
-            sections.append(acquisition_section)
+            sections.append("recommendation.acquisition.high")
         
         # SECTION VALEUR - si pertinent
         if value_pct < 50:
-            value_section = f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-💎 CONSTRUIRE UN ACTIF DURABLE
-
-Avec {value_score}/6 en valeur, il y a une opportunité de renforcer la pérennité de ton activité.
-
-On travaille sur :
-• La formalisation de tes contrats propriétaires
-• La création de process reproductibles
-• La documentation de ton modèle pour qu'il soit solide dans la durée"""
-            sections.append(value_section)
+            sections.append("recommendation.value.low")
         
         # SECTION OPTIMISATION DES COÛTS - adaptée au profil
         if structure_pct >= 60:
-            # Profil avancé - optimisation fine
-            costs_section = f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-💰 OPTIMISATION DE TES COÛTS
-
-Avec une structure déjà en place, on peut travailler sur l'optimisation de ta rentabilité :
-• Audit de tes coûts prestataires (ménage, linge, maintenance) et renégociation
-• Mutualisation des ressources pour réduire le coût par logement
-• Automatisation des tâches répétitives pour gagner en efficacité
-• Accès à notre réseau de prestataires partenaires à tarifs négociés
-
-Nos clients constatent en moyenne 15-25% d'économies sur leurs coûts opérationnels."""
-            sections.append(costs_section)
+            sections.append("recommendation.costs.advanced")
         else:
-            # Profil en développement - structurer pour économiser
-            costs_section = f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-💰 OPTIMISER TES COÛTS DÈS LE DÉPART
-
-Bonne nouvelle : en structurant ton activité, tu vas aussi réduire tes coûts.
-
-Ce qu'on met en place :
-• Des process efficaces qui évitent les erreurs coûteuses
-• Une meilleure négociation avec tes prestataires grâce à notre expertise
-• Accès à notre réseau de partenaires à tarifs préférentiels
-• Des outils qui te font gagner du temps (= de l'argent)
-
-Structurer ne coûte pas plus cher - ça permet de dépenser plus intelligemment."""
-            sections.append(costs_section)
-        
-        # SECTION SYSTÈME GOODTIME
-        systeme_section = f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🔧 LE SYSTÈME GOODTIME
-
-On n'est pas des consultants qui donnent des conseils et disparaissent. On est des partenaires opérationnels.
-
-Concrètement, on implémente chez toi :
-• Nos outils éprouvés (process, templates, systèmes de gestion)
-• Notre équipe si tu veux déléguer certaines fonctions
-• Nos méthodes testées sur des dizaines de conciergeries
-• Notre réseau de prestataires partenaires à tarifs négociés
-
-Tu n'es plus seul. Tu as une équipe qui travaille AVEC toi."""
-        sections.append(systeme_section)
+            sections.append("recommendation.costs.developing")
         
-        # SECTION PROCESS
-        process_section = f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-📅 COMMENT ÇA SE PASSE ?
-
-1️⃣ APPEL DÉCOUVERTE (30 min)
-On échange sur ta situation, tes objectifs, et on voit ensemble comment on peut t'aider.
-
-2️⃣ AUDIT PERSONNALISÉ
-On analyse en détail ta conciergerie pour identifier les meilleures opportunités.
-
-3️⃣ PLAN D'ACTION SUR MESURE
-Un plan adapté à TON profil avec des étapes claires sur 3 - 6 - 9 - 12 mois.
-
-4️⃣ ACCOMPAGNEMENT
-On déploie les outils, on t'accompagne dans la mise en place, et on ajuste en continu."""
-        sections.append(process_section)
+        # SECTIONS SYSTÈME GOODTIME et PROCESS
+        sections.append("recommendation.system")
+        sections.append("recommendation.process")
         
         # SECTION RÉSULTATS - personnalisée et positive
-        if structure_pct < 50:
-            resultats = """✅ Une organisation qui tourne de façon fluide
-✅ Du temps libéré pour te concentrer sur le développement"""
-        else:
-            resultats = """✅ Une organisation encore plus efficace et scalable
-✅ Plus de temps pour les projets stratégiques"""
-        
-        if acquisition_pct < 60:
-            resultats += """
-✅ Un flux régulier de nouveaux propriétaires intéressés
-✅ Un système d'acquisition qui travaille pour toi"""
-        else:
-            resultats += """
-✅ Une acquisition amplifiée et optimisée
-✅ Une croissance maîtrisée et prévisible"""
-        
-        resultats += """
-✅ Une activité solide et pérenne
-✅ Des coûts optimisés et une meilleure rentabilité
-✅ La sérénité d'avoir les bonnes fondations"""
-        
-        resultats_section = f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-💎 CE QUE TU PEUX ATTENDRE
-
-En mettant en place les bonnes actions :
-{resultats}"""
-        sections.append(resultats_section)
+        organization = "early" if structure_pct < 50 else "mature"
+        acquisition = "developing" if acquisition_pct < 60 else "established"
+        sections.append(f"recommendation.results.{organization}.{acquisition}")
         
         # SECTION CTA - positive et encourageante
-        cta_section = f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-⚡ PRÊT À PASSER À L'ACTION ?
-
-Le marché de la location courte durée est en pleine croissance. Les propriétaires à {user_info.city} et ailleurs cherchent des conciergeries professionnelles sur qui compter.
-
-Tu as déjà l'expertise terrain. Avec les bons outils et le bon accompagnement, tu peux vraiment passer au niveau supérieur.
-
-👉 Si tu n'as pas encore réservé ton appel découverte, c'est le moment !
-
-C'est gratuit, sans engagement, et tu repartiras avec :
-• Une analyse détaillée de ta situation
-• Des recommandations concrètes adaptées à ton profil
-• Un plan d'action clair pour avancer"""
-        sections.append(cta_section)
+        sections.append("recommendation.cta")
         
-        return "\n\n".join(sections)
-    
-    # Générer la recommandation personnalisée
-    recommendation = generate_personalized_recommendation()
+        return tuple(sections)
     
     # ============================================
     # CALCUL INTELLIGENT DU BLOCAGE ET PRIORITÉ
     # (Basé uniquement sur les scores - pas d'hallucination)
     # ============================================
     
-    def calculate_main_blocker_and_priority():
-        """Calcule le blocage principal et la priorité basés sur les scores réels"""
+    def select_main_blocker():
+        """Choisit le blocage principal et la priorité basés sur les scores réels"""
         
         # Cas 1: Scores excellents partout (>= 80% sur tout)
         if structure_pct >= 80 and acquisition_pct >= 80 and value_pct >= 80:
-            return (
-                "Aucun blocage majeur identifié",
-                "Optimisation des coûts, expansion géographique, ou préparation à la valorisation/revente."
-            )
+            return "blocker.none"
         
         # Cas 2: Scores très bons (>= 70% sur tout)
         if structure_pct >= 70 and acquisition_pct >= 70 and value_pct >= 70:
             # Trouver le moins bon pour optimisation
             if acquisition_pct <= structure_pct and acquisition_pct <= value_pct:
-                return (
-                    "Optimisation du système d'acquisition",
-                    "Amplifier et automatiser ton acquisition pour accélérer la croissance."
-                )
+                return "blocker.optimize_acquisition"
             elif structure_pct <= acquisition_pct and structure_pct <= value_pct:
-                return (
-                    "Optimisation des process internes",
-                    "Affiner et automatiser tes process pour gagner en efficacité."
-                )
+                return "blocker.optimize_structure"
             else:
-                return (
-                    "Renforcement de la valorisation",
-                    "Formaliser les éléments qui rendent ton entreprise autonome et valorisable."
-                )
+                return "blocker.optimize_value"
         
         # Cas 3: Un ou plusieurs domaines à améliorer - identifier le plus faible
         weakest_score = min(structure_pct, acquisition_pct, value_pct)
         
         if acquisition_pct == weakest_score and acquisition_pct < 60:
-            return (
-                "Développer un système d'acquisition prévisible",
-                f"Mettre en place un moteur d'acquisition structuré pour générer des leads réguliers à {user_info.city}."
-            )
+            return "blocker.acquisition"
         elif structure_pct == weakest_score and structure_pct < 60:
-            return (
-                "Structurer l'organisation interne",
-                "Documenter les process clés et mettre en place des systèmes pour libérer du temps."
-            )
+            return "blocker.structure"
         elif value_pct == weakest_score and value_pct < 60:
-            return (
-                "Construire une entreprise autonome",
-                "Réduire la dépendance au gérant et formaliser les contrats pour créer un actif pérenne."
-            )
+            return "blocker.value"
         
         # Cas par défaut - prioriser l'acquisition (ton conseil)
         if acquisition_pct < 70:
-            return (
-                "Amplifier l'acquisition",
-                "Structurer et accélérer ton système d'acquisition pour une croissance prévisible."
-            )
+            return "blocker.amplify_acquisition"
         elif structure_pct < 70:
-            return (
-                "Optimiser l'organisation",
-                "Renforcer les process pour absorber plus de volume sereinement."
-            )
+            return "blocker.strengthen_structure"
         else:
-            return (
-                "Préparer la valorisation",
-                "Formaliser les éléments qui rendent ton entreprise autonome et attractive."
-            )
-    
-    # Calculer mainBlocker et priority de façon cohérente
-    calculated_blocker, calculated_priority = calculate_main_blocker_and_priority()
+            return "blocker.prepare_value"
     
     # ============================================
-    # GÉNÉRATION DU DIAGNOSTIC SUMMARY COHÉRENT
+    # DIAGNOSTIC SUMMARY COHÉRENT
     # ============================================
     
-    def generate_coherent_diag_summary():
-        """Génère un résumé de diagnostic cohérent avec les scores"""
+    def select_diag_summary():
+        """Choisit le résumé de diagnostic cohérent avec les scores"""
         
         # Cas 1: Excellence (>= 80% partout)
         if structure_pct >= 80 and acquisition_pct >= 80 and value_pct >= 80:
-            return f"""{first_name}, félicitations ! Avec {total_score}/44, tu fais partie des conciergeries les plus structurées du marché.
-
-Tu as mis en place une vraie organisation ({structure_score}/20), un système d'acquisition qui fonctionne ({acquisition_score}/18), et une entreprise qui peut tourner de façon autonome ({value_score}/6).
-
-À ce stade, les opportunités sont l'optimisation des coûts, l'expansion géographique, ou la préparation d'une valorisation/revente si c'est dans tes projets."""
+            return "summary.excellence"
         
         # Cas 2: Très bon niveau (>= 70% partout)
         if structure_pct >= 70 and acquisition_pct >= 70:
-            return f"""{first_name}, avec {total_score}/44, tu as construit une conciergerie solide.
-
-Ton organisation est en place ({structure_score}/20), ton acquisition fonctionne ({acquisition_score}/18). Tu fais clairement partie des conciergeries au-dessus de la moyenne.
-
-L'opportunité maintenant : optimiser ce qui existe et accélérer ta croissance sur des bases saines."""
+            return "summary.solid"
         
         # Cas 3: Bon niveau structure, acquisition à développer
         if structure_pct >= 60 and acquisition_pct < 50:
-            return f"""{first_name}, avec {total_score}/44, tu as une base organisationnelle solide ({structure_score}/20).
-
-Le principal levier de croissance pour toi est l'acquisition ({acquisition_score}/18). Tu as la structure pour absorber plus de volume - il s'agit maintenant de mettre en place un système pour attirer des propriétaires de façon régulière."""
+            return "summary.structured"
         
         # Cas 4: Bonne acquisition, structure à renforcer
         if acquisition_pct >= 60 and structure_pct < 50:
-            return f"""{first_name}, avec {total_score}/44, tu as une vraie force : tu sais attirer des propriétaires ({acquisition_score}/18).
-
-Pour capitaliser sur cette force, l'étape suivante est de renforcer ton organisation ({structure_score}/20). Ça te permettra d'absorber ta croissance sereinement et de libérer du temps pour le développement."""
+            return "summary.acquirer"
         
         # Cas 5: Les deux à développer
         if structure_pct < 50 and acquisition_pct < 50:
-            return f"""{first_name}, avec {total_score}/44, tu es au début de la structuration de ta conciergerie.
-
-C'est une étape normale dans le développement d'une activité. Les deux leviers principaux pour toi sont l'organisation interne ({structure_score}/20) et l'acquisition ({acquisition_score}/18).
-
-La bonne nouvelle : avec les bonnes méthodes, tu peux progresser rapidement sur ces deux axes."""
+            return "summary.early"
         
         # Cas par défaut
-        return f"""{first_name}, avec {total_score}/44, ta conciergerie a des bases sur lesquelles construire.
-
-Structure : {structure_score}/20 | Acquisition : {acquisition_score}/18 | Valeur : {value_score}/6
-
-On va identifier ensemble les leviers les plus impactants pour ta situation."""
+        return "summary.default"
     
     # ============================================
     # ANALYSE DÉTAILLÉE PAR SEGMENT
@@ -633,637 +649,872 @@ On va identifier ensemble les leviers les plus impactants pour ta situation."""
     
     if segment == "artisanal":
         # --- SEGMENT ARTISANAL (0-18 points) ---
-        diag_summary = generate_coherent_diag_summary()
-        main_blocker = calculated_blocker
-        priority = calculated_priority
-        
-        # Analyse Structure
-        structure_analysis = {
-            "score": f"{structure_score}/20",
-            "percentage": structure_pct,
-            "status": "critique" if structure_pct < 40 else "fragile",
-            "diagnostic": f"""Ton organisation interne est ton plus gros frein. Tu passes probablement 80% de ton temps dans l'opérationnel : gérer les voyageurs, éteindre des feux, courir après le ménage, répondre aux propriétaires.
-
-Résultat : tu n'as jamais le temps de travailler SUR ton business au lieu de travailler DANS ton business.
-
-Ce que ça te coûte concrètement :
-• Des nuits et week-ends sacrifiés pour des urgences qui pourraient être évitées
-• Une croissance bridée : tu ne peux pas prendre plus de logements car tu es déjà au max
-• Un épuisement qui s'accumule et qui finira par te rattraper
-• Zéro valorisation : sans toi, ta conciergerie ne vaut rien""",
-            "quickWins": [
-                "Documente ta checklist ménage en 1h - c'est la tâche qui te prend le plus de temps",
-                "Crée un message type pour les 5 questions voyageurs les plus fréquentes",
-                "Identifie LA personne qui pourrait te remplacer sur UNE tâche cette semaine"
-            ]
-        }
-        
-        # Analyse Acquisition
-        acquisition_analysis = {
-            "score": f"{acquisition_score}/18",
-            "percentage": acquisition_pct,
-            "status": "inexistant" if acquisition_pct < 30 else "aléatoire",
-            "diagnostic": f"""Tu vis au rythme du hasard. Tes nouveaux propriétaires arrivent par bouche-à-oreille, par chance, ou parce que tu as croisé quelqu'un au bon moment.
-
-Ce n'est pas un moteur d'acquisition, c'est de la loterie.
-
-Le problème : tu ne contrôles pas ta croissance. Un mois tu signes 3 propriétaires, le mois suivant zéro. Tu ne peux pas prévoir, pas planifier, pas investir sereinement.
-
-Ce que font les conciergeries structurées :
-• Elles ont un site web optimisé qui capte des leads locaux chaque semaine
-• Leur fiche Google Business génère des appels entrants réguliers
-• Elles ont un process de suivi des leads qui ne laisse personne filer""",
-            "quickWins": [
-                "Crée ou optimise ta fiche Google Business cette semaine",
-                "Demande un avis Google à tes 3 meilleurs propriétaires",
-                "Note dans un tableau tous les leads reçus ce mois-ci et leur origine"
-            ]
-        }
-        
-        # Analyse Valeur
-        value_analysis = {
-            "score": f"{value_score}/6",
-            "percentage": value_pct,
-            "status": "nulle" if value_pct < 40 else "très faible",
-            "diagnostic": f"""Parlons cash : combien vaut ta conciergerie aujourd'hui si tu veux la vendre ?
-
-La réponse honnête : presque rien. Peut-être quelques mois de chiffre d'affaires, au mieux.
-
-Pourquoi ? Parce qu'un acheteur potentiel voit :
-• Une activité qui dépend à 100% de toi
-• Des propriétaires qui sont "tes" clients, pas ceux de l'entreprise
-• Aucun process documenté, aucune organisation reproductible
-• Zéro prévisibilité sur l'acquisition de nouveaux logements
-
-Compare avec une conciergerie structurée qui se vend 3 à 5x son CA annuel :
-• Des process clairs que n'importe qui peut suivre
-• Des contrats propriétaires solides avec la structure, pas avec une personne
-• Un moteur d'acquisition qui génère des leads prévisibles
-• Un gérant qui pilote au lieu de tout faire lui-même""",
-            "quickWins": [
-                "Fais signer des contrats en bonne et due forme à tous tes propriétaires",
-                "Crée une adresse email pro (contact@taconciergerie.fr) pour toutes les communications",
-                "Commence à parler de 'nous' et de 'l'équipe' même si tu es seul"
-            ]
-        }
-        
-        # Leçon business sur l'investissement
-        investment_lesson = {
-            "titre": "La vérité que 95% des conciergeries refusent d'entendre",
-            "message": f"""{first_name}, il faut qu'on parle cash.
+        structure_band = "low" if structure_pct < 40 else "high"
+        acquisition_band = "low" if acquisition_pct < 30 else "high"
+        value_band = "low" if value_pct < 40 else "high"
+    elif segment == "transition":
+        # --- SEGMENT TRANSITION (19-32 points) ---
+        structure_band = "high" if structure_pct >= 50 else "low"
+        acquisition_band = "high" if acquisition_pct >= 50 else "low"
+        value_band = "high" if value_pct >= 50 else "low"
+    else:
+        # --- SEGMENT MACHINE (33-44 points) ---
+        structure_band = "high" if structure_pct >= 70 else "low"
+        acquisition_band = "high" if acquisition_pct >= 70 else "low"
+        value_band = "high" if value_pct >= 70 else "low"
+    
+    # mainBlocker et priority sont calculés de façon cohérente avec le résumé
+    render_analysis = compile_analysis(
+        segment,
+        select_diag_summary(),
+        select_main_blocker(),
+        select_recommendation_sections(),
+        structure_band,
+        acquisition_band,
+        value_band
+    )
+    return render_analysis, variables
 
-Tu fais probablement partie des 95% de gérants de conciergerie qui considèrent l'investissement en communication et en acquisition comme une DÉPENSE. C'est l'erreur fatale qui condamne la majorité des conciergeries à rester des petites structures artisanales.
 
-Voici la réalité : l'investissement en acquisition n'est PAS une dépense. C'est un ACTIF.
+async def analyze_diagnostic(user_info: UserInfo, answers: Dict[str, int], scores: Dict[str, int], segment: Optional[str] = None) -> dict:
+    """Generate comprehensive analysis based on scores
+    
+    The texts live in the precompiled template table of `analysis_content`:
+    the cached skeleton picks the band of each section, this only fills in
+    the personal placeholders.
+    """
+    if segment is None:
+        segment = segment_for(scores.get('total', 0))
+    render_analysis, score_variables = build_analysis_skeleton(
+        segment,
+        scores.get('total', 0),
+        scores.get('structure', 0),
+        scores.get('acquisition', 0),
+        scores.get('value', 0)
+    )
+    return render_analysis({
+        **score_variables,
+        "first_name": user_info.firstName,
+        "city": user_info.city
+    })
 
-Pourquoi ? Parce que la conciergerie est un business de récurrent. Quand tu signes un propriétaire, tu ne le signes pas pour une prestation unique. Tu le signes pour des mois, voire des années de commissions récurrentes.
 
-Fais le calcul :
-• Un propriétaire te rapporte en moyenne 200-400€/mois de commission
-• Sur 12 mois, c'est 2 400 à 4 800€ de revenus récurrents
-• Sur 3 ans, c'est 7 200 à 14 400€
+# API Routes
+@api_router.get("/")
+async def root():
+    return {"message": "Goodtime Diagnostic API"}
 
-Maintenant, combien ça coûte d'acquérir ce propriétaire ? Avec un système d'acquisition bien structuré : 100 à 300€ maximum.
 
-Le ROI est ÉNORME. Chaque euro investi en acquisition peut te rapporter 10, 20, voire 50 euros sur la durée de vie du client.
+def score_requests(requests: List[DiagnosticRequest]) -> List[str]:
+    """Replace the client-sent scores with the ones computed from the answers
+    
+    All requests are scored in one vectorized pass; returns their segments.
+    """
+    results = compute_scores([request.answers for request in requests])
+    for request, (scores, _) in zip(requests, results):
+        request.scores = scores
+    return [segment for _, segment in results]
 
-Pourtant, tu hésites à investir 500€/mois en communication ? C'est comme refuser de mettre de l'essence dans une voiture qui pourrait te rapporter des milliers d'euros.
 
-Aucune entreprise sérieuse ne se développe sans investir dans sa croissance. C'est non négociable. Ce n'est pas une option, c'est une obligation si tu veux sortir du bricolage.""",
-            "keyPoints": [
-                "L'acquisition n'est pas une dépense, c'est un actif qui génère du récurrent",
-                "Le ROI de l'acquisition en conciergerie est parmi les plus élevés du marché",
-                "Ton ambition définit ton budget : plus tu veux grandir, plus tu dois investir",
-                "Pas de croissance saine et prévisible sans investissement structuré"
-            ]
-        }
-        
-        # Roadmap 12 mois
-        roadmap = {
-            "titre": "Ton plan de transformation sur 12 mois",
-            "phases": [
-                {
-                    "periode": "Mois 1-3 : Stabilisation",
-                    "objectif": "Sortir la tête de l'eau",
-                    "actions": [
-                        "Documenter les 5 process critiques (ménage, check-in, incidents, onboarding proprio, création annonce)",
-                        "Recruter ou former une personne pour déléguer le ménage ou le check-in",
-                        "Créer des templates de communication pour gagner 5h/semaine"
-                    ]
-                },
-                {
-                    "periode": "Mois 4-6 : Structuration",
-                    "objectif": "Créer une vraie organisation",
-                    "actions": [
-                        "Mettre en place un système centralisé de gestion des tâches",
-                        "Définir des rôles clairs (même si tu cumules plusieurs casquettes)",
-                        "Créer un tableau de bord avec tes KPIs clés (CA/logement, taux d'occupation, marge)"
-                    ]
-                },
-                {
-                    "periode": "Mois 7-9 : Acquisition",
-                    "objectif": "Installer un moteur de croissance",
-                    "actions": [
-                        "Optimiser ton site web pour le SEO local",
-                        "Activer ta fiche Google Business et collecter 20+ avis",
-                        "Créer un process de suivi des leads (CRM simple)"
-                    ]
-                },
-                {
-                    "periode": "Mois 10-12 : Valorisation",
-                    "objectif": "Construire un actif",
-                    "actions": [
-                        "Formaliser tous les contrats propriétaires",
-                        "Préparer un dossier de présentation de ta conciergerie",
-                        "Calculer ta vraie rentabilité par logement"
-                    ]
-                }
-            ]
-        }
-        
-        # La recommandation est générée dynamiquement par generate_personalized_recommendation()
-        # (voir plus haut dans le code)
+async def prepare_analysis(request: DiagnosticRequest, segment: str):
+    """GPT prompt and deterministic analysis of a scored request
+    
+    Assigns `request.llm`; the prompt is None for the deterministic variant.
+    """
+    request.llm = llm_mode.variant_for(request.userInfo.email, request.llm)
+    
+    # Generate prompt
+    prompt = None
+    if request.llm != DETERMINISTIC:
+        with stage("prompt"):
+            prompt = generate_analysis_prompt(
+                request.userInfo,
+                request.answers,
+                request.scores,
+                segment
+            )
+    
+    # Get detailed analysis from deterministic function for structure
+    with stage("deterministic"), span("analyze_diagnostic"):
+        detailed_analysis = await analyze_diagnostic(
+            request.userInfo,
+            request.answers,
+            request.scores,
+            segment
+        )
+    
+    return prompt, detailed_analysis
 
-    elif segment == "transition":
-        # --- SEGMENT TRANSITION (19-32 points) ---
-        diag_summary = generate_coherent_diag_summary()
-        main_blocker = calculated_blocker
-        priority = calculated_priority
-        
-        # Analyse Structure
-        if structure_pct >= 50:
-            structure_status = "en place mais perfectible"
-            structure_diag = f"""Ta structure commence à tenir. Tu as des process, probablement un début d'équipe ou de prestataires fiables, et tu arrives à te dégager un peu de l'opérationnel.
 
-Mais attention : {100-structure_pct}% du chemin reste à faire. Les situations de crise te replongent encore dans l'opérationnel, et ta structure ne tiendrait probablement pas si tu t'absentais un mois.
+async def fetch_gpt_analysis(request: DiagnosticRequest, segment: str, prompt: str) -> dict:
+    """GPT analysis of the diagnostic, from the LLM cache when possible (raises on failure)"""
+    require_gpt(request)
+    cache_key = llm_cache.key_for(request.answers, request.scores, segment, request.userInfo.units)
+    with span("llm_cache.get") as cache_span:
+        gpt_analysis = await llm_cache.get(cache_key, request.userInfo)
+        if cache_span:
+            cache_span.set("hit", gpt_analysis is not None)
+    
+    if gpt_analysis is None:
+        logger.info(f"Calling OpenAI API for analysis...")
+        with stage("openai"):
+            gpt_response = await request_gpt_analysis(prompt)
+        
+        # Parse GPT response
+        logger.info(f"GPT Response received: {gpt_response[:200]}...")
+        with span("gpt.parse"):
+            gpt_analysis = parse_gpt_analysis(gpt_response)
+        await llm_cache.put(cache_key, gpt_analysis, request.userInfo)
+    
+    return gpt_analysis
 
-Ce qui te manque pour passer au niveau supérieur :
-• Des process vraiment documentés et utilisés par tous
-• Une vision claire de la performance de chaque logement
-• Un suivi régulier de tes indicateurs clés"""
-        else:
-            structure_status = "encore fragile"
-            structure_diag = f"""Tu as posé des bases mais ta structure reste fragile. Au moindre imprévu, tu replonges dans l'opérationnel.
 
-Le risque : tu t'épuises à vouloir faire grandir quelque chose qui n'a pas les fondations pour supporter la charge. C'est comme construire un étage supplémentaire sur une maison dont les murs ne sont pas solides.
+def merge_gpt_analysis(detailed_analysis: dict, gpt_analysis: dict) -> dict:
+    # Merge GPT personalized text with detailed structure
+    # IMPORTANT: mainBlocker et priority sont TOUJOURS calculés de façon déterministe
+    # GPT ne génère que le diagSummary pour le style - pas les données critiques
+    return {
+        'segment': detailed_analysis['segment'],
+        'diagSummary': gpt_analysis.get('diagSummary', detailed_analysis['diagSummary']),
+        'mainBlocker': detailed_analysis['mainBlocker'],  # TOUJOURS déterministe
+        'priority': detailed_analysis['priority'],  # TOUJOURS déterministe
+        'goodtimeRecommendation': detailed_analysis['goodtimeRecommendation'],
+        'structureAnalysis': detailed_analysis.get('structureAnalysis'),
+        'acquisitionAnalysis': detailed_analysis.get('acquisitionAnalysis'),
+        'valueAnalysis': detailed_analysis.get('valueAnalysis'),
+        'investmentLesson': detailed_analysis.get('investmentLesson'),
+        'roadmap': detailed_analysis.get('roadmap')
+    }
 
-Avant de penser croissance, il faut consolider :
-• Documenter et faire appliquer tes process critiques
-• Clarifier les rôles (même si tu portes plusieurs casquettes)
-• Mettre en place un vrai pilotage par les chiffres"""
-        
-        structure_analysis = {
-            "score": f"{structure_score}/20",
-            "percentage": structure_pct,
-            "status": structure_status,
-            "diagnostic": structure_diag,
-            "quickWins": [
-                "Audite tes 5 process critiques : sont-ils vraiment documentés ET utilisés ?",
-                "Crée un rituel hebdo de 30min pour suivre tes KPIs",
-                "Identifie les 2-3 tâches qui te replongent encore dans l'opérationnel"
-            ]
-        }
-        
-        # Analyse Acquisition
-        if acquisition_pct >= 50:
-            acquisition_status = "des bases existent"
-            acquisition_diag = f"""Tu as quelques canaux d'acquisition qui fonctionnent. C'est mieux que la majorité des conciergeries qui vivent uniquement du bouche-à-oreille.
 
-Mais avec {acquisition_score}/18, ton moteur d'acquisition n'est pas encore prévisible. Tu ne sais probablement pas combien de leads tu vas recevoir le mois prochain, ni quel sera ton taux de conversion.
+def require_gpt(request: DiagnosticRequest):
+    """Raise GPTDisabled for the deterministic variant, sending it down the fallback path"""
+    if request.llm == DETERMINISTIC:
+        raise GPTDisabled("GPT disabled by LLM mode")
 
-Pour passer au niveau supérieur :
-• Identifier et doubler ce qui fonctionne déjà
-• Créer un vrai pipeline de suivi des leads
-• Calculer ton coût d'acquisition par propriétaire signé"""
-        else:
-            acquisition_status = "sous-exploité"
-            acquisition_diag = f"""Ton acquisition est ton point faible. Tu as peut-être un site web, une fiche Google, mais ça ne génère pas de leads réguliers.
 
-C'est frustrant : tu sais que des propriétaires cherchent des conciergeries dans ta zone, mais ils ne te trouvent pas. Ils vont chez la concurrence ou ils restent sur Airbnb en direct.
+def gpt_fallback(error: Exception, detailed_analysis: dict) -> dict:
+    if isinstance(error, GPTDisabled):
+        logger.info(f"Serving deterministic analysis: {error}")
+    else:
+        logger.error(f"OpenAI API error: {error}")
+    record_gpt_fallback(error)
+    # Fallback to deterministic analysis
+    return detailed_analysis
 
-Ce que ça te coûte :
-• Une croissance au ralenti alors que le marché est là
-• Une dépendance au bouche-à-oreille qui peut s'arrêter du jour au lendemain
-• Des concurrents qui prennent les leads que tu devrais capter"""
-        
-        acquisition_analysis = {
-            "score": f"{acquisition_score}/18",
-            "percentage": acquisition_pct,
-            "status": acquisition_status,
-            "diagnostic": acquisition_diag,
-            "quickWins": [
-                "Calcule combien de leads tu as reçus les 3 derniers mois et leur origine",
-                "Optimise ta fiche Google Business (photos, description, posts réguliers)",
-                "Mets en place un tableau de suivi des leads avec étapes de conversion"
-            ]
-        }
-        
-        # Analyse Valeur
-        if value_pct >= 50:
-            value_status = "potentiel existant"
-            value_diag = f"""Tu as commencé à construire quelque chose qui a de la valeur. Des contrats existent, une certaine indépendance vis-à-vis de ta personne commence à se dessiner.
 
-Mais avec {value_score}/6, tu n'es pas encore dans la zone où un investisseur ou un acheteur dirait "je veux ça".
+async def run_analysis(request: DiagnosticRequest, segment: str) -> dict:
+    """GPT-personalized analysis, falling back to the deterministic one
+    
+    `request.scores` and `segment` come from `score_requests`.
+    """
+    prompt, detailed_analysis = await prepare_analysis(request, segment)
+    
+    # Call OpenAI GPT for personalized analysis (unless an identical diagnostic is cached)
+    try:
+        gpt_analysis = await fetch_gpt_analysis(request, segment, prompt)
+        analysis = merge_gpt_analysis(detailed_analysis, gpt_analysis)
+    except Exception as e:
+        analysis = gpt_fallback(e, detailed_analysis)
+    
+    return analysis
 
-Pour augmenter ta valorisation :
-• Formaliser tous tes contrats avec des engagements clairs
-• Réduire encore ta présence dans les relations propriétaires
-• Documenter ton modèle pour qu'il soit reproductible"""
-        else:
-            value_status = "à construire"
-            value_diag = f"""Aujourd'hui, ta conciergerie repose encore beaucoup sur toi. Un acheteur potentiel verrait :
-• Une activité qui tourne, mais avec des dépendances
-• Des propriétaires attachés à toi plus qu'à la structure
-• Un potentiel, mais du travail à faire pour le débloquer
 
-La bonne nouvelle : tu as les bases. En 6-12 mois de travail ciblé, tu peux multiplier ta valorisation par 2 ou 3."""
-        
-        value_analysis = {
-            "score": f"{value_score}/6",
-            "percentage": value_pct,
-            "status": value_status,
-            "diagnostic": value_diag,
-            "quickWins": [
-                "Revois tous tes contrats propriétaires : sont-ils au nom de ta structure ?",
-                "Crée une présentation de ta conciergerie comme si tu devais la vendre",
-                "Calcule ta vraie marge par logement (pas juste le CA)"
-            ]
+class SerializedDiagnostic:
+    """The DiagnosticResponse fields of an analyzed diagnostic, built once per request
+    
+    `data` is shared (not copied) by the Mongo document, the webhook payload
+    and job results; `json` is the HTTP body, encoded once on first use.
+    """
+    
+    __slots__ = ("data", "_json")
+    
+    def __init__(self, data: dict):
+        self.data = data
+        self._json: Optional[bytes] = None
+    
+    @property
+    def json(self) -> bytes:
+        if self._json is None:
+            self._json = orjson.dumps(self.data)
+        return self._json
+    
+    def response(self) -> Response:
+        return Response(content=self.json, media_type="application/json")
+
+
+def serialize_diagnostic(request: DiagnosticRequest, analysis: dict) -> SerializedDiagnostic:
+    # Same fields as DiagnosticResponse; built as a plain dict since every
+    # value already has its final type
+    return SerializedDiagnostic({
+        "firstName": request.userInfo.firstName,
+        "lastName": request.userInfo.lastName,
+        "email": request.userInfo.email,
+        "phone": request.userInfo.phone,
+        "city": request.userInfo.city,
+        "units": request.userInfo.units,
+        "segment": analysis['segment'],
+        "score": request.scores.get('total', 0),
+        "structureScore": request.scores.get('structure', 0),
+        "acquisitionScore": request.scores.get('acquisition', 0),
+        "valueScore": request.scores.get('value', 0),
+        "diagSummary": analysis['diagSummary'],
+        "mainBlocker": analysis['mainBlocker'],
+        "priority": analysis['priority'],
+        "goodtimeRecommendation": analysis['goodtimeRecommendation'],
+        "structureAnalysis": analysis.get('structureAnalysis'),
+        "acquisitionAnalysis": analysis.get('acquisitionAnalysis'),
+        "valueAnalysis": analysis.get('valueAnalysis'),
+        "investmentLesson": analysis.get('investmentLesson'),
+        "roadmap": analysis.get('roadmap')
+    })
+
+
+# Static sections a client can render from the content bundle (the same ones
+# content_store keeps out of the diagnostic documents)
+BUNDLED_SECTIONS = STORED_SECTIONS
+
+
+def diagnostic_content_refs(diagnostic: SerializedDiagnostic) -> dict:
+    """The diagnostic with its static sections replaced by content bundle references
+    
+    `content.sections` holds the template IDs of those sections and
+    `content.variables` the values of their placeholders; summary, blocker and
+    priority (possibly written by GPT) stay inline.
+    """
+    data = diagnostic.data
+    render_analysis, score_variables = build_analysis_skeleton(
+        data['segment'],
+        data['score'],
+        data['structureScore'],
+        data['acquisitionScore'],
+        data['valueScore']
+    )
+    refs = {key: value for key, value in data.items() if key not in BUNDLED_SECTIONS}
+    refs["content"] = {
+        "version": CONTENT_VERSION,
+        "bundle": f"/api/content/bundle/{CONTENT_VERSION}",
+        "sections": render_analysis.sections,
+        "variables": {
+            **score_variables,
+            "first_name": data['firstName'],
+            "city": data['city']
         }
-        
-        # Leçon business sur l'investissement
-        investment_lesson = {
-            "titre": "Ce qui sépare les conciergeries qui stagnent de celles qui explosent",
-            "message": f"""{first_name}, tu es à un tournant.
+    }
+    return refs
 
-Tu as posé des bases, tu as une activité qui fonctionne. Mais tu ressens ce plafond de verre. Et je vais te dire pourquoi tu n'arrives pas à le franchir.
 
-95% des gérants de conciergerie font la même erreur : ils considèrent l'investissement en acquisition comme une dépense optionnelle. "Quand j'aurai plus de trésorerie, j'investirai dans la com." C'est exactement l'inverse qu'il faut faire.
+def diagnostic_response(diagnostic: SerializedDiagnostic, content: str) -> Response:
+    if content == "refs":
+        return Response(content=orjson.dumps(diagnostic_content_refs(diagnostic)), media_type="application/json")
+    return diagnostic.response()
 
-La conciergerie est un business de RÉCURRENT. Chaque propriétaire signé te rapporte des commissions pendant des mois, voire des années. Un propriétaire acquis pour 200€ peut te rapporter 5 000€, 10 000€ ou plus sur sa durée de vie.
 
-Le ROI de l'acquisition en conciergerie est parmi les plus élevés de tous les secteurs. Mais tu hésites à investir 1 000€/mois pour construire un moteur qui te rapportera 10x, 20x plus ?
+def build_diagnostic_document(request: DiagnosticRequest, diagnostic: SerializedDiagnostic) -> dict:
+    return {
+        **diagnostic.data,
+        'id': str(uuid.uuid4()),
+        'timestamp': datetime.now(timezone.utc),
+        'answers': request.answers,
+        'llmVariant': request.llm
+    }
 
-Voici la vérité : ton ambition définit ton budget.
-• Tu veux rester à ton niveau actuel ? Continue comme ça.
-• Tu veux doubler, tripler ? Il faut investir proportionnellement.
 
-Aucune entreprise sérieuse ne se développe sans investir dans sa croissance. Ce n'est pas un choix, c'est une loi du business.
+def build_webhook_payload(request: DiagnosticRequest, diagnostic: SerializedDiagnostic) -> dict:
+    return {
+        **diagnostic.data,
+        "llmVariant": request.llm,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "source": "backend_api"
+    }
 
-La différence entre toi et les conciergeries qui cartonnent ? Elles ont compris que l'investissement en acquisition est un ACTIF, pas une charge. Plus tu construis un moteur d'acquisition puissant, plus tu vas chercher de nouveaux leads, plus ton entreprise prend de la valeur.""",
-            "keyPoints": [
-                "L'acquisition est un actif qui s'apprécie, pas une dépense qui disparaît",
-                "Ton ambition définit ton budget d'investissement",
-                "Le récurrent de la conciergerie rend le ROI de l'acquisition exceptionnel",
-                "Pas de franchissement du plafond de verre sans investissement structuré"
-            ]
-        }
-        
-        # Roadmap 12 mois
-        roadmap = {
-            "titre": "Ton plan d'accélération sur 12 mois",
-            "phases": [
-                {
-                    "periode": "Mois 1-3 : Consolidation",
-                    "objectif": f"Renforcer ton point faible : {weakest}",
-                    "actions": [
-                        f"Audit complet de ta {weakest} actuelle",
-                        "Plan d'action ciblé sur les 3 quick wins prioritaires",
-                        "Mise en place d'un système opérationnel structuré"
-                    ]
-                },
-                {
-                    "periode": "Mois 4-6 : Systématisation",
-                    "objectif": "Créer des systèmes qui tournent sans toi",
-                    "actions": [
-                        "Automatiser tout ce qui peut l'être",
-                        "Former ton équipe/prestataires sur les process",
-                        "Installer un rituel de pilotage hebdomadaire"
-                    ]
-                },
-                {
-                    "periode": "Mois 7-9 : Croissance maîtrisée",
-                    "objectif": "Scaler sur des bases solides",
-                    "actions": [
-                        "Activer ton moteur d'acquisition à plein régime",
-                        "Recruter ou structurer pour absorber la croissance",
-                        "Optimiser ta marge par logement"
-                    ]
-                },
-                {
-                    "periode": "Mois 10-12 : Optimisation",
-                    "objectif": "Maximiser la valeur",
-                    "actions": [
-                        "Affiner tous les process pour l'excellence opérationnelle",
-                        "Préparer un dossier de valorisation complet",
-                        "Définir ta stratégie long terme (scale, revente, levée)"
-                    ]
-                }
-            ]
-        }
-        
-        # La recommandation est générée dynamiquement par generate_personalized_recommendation()
 
-    else:
-        # --- SEGMENT MACHINE (33-44 points) ---
-        diag_summary = generate_coherent_diag_summary()
-        main_blocker = calculated_blocker
-        priority = calculated_priority
-        
-        # Analyse Structure
-        structure_analysis = {
-            "score": f"{structure_score}/20",
-            "percentage": structure_pct,
-            "status": "solide" if structure_pct >= 70 else "mature",
-            "diagnostic": f"""Ta structure est clairement au-dessus de la moyenne. Tu as des process, une équipe ou des prestataires qui fonctionnent, et tu peux t'absenter sans que tout s'écroule.
-
-Les axes d'optimisation pour aller encore plus loin :
-• Industrialiser ce qui peut encore l'être
-• Créer des indicateurs avancés (pas juste du reporting, du prédictif)
-• Préparer ta structure à absorber un doublement de volume
-
-À ton niveau, chaque point d'optimisation a un impact direct sur ta valorisation.""",
-            "quickWins": [
-                "Identifie les 2-3 process qui ne sont pas encore au niveau industriel",
-                "Mets en place un dashboard temps réel de tes KPIs clés",
-                "Crée un plan de capacité : combien de logements tu peux absorber sans recrutement ?"
-            ]
-        }
-        
-        # Analyse Acquisition
-        acquisition_analysis = {
-            "score": f"{acquisition_score}/18",
-            "percentage": acquisition_pct,
-            "status": "performant" if acquisition_pct >= 70 else "établi",
-            "diagnostic": f"""Tu as un moteur d'acquisition qui fonctionne. Des leads arrivent, tu convertis, tu grandis.
-
-La question maintenant : comment passer à l'échelle supérieure ?
-
-Options pour accélérer :
-• Acquisition payante (Google Ads, Facebook Ads ciblé propriétaires)
-• Partenariats stratégiques (agents immobiliers, notaires, promoteurs)
-• Expansion géographique avec réplication de ton modèle
-• Rachat de portefeuilles de conciergeries moins structurées""",
-            "quickWins": [
-                "Calcule ton CAC (coût d'acquisition client) précis par canal",
-                "Teste un budget pub de 500€ sur 30 jours pour valider le canal payant",
-                "Identifie 5 partenaires potentiels à contacter ce mois-ci"
-            ]
-        }
-        
-        # Analyse Valeur
-        value_analysis = {
-            "score": f"{value_score}/6",
-            "percentage": value_pct,
-            "status": "élevé" if value_pct >= 70 else "bon",
-            "diagnostic": f"""Ta conciergerie a une vraie valeur patrimoniale. Ce n'est plus un job, c'est un actif.
-
-Un acheteur ou investisseur verrait :
-• Une structure qui tourne de façon autonome
-• Des process documentés et reproductibles
-• Un moteur d'acquisition prévisible
-• Des contrats solides avec les propriétaires
-
-Pour maximiser ta valorisation :
-• Documenter tout ce qui rend ton modèle unique et réplicable
-• Optimiser ta marge nette (c'est sur ça qu'on te valorise)
-• Préparer un data room complet pour les due diligences""",
-            "quickWins": [
-                "Crée un mémo de présentation de ta conciergerie (10 pages max)",
-                "Calcule ton EBITDA réel (en te versant un salaire de marché)",
-                "Liste ce qui te différencie de la concurrence en 5 points"
-            ]
-        }
-        
-        # Leçon business sur l'investissement
-        investment_lesson = {
-            "titre": "Le levier que même les meilleurs sous-exploitent",
-            "message": f"""{first_name}, tu fais partie de l'élite. Mais même à ton niveau, il y a un levier que tu sous-exploites probablement.
+# Running batches, streams and late GPT summaries keep going (and get saved)
+# after their response is sent or the client disconnects
+analysis_tasks = set()
 
-Tu as structuré, tu as délégué, tu as des process. Mais est-ce que ton moteur d'acquisition est vraiment à la hauteur de tes ambitions ?
 
-La plupart des conciergeries matures comme la tienne font une erreur : elles se reposent sur leur réputation et leur bouche-à-oreille. Ça fonctionne, mais ça ne scale pas.
+async def queue_audit_webhook(request: DiagnosticRequest, diagnostic: SerializedDiagnostic):
+    # Queue the webhook - delivered in the background with retries
+    try:
+        with span("webhook.enqueue"):
+            await webhook_outbox.enqueue(WEBHOOK_AUDIT_URL, build_webhook_payload(request, diagnostic))
+    except Exception as e:
+        logger.warning(f"Failed to queue webhook: {e}")
+        WEBHOOK_FAILURES.labels("enqueue").inc()
+
+
+async def save_diagnostic(
+    request: DiagnosticRequest,
+    diagnostic: SerializedDiagnostic,
+    *,
+    summary_pending: bool = False,
+    idempotency: Optional[dict] = None
+) -> str:
+    """Store the diagnostic and queue its audit webhook (failures are logged, not raised)
+    
+    With `summary_pending`, the document is flagged and the webhook is left to
+    `complete_pending_summary`. `idempotency` (idempotencyKey and
+    requestFingerprint) is stored for `find_submission`. Returns the
+    diagnostic id.
+    """
+    doc = build_diagnostic_document(request, diagnostic)
+    if summary_pending:
+        doc['summaryPending'] = True
+    if idempotency:
+        doc.update(idempotency)
+    
+    with stage("persist"):
+        # Save to database
+        try:
+            with span("content_store.dehydrate"):
+                doc = await content_store.dehydrate(doc)
+            with span("mongo.insert_one", collection="diagnostics"):
+                await db.diagnostics.insert_one(doc)
+        except Exception as e:
+            logger.warning(f"Failed to save diagnostic to DB: {e}")
+            DB_SAVE_FAILURES.inc()
+        
+        if not summary_pending:
+            await queue_audit_webhook(request, diagnostic)
+    
+    return doc['id']
 
-Voici ce que font les conciergeries qui doublent ou triplent leur nombre de logements en 18 mois : elles investissent MASSIVEMENT dans l'acquisition. Pas 500€/mois. Un budget cohérent avec leur ambition.
 
-Ton ambition définit ton budget. Tu veux doubler ? Investis en conséquence. Tu veux tripler ? Investis proportionnellement. C'est mathématique.
+async def complete_pending_summary(request: DiagnosticRequest, detailed_analysis: dict, gpt_task: asyncio.Task, diagnostic_id: str):
+    """Patch a diagnostic answered with the deterministic summary once GPT is done, then queue its webhook"""
+    try:
+        analysis = merge_gpt_analysis(detailed_analysis, await gpt_task)
+    except Exception as e:
+        analysis = gpt_fallback(e, detailed_analysis)
+    
+    update = {"$unset": {"summaryPending": ""}}
+    if analysis['diagSummary'] != detailed_analysis['diagSummary']:
+        update["$set"] = {"diagSummary": analysis['diagSummary']}
+    try:
+        with span("mongo.update_one", collection="diagnostics"):
+            await db.diagnostics.update_one({"id": diagnostic_id}, update)
+    except Exception as e:
+        logger.warning(f"Failed to store late GPT summary for {diagnostic_id}: {e}")
+        DB_SAVE_FAILURES.inc()
+    
+    await queue_audit_webhook(request, serialize_diagnostic(request, analysis))
 
-À ton niveau, chaque euro investi en acquisition a un effet de levier considérable. Tu as la structure pour absorber la croissance. Tu as les process. Ce qui te manque peut-être, c'est un moteur d'acquisition qui tourne à plein régime et une équipe dédiée pour l'opérer.""",
-            "keyPoints": [
-                "À ton niveau, l'acquisition est le principal levier de croissance",
-                "Les conciergeries qui explosent investissent massivement et structurellement",
-                "Ton ambition définit ton budget : viser haut implique d'investir en conséquence",
-                "Déléguer l'acquisition permet de te concentrer sur ta zone de génie"
-            ]
-        }
-        
-        # Roadmap 12 mois
-        roadmap = {
-            "titre": "Ton plan d'optimisation et de scale sur 12 mois",
-            "phases": [
-                {
-                    "periode": "Mois 1-3 : Clarification stratégique",
-                    "objectif": "Définir ta vision et ton plan",
-                    "actions": [
-                        "Clarifier ton objectif : scale, revente, ou optimisation ?",
-                        "Faire une valorisation précise de ta conciergerie",
-                        "Identifier les leviers à activer en priorité"
-                    ]
-                },
-                {
-                    "periode": "Mois 4-6 : Optimisation",
-                    "objectif": "Maximiser marge et efficacité",
-                    "actions": [
-                        "Renégocier tes contrats prestataires",
-                        "Optimiser ta tarification et tes commissions",
-                        "Automatiser les derniers process manuels"
-                    ]
-                },
-                {
-                    "periode": "Mois 7-9 : Accélération",
-                    "objectif": "Activer les leviers de croissance",
-                    "actions": [
-                        "Lancer ton moteur d'acquisition payante",
-                        "Développer les partenariats stratégiques",
-                        "Préparer la structure pour absorber la croissance"
-                    ]
-                },
-                {
-                    "periode": "Mois 10-12 : Valorisation",
-                    "objectif": "Préparer la sortie ou le refinancement",
-                    "actions": [
-                        "Constituer un data room complet",
-                        "Solliciter des valorisations ou des offres",
-                        "Négocier en position de force"
-                    ]
-                }
-            ]
-        }
-        
-        # La recommandation est générée dynamiquement par generate_personalized_recommendation()
 
-    return {
-        "segment": segment,
-        "diagSummary": diag_summary,
-        "mainBlocker": main_blocker,
-        "priority": priority,
-        "structureAnalysis": structure_analysis,
-        "acquisitionAnalysis": acquisition_analysis,
-        "valueAnalysis": value_analysis,
-        "investmentLesson": investment_lesson,
-        "roadmap": roadmap,
-        "goodtimeRecommendation": recommendation
-    }
+async def analyze_and_save(request: DiagnosticRequest, segment: str, idempotency: Optional[dict] = None) -> SerializedDiagnostic:
+    """Analyze and save one diagnostic within ANALYZE_LATENCY_BUDGET
+    
+    If the GPT summary is not ready by then, the deterministic one is returned
+    and saved, and the stored diagnostic is patched (and its webhook queued)
+    when GPT finishes.
+    """
+    prompt, detailed_analysis = await prepare_analysis(request, segment)
+    
+    gpt_task = asyncio.create_task(fetch_gpt_analysis(request, segment, prompt))
+    try:
+        gpt_analysis = await asyncio.wait_for(asyncio.shield(gpt_task), timeout=ANALYZE_LATENCY_BUDGET or None)
+        analysis = merge_gpt_analysis(detailed_analysis, gpt_analysis)
+    except Exception as e:
+        if gpt_task.done():
+            analysis = gpt_fallback(e, detailed_analysis)
+        else:
+            # Over budget: answer now, let the completion finish in the background
+            logger.info(f"GPT summary not ready after {ANALYZE_LATENCY_BUDGET}s, answering with the deterministic one")
+            LATENCY_BUDGET_EXCEEDED.inc()
+            diagnostic = serialize_diagnostic(request, detailed_analysis)
+            diagnostic_id = await save_diagnostic(request, diagnostic, summary_pending=True, idempotency=idempotency)
+            task = asyncio.create_task(complete_pending_summary(request, detailed_analysis, gpt_task, diagnostic_id))
+            analysis_tasks.add(task)
+            task.add_done_callback(analysis_tasks.discard)
+            return diagnostic
+    
+    diagnostic = serialize_diagnostic(request, analysis)
+    await save_diagnostic(request, diagnostic, idempotency=idempotency)
+    return diagnostic
 
 
-# API Routes
-@api_router.get("/")
-async def root():
-    return {"message": "Goodtime Diagnostic API"}
+async def find_submission(key: str, fingerprint: str) -> Optional[SerializedDiagnostic]:
+    """Diagnostic saved under `key` within IDEMPOTENCY_WINDOW, if any"""
+    since = datetime.now(timezone.utc) - timedelta(seconds=IDEMPOTENCY_WINDOW)
+    try:
+        with span("mongo.find_one", collection="diagnostics"):
+            doc = await db.diagnostics.find_one(
+                {"idempotencyKey": key, "timestamp": {"$gte": since}},
+                {"_id": 0},
+                sort=[("timestamp", DESCENDING)]
+            )
+        doc = await content_store.rehydrate(doc)
+    except Exception as e:
+        # Without the lookup, a duplicate costs a new analysis, not an error
+        logger.warning(f"Idempotency lookup failed: {e}")
+        return None
+    if doc is None:
+        return None
+    if doc.get('requestFingerprint') != fingerprint:
+        raise IdempotencyConflict(key)
+    return SerializedDiagnostic({field: doc.get(field) for field in DiagnosticResponse.model_fields})
+
+
+async def submit_diagnostic(request: DiagnosticRequest, segment: str, key: str, fingerprint: str) -> Tuple[SerializedDiagnostic, bool]:
+    """The diagnostic saved under `key`, analyzing it if there is none; and whether it was stored already"""
+    stored = await find_submission(key, fingerprint)
+    if stored is not None:
+        IDEMPOTENT_REPLAYS.labels("stored").inc()
+        return stored, True
+    idempotency = {"idempotencyKey": key, "requestFingerprint": fingerprint}
+    return await analyze_and_save(request, segment, idempotency), False
 
 
 @api_router.post("/diagnostic/analyze", response_model=DiagnosticResponse)
-async def analyze_diagnostic_endpoint(request: DiagnosticRequest):
-    """Analyze diagnostic answers and generate personalized recommendations"""
-    
-    # Generate prompt and get segment
-    prompt, segment = generate_analysis_prompt(
-        request.userInfo,
-        request.answers,
-        request.scores
-    )
+async def analyze_diagnostic_endpoint(
+    request: DiagnosticRequest,
+    content: Literal["inline", "refs"] = Query("inline"),
+    idempotency_key: Optional[str] = Header(default=None)
+):
+    """Analyze diagnostic answers and generate personalized recommendations
     
-    # Call OpenAI GPT for personalized analysis
+    Answers within ANALYZE_LATENCY_BUDGET (see `analyze_and_save`).
+    
+    Submissions are idempotent for IDEMPOTENCY_WINDOW seconds, keyed on the
+    Idempotency-Key header or else on the lead's email and answers: a
+    duplicate joins the running analysis or gets the saved diagnostic, with
+    an Idempotent-Replayed header. Reusing a key for another diagnostic is
+    rejected with a 422.
+    
+    With `?content=refs`, the static sections are returned as references into
+    the content bundle (see `diagnostic_content_refs`) instead of inline text.
+    """
+    
+    segment, = score_requests([request])
+    if not IDEMPOTENCY_WINDOW:
+        return diagnostic_response(await analyze_and_save(request, segment), content)
+    
+    fingerprint = request_fingerprint(request.userInfo.email, request.answers)
     try:
-        logger.info(f"Calling OpenAI API for analysis...")
-        completion = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Tu es un expert en structuration de conciergeries Airbnb. Tu fournis des analyses business directes et professionnelles en français."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1000
+        key = submission_key(idempotency_key, fingerprint)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        (diagnostic, stored), joined = await submissions.run(
+            key, fingerprint, lambda: submit_diagnostic(request, segment, key, fingerprint)
         )
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key already used for a different diagnostic")
+    
+    response = diagnostic_response(diagnostic, content)
+    if stored or joined:
+        response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+async def process_diagnostic_batch(items: List[Dict[str, Any]], results: asyncio.Queue):
+    """Analyze every item with bounded parallelism, then persist in bulk
+    
+    One line per item is put on `results` as soon as it is ready, followed by
+    a summary line once the diagnostics are saved, then None.
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    docs = []
+    webhooks = []
+    
+    async def process(index: int, request: DiagnosticRequest, segment: str):
+        try:
+            async with semaphore:
+                analysis = await run_analysis(request, segment)
+            diagnostic = serialize_diagnostic(request, analysis)
+        except Exception as e:
+            logger.error(f"Batch item {index} failed: {e}")
+            await results.put({"index": index, "status": "error", "error": str(e)})
+            return
+        docs.append(build_diagnostic_document(request, diagnostic))
+        webhooks.append(build_webhook_payload(request, diagnostic))
+        await results.put({"index": index, "status": "ok", "result": diagnostic.data})
+    
+    saved = 0
+    try:
+        valid = []
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, DiagnosticRequest.model_validate(item)))
+            except ValidationError as e:
+                await results.put({"index": index, "status": "error", "error": e.errors(include_url=False, include_context=False)})
         
-        # Parse GPT response
-        gpt_response = completion.choices[0].message.content.strip()
-        logger.info(f"GPT Response received: {gpt_response[:200]}...")
-        
-        # Clean the response if it contains markdown code blocks
-        if gpt_response.startswith("```"):
-            gpt_response = gpt_response.split("```")[1]
-            if gpt_response.startswith("json"):
-                gpt_response = gpt_response[4:]
-        gpt_response = gpt_response.strip()
-        
-        gpt_analysis = json.loads(gpt_response)
-        
-        # Get detailed analysis from deterministic function for structure
-        detailed_analysis = await analyze_diagnostic(
-            request.userInfo,
-            request.answers,
-            request.scores
-        )
+        # Score the whole batch in one pass; if an item breaks it, score the
+        # items one by one so that only the broken ones fail
+        try:
+            scored = list(zip(valid, score_requests([request for _, request in valid])))
+        except Exception as e:
+            logger.warning(f"Batch scoring failed, scoring items one by one: {e}")
+            scored = []
+            for index, request in valid:
+                try:
+                    segment, = score_requests([request])
+                except Exception as e:
+                    logger.error(f"Batch item {index} failed: {e}")
+                    await results.put({"index": index, "status": "error", "error": str(e)})
+                    continue
+                scored.append(((index, request), segment))
         
-        # Merge GPT personalized text with detailed structure
-        # IMPORTANT: mainBlocker et priority sont TOUJOURS calculés de façon déterministe
-        # GPT ne génère que le diagSummary pour le style - pas les données critiques
-        analysis = {
-            'segment': segment,
-            'diagSummary': gpt_analysis.get('diagSummary', detailed_analysis['diagSummary']),
-            'mainBlocker': detailed_analysis['mainBlocker'],  # TOUJOURS déterministe
-            'priority': detailed_analysis['priority'],  # TOUJOURS déterministe
-            'goodtimeRecommendation': detailed_analysis['goodtimeRecommendation'],
-            'structureAnalysis': detailed_analysis.get('structureAnalysis'),
-            'acquisitionAnalysis': detailed_analysis.get('acquisitionAnalysis'),
-            'valueAnalysis': detailed_analysis.get('valueAnalysis'),
-            'investmentLesson': detailed_analysis.get('investmentLesson'),
-            'roadmap': detailed_analysis.get('roadmap')
-        }
+        await asyncio.gather(*(
+            process(index, request, segment)
+            for (index, request), segment in scored
+        ))
         
+        if docs:
+            try:
+                with span("content_store.dehydrate", documents=len(docs)):
+                    stored_docs = await content_store.dehydrate_many(docs)
+                with span("mongo.insert_many", collection="diagnostics", documents=len(docs)):
+                    result = await db.diagnostics.insert_many(stored_docs, ordered=False)
+                saved = len(result.inserted_ids)
+            except Exception as e:
+                logger.warning(f"Failed to save diagnostic batch to DB: {e}")
+                # With ordered=False the documents before and after a failed one are still written
+                inserted = (getattr(e, "details", None) or {}).get("nInserted", 0)
+                saved = inserted
+                DB_SAVE_FAILURES.inc(len(docs) - inserted)
+            try:
+                await webhook_outbox.enqueue_many(WEBHOOK_AUDIT_URL, webhooks)
+            except Exception as e:
+                logger.warning(f"Failed to queue batch webhooks: {e}")
+                WEBHOOK_FAILURES.labels("enqueue").inc(len(webhooks))
     except Exception as e:
-        logger.error(f"OpenAI API error: {e}")
-        # Fallback to deterministic analysis
-        analysis = await analyze_diagnostic(
-            request.userInfo,
-            request.answers,
-            request.scores
-        )
+        logger.error(f"Batch failed: {e}")
+    finally:
+        # Always sent, so the client can tell a complete stream from a cut one
+        await results.put({
+            "status": "summary",
+            "total": len(items),
+            "succeeded": len(docs),
+            "failed": len(items) - len(docs),
+            "saved": saved
+        })
+        await results.put(None)
+
+
+@api_router.post("/diagnostic/analyze/batch")
+async def analyze_diagnostic_batch_endpoint(items: List[Dict[str, Any]] = Body(...)):
+    """Analyze many diagnostics at once (e.g. CSV imports from partner events)
     
-    # Build response
-    response = DiagnosticResponse(
-        firstName=request.userInfo.firstName,
-        lastName=request.userInfo.lastName,
-        email=request.userInfo.email,
-        phone=request.userInfo.phone,
-        city=request.userInfo.city,
-        units=request.userInfo.units,
-        segment=analysis['segment'],
-        score=request.scores.get('total', 0),
-        structureScore=request.scores.get('structure', 0),
-        acquisitionScore=request.scores.get('acquisition', 0),
-        valueScore=request.scores.get('value', 0),
-        diagSummary=analysis['diagSummary'],
-        mainBlocker=analysis['mainBlocker'],
-        priority=analysis['priority'],
-        goodtimeRecommendation=analysis['goodtimeRecommendation'],
-        structureAnalysis=analysis.get('structureAnalysis'),
-        acquisitionAnalysis=analysis.get('acquisitionAnalysis'),
-        valueAnalysis=analysis.get('valueAnalysis'),
-        investmentLesson=analysis.get('investmentLesson'),
-        roadmap=analysis.get('roadmap')
-    )
+    Takes a JSON array of DiagnosticRequest payloads and streams back NDJSON:
+    one line per item as it completes ({"index", "status": "ok"|"error", ...})
+    and a final summary line once all diagnostics are saved.
+    """
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch limited to {BATCH_MAX_ITEMS} items")
+    
+    results = asyncio.Queue()
+    task = asyncio.create_task(process_diagnostic_batch(items, results))
+    analysis_tasks.add(task)
+    task.add_done_callback(analysis_tasks.discard)
+    
+    async def stream():
+        while True:
+            line = await results.get()
+            if line is None:
+                break
+            yield orjson.dumps(line) + b"\n"
     
-    # Send data to webhook
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+async def stream_diagnostic_analysis(request: DiagnosticRequest, segment: str, events: asyncio.Queue):
+    """Run the analysis for the SSE endpoint, publishing progress on `events`
+    
+    Puts ("analysis", SerializedDiagnostic) with the deterministic sections
+    right away, ("summary", {"delta"}) for each piece of the GPT diagSummary
+    as it is generated, then ("done", SerializedDiagnostic) once the final
+    diagnostic is saved, followed by None.
+    """
     try:
-        webhook_data = {
-            "firstName": request.userInfo.firstName,
-            "lastName": request.userInfo.lastName,
-            "email": request.userInfo.email,
-            "phone": request.userInfo.phone,
-            "city": request.userInfo.city,
-            "units": request.userInfo.units,
-            "segment": analysis['segment'],
-            "score": request.scores.get('total', 0),
-            "structureScore": request.scores.get('structure', 0),
-            "acquisitionScore": request.scores.get('acquisition', 0),
-            "valueScore": request.scores.get('value', 0),
-            "diagSummary": analysis['diagSummary'],
-            "mainBlocker": analysis['mainBlocker'],
-            "priority": analysis['priority'],
-            "goodtimeRecommendation": analysis['goodtimeRecommendation'],
-            "structureAnalysis": analysis.get('structureAnalysis'),
-            "acquisitionAnalysis": analysis.get('acquisitionAnalysis'),
-            "valueAnalysis": analysis.get('valueAnalysis'),
-            "investmentLesson": analysis.get('investmentLesson'),
-            "roadmap": analysis.get('roadmap'),
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "source": "backend_api"
-        }
+        prompt, analysis = await prepare_analysis(request, segment)
+        await events.put(("analysis", serialize_diagnostic(request, analysis)))
         
-        async with httpx.AsyncClient() as client_http:
-            webhook_response = await client_http.post(
-                WEBHOOK_AUDIT_URL,
-                json=webhook_data,
-                timeout=10.0
-            )
-            if webhook_response.status_code == 200:
-                logger.info(f"Webhook sent successfully to {WEBHOOK_AUDIT_URL}")
-            else:
-                logger.warning(f"Webhook returned status {webhook_response.status_code}")
+        # Only diagSummary comes from GPT, the rest is already final
+        try:
+            require_gpt(request)
+            cache_key = llm_cache.key_for(request.answers, request.scores, segment, request.userInfo.units)
+            gpt_analysis = await llm_cache.get(cache_key, request.userInfo)
+            
+            if gpt_analysis is None:
+                logger.info(f"Streaming OpenAI API analysis...")
+                extractor = JSONStringFieldExtractor("diagSummary")
+                chunks = []
+                with stage("openai"), span("openai.completion", model="gpt-4o-mini", stream=True):
+                    async for chunk in stream_gpt_analysis(prompt):
+                        chunks.append(chunk)
+                        delta = extractor.feed(chunk)
+                        if delta:
+                            await events.put(("summary", {"delta": delta}))
+                with span("gpt.parse"):
+                    gpt_analysis = parse_gpt_analysis("".join(chunks))
+                await llm_cache.put(cache_key, gpt_analysis, request.userInfo)
+            elif gpt_analysis.get('diagSummary'):
+                await events.put(("summary", {"delta": gpt_analysis['diagSummary']}))
+            
+            analysis = merge_gpt_analysis(analysis, gpt_analysis)
+        except Exception as e:
+            gpt_fallback(e, analysis)
+        
+        diagnostic = serialize_diagnostic(request, analysis)
+        await save_diagnostic(request, diagnostic)
+        await events.put(("done", diagnostic))
     except Exception as e:
-        logger.warning(f"Failed to send webhook: {e}")
+        logger.error(f"Streaming analysis failed: {e}")
+        await events.put(("error", {"detail": str(e)}))
+    finally:
+        await events.put(None)
+
+
+@api_router.post("/diagnostic/analyze/stream")
+async def analyze_diagnostic_stream_endpoint(request: DiagnosticRequest):
+    """Analyze diagnostic answers, streamed as Server-Sent Events
     
-    # Save to database
-    try:
-        doc = response.model_dump()
-        doc['timestamp'] = datetime.now(timezone.utc).isoformat()
-        doc['answers'] = request.answers
-        await db.diagnostics.insert_one(doc)
-    except Exception as e:
-        logger.warning(f"Failed to save diagnostic to DB: {e}")
+    Events: `analysis` (every deterministic section, sent immediately),
+    `summary` (incremental text of the personalized diagSummary) and `done`
+    (the final DiagnosticResponse, as returned by /diagnostic/analyze). If GPT
+    fails, `done` carries the deterministic summary instead.
+    """
+    segment, = score_requests([request])
+    events = asyncio.Queue()
+    task = asyncio.create_task(stream_diagnostic_analysis(request, segment, events))
+    analysis_tasks.add(task)
+    task.add_done_callback(analysis_tasks.discard)
     
-    return response
+    async def stream():
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            name, data = event
+            body = data.json if isinstance(data, SerializedDiagnostic) else orjson.dumps(data)
+            yield b"event: " + name.encode() + b"\ndata: " + body + b"\n\n"
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def run_diagnostic_job(payload: dict) -> dict:
+    """Job handler: the same analysis and persistence as /diagnostic/analyze, without the latency budget"""
+    request = DiagnosticRequest.model_validate(payload)
+    segment, = score_requests([request])
+    analysis = await run_analysis(request, segment)
+    diagnostic = serialize_diagnostic(request, analysis)
+    await save_diagnostic(request, diagnostic)
+    return diagnostic.data
+
+
+def job_view(job: dict) -> dict:
+    view = {
+        "jobId": job["_id"],
+        "status": job["status"],
+        "createdAt": job["created_at"].isoformat(),
+        "updatedAt": job["updated_at"].isoformat()
+    }
+    if job["status"] == DONE:
+        view["result"] = job["result"]
+    elif job["status"] == FAILED:
+        view["error"] = job["error"]
+    return view
+
+
+@api_router.post("/diagnostic/jobs", status_code=202)
+async def submit_diagnostic_job(request: DiagnosticRequest, response: Response):
+    """Queue a diagnostic analysis and return its job ID right away
+    
+    Poll GET /diagnostic/jobs/{jobId} or connect to the WebSocket at
+    /diagnostic/jobs/{jobId}/ws to receive the result.
+    """
+    job_id = await job_queue.submit(request.model_dump())
+    response.headers["Location"] = f"/api/diagnostic/jobs/{job_id}"
+    return {"jobId": job_id, "status": "queued"}
+
+
+@api_router.get("/diagnostic/jobs")
+async def get_diagnostic_job_stats():
+    """Job counts per state (queued, running, done, failed)"""
+    return await job_queue.stats()
+
+
+@api_router.get("/diagnostic/jobs/{job_id}")
+async def get_diagnostic_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
+
+@api_router.websocket("/diagnostic/jobs/{job_id}/ws")
+async def diagnostic_job_updates(websocket: WebSocket, job_id: str):
+    """Sends the job's current state, then its final state once finished, and closes"""
+    await websocket.accept()
+    job = await job_queue.get(job_id)
+    if job is None:
+        await websocket.close(code=4404, reason="Job not found")
+        return
+    await websocket.send_json(job_view(job))
+    if job["status"] not in FINISHED:
+        job = await job_queue.wait(job_id, timeout=JOB_WAIT_TIMEOUT)
+        if job is not None and job["status"] in FINISHED:
+            await websocket.send_json(job_view(job))
+    await websocket.close()
+
+
+@api_router.get("/diagnostic/cache")
+async def get_analysis_cache_stats():
+    """Hit/miss counters of the deterministic analysis, GPT response and content block caches"""
+    info = build_analysis_skeleton.cache_info()
+    return {
+        "analysis": {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "maxSize": info.maxsize
+        },
+        "llm": llm_cache.stats(),
+        "content": content_store.stats()
+    }
+
+
+class LLMModeUpdate(BaseModel):
+    mode: Literal["gpt", "deterministic", "rollout"]
+    rolloutPercent: Optional[int] = Field(default=None, ge=0, le=100)
+
+
+def require_admin(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (no ADMIN_TOKEN)")
+    if token is None or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses the weak comparison: W/ prefixes are ignored, as are
+    the encoding suffixes CompressionMiddleware adds to compressed bodies' tags"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in (base_etag(tag.removeprefix("W/")) for tag in candidates)
+
+
+def content_bundle_response(if_none_match: Optional[str], cache_control: str) -> Response:
+    headers = {"ETag": CONTENT_ETAG, "Cache-Control": cache_control}
+    if etag_matches(if_none_match, CONTENT_ETAG):
+        return Response(status_code=304, headers=headers)
+    return Response(content=CONTENT_BUNDLE_JSON, media_type="application/json", headers=headers)
+
+
+@api_router.get("/content/bundle")
+async def get_content_bundle(if_none_match: Optional[str] = Header(default=None)):
+    """Analysis texts by template ID, for rendering `?content=refs` analyses client-side"""
+    return content_bundle_response(if_none_match, f"public, max-age={CONTENT_BUNDLE_MAX_AGE}")
+
+
+@api_router.get("/content/bundle/{version}")
+async def get_content_bundle_version(version: str, if_none_match: Optional[str] = Header(default=None)):
+    """A given bundle version: immutable, cacheable for a year"""
+    if version != CONTENT_VERSION:
+        raise HTTPException(status_code=404, detail=f"Unknown content version (current: {CONTENT_VERSION})")
+    return content_bundle_response(if_none_match, "public, max-age=31536000, immutable")
+
+
+@api_router.get("/llm-mode")
+async def get_llm_mode():
+    return llm_mode.snapshot()
+
+
+@api_router.put("/llm-mode")
+async def set_llm_mode(update: LLMModeUpdate, x_admin_token: Optional[str] = Header(default=None)):
+    """Switch GPT on, off or to a percentage rollout without redeploying (this instance only)"""
+    require_admin(x_admin_token)
+    llm_mode.set(update.mode, update.rolloutPercent)
+    return llm_mode.snapshot()
+
+
+@api_router.get("/circuit-breakers")
+async def get_circuit_breakers():
+    """State of the breakers guarding upstream dependencies"""
+    return {"openai": openai_breaker.snapshot()}
+
+
+@api_router.get("/webhooks/outbox")
+async def get_webhook_outbox_stats():
+    """Delivery counts per outbox state (pending, delivering, delivered, dead)"""
+    return await webhook_outbox.stats()
+
+
+# Fields returned by GET /diagnostics unless `fields` is given (the analysis
+# sections are only read by GET /diagnostics/{id})
+DIAGNOSTIC_LIST_FIELDS = [
+    "id", "timestamp", "firstName", "lastName", "email", "phone", "city", "units",
+    "segment", "score", "structureScore", "acquisitionScore", "valueScore", "mainBlocker"
+]
+DIAGNOSTIC_FIELDS = {"id", "timestamp", "answers", *DiagnosticResponse.model_fields}
+
+
+@api_router.get("/diagnostics")
+async def list_diagnostics(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    email: Optional[str] = None,
+    segment: Optional[str] = None,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    x_admin_token: Optional[str] = Header(default=None)
+):
+    """Saved diagnostics, newest first (back office: requires the admin token)
+    
+    Filter by exact `email` and/or `segment`, and by `from` (inclusive) / `to`
+    (exclusive) timestamps. The cursor of the next page is returned in the
+    X-Next-Cursor header (absent on the last page).
+    """
+    require_admin(x_admin_token)
+    selected = fields.split(",") if fields else DIAGNOSTIC_LIST_FIELDS
+    unknown = set(selected) - DIAGNOSTIC_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    
+    query = timestamp_range(date_from, date_to)
+    if email:
+        query['email'] = email
+    if segment:
+        query['segment'] = segment
+    
+    projection = {field: 1 for field in selected}
+    rehydrate = not set(STORED_SECTIONS).isdisjoint(selected)
+    if rehydrate:
+        # Stored sections are read from their blocks, personalized with the lead's fields
+        projection.update({field: 1 for field in ("contentRefs", *PERSONAL_DOCUMENT_FIELDS)})
+    
+    try:
+        docs, next_cursor = await fetch_page(db.diagnostics, query, projection, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if rehydrate:
+        docs = [
+            {field: doc[field] for field in selected if field in doc}
+            for doc in await content_store.rehydrate_many(docs)
+        ]
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return docs
+
+
+@api_router.get("/diagnostics/{diagnostic_id}")
+async def get_diagnostic(diagnostic_id: str, x_admin_token: Optional[str] = Header(default=None)):
+    """One saved diagnostic (back office: requires the admin token)"""
+    require_admin(x_admin_token)
+    # Internal fields (idempotency, summaryPending, llmVariant) are left out
+    projection = {"_id": 0, "contentRefs": 1, **{field: 1 for field in DIAGNOSTIC_FIELDS}}
+    doc = await content_store.rehydrate(await db.diagnostics.find_one({"id": diagnostic_id}, projection))
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Diagnostic not found")
+    return doc
 
 
 @api_router.post("/status", response_model=StatusCheck)
@@ -1272,19 +1523,28 @@ async def create_status_check(input: StatusCheckCreate):
     status_obj = StatusCheck(**status_dict)
     
     doc = status_obj.model_dump()
-    doc['timestamp'] = doc['timestamp'].isoformat()
     
     _ = await db.status_checks.insert_one(doc)
     return status_obj
 
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
-    
-    for check in status_checks:
-        if isinstance(check['timestamp'], str):
-            check['timestamp'] = datetime.fromisoformat(check['timestamp'])
+async def get_status_checks(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to")
+):
+    """Status checks, newest first; the next page's cursor is in X-Next-Cursor"""
+    try:
+        status_checks, next_cursor = await fetch_page(
+            db.status_checks, timestamp_range(date_from, date_to), {"id": 1, "client_name": 1, "timestamp": 1}, limit, cursor
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     return status_checks
 
@@ -1292,13 +1552,23 @@ async def get_status_checks():
 # Include the router in the main app
 app.include_router(api_router)
 
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (outside /api: scraped directly, not through the ingress)"""
+    body, content_type = render_latest()
+    return PlainResponse(content=body, media_type=content_type)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Trace-Id", "Idempotent-Replayed"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.environ.get('COMPRESSION_MIN_BYTES', '1024')))
+app.add_middleware(TracingMiddleware)
 
 # Configure logging
 logging.basicConfig(
@@ -1307,6 +1577,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+async def ensure_indexes():
+    """Indexes behind the paginated listings (newest first) and their filters"""
+    await db.diagnostics.create_index([("timestamp", DESCENDING), ("_id", DESCENDING)])
+    await db.diagnostics.create_index([("email", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)])
+    await db.diagnostics.create_index([("segment", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)])
+    await db.diagnostics.create_index("id", unique=True, sparse=True)
+    await db.diagnostics.create_index([("idempotencyKey", ASCENDING), ("timestamp", DESCENDING)], sparse=True)
+    await db.status_checks.create_index([("timestamp", DESCENDING), ("_id", DESCENDING)])
+    await llm_cache.ensure_indexes()
+    await content_store.ensure_indexes()
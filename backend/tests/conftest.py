@@ -0,0 +1,184 @@
+"""
+Shared fixtures for the in-process backend tests.
+The app is driven through httpx's ASGI transport, with Mongo replaced by
+mongomock-motor and OpenAI replaced by a fake async client.
+"""
+import json
+import os
+import sys
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+
+def pytest_addoption(parser):
+    parser.addoption("--benchmarks", action="store_true", help="also run the wall-clock load-test thresholds")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: wall-clock load test, skipped unless --benchmarks is given")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="wall-clock benchmark: run with --benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+GPT_ANALYSIS = {
+    "diagSummary": "Jean, voici le résumé GPT de test.",
+    "mainBlocker": "Acquisition aléatoire",
+    "priority": "Structurer l'acquisition.",
+    "goodtimeRecommendation": "Recommandation GPT de test."
+}
+
+
+class FakeStream:
+    """Mimics the async chunk stream returned with `stream=True`"""
+
+    def __init__(self, content, chunk_size, chunk_latency):
+        self.pieces = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+        self.chunk_latency = chunk_latency
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for piece in self.pieces:
+            await asyncio.sleep(self.chunk_latency)
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCompletions:
+    """Mimics `AsyncOpenAI().chat.completions` with a configurable latency"""
+
+    def __init__(self, latency=0.0, content=None, chunk_size=7, chunk_latency=0.0):
+        self.latency = latency
+        self.content = content if content is not None else json.dumps(GPT_ANALYSIS, ensure_ascii=False)
+        self.chunk_size = chunk_size
+        self.chunk_latency = chunk_latency
+        self.streams = []
+        self.calls = 0
+        self.last_kwargs = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        self.last_kwargs = kwargs
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        if kwargs.get("stream"):
+            stream = FakeStream(self.content, self.chunk_size, self.chunk_latency)
+            self.streams.append(stream)
+            return stream
+        message = SimpleNamespace(content=self.content)
+        usage = SimpleNamespace(
+            prompt_tokens=500,
+            completion_tokens=len(self.content) // 4,
+            # Prompts under 1024 tokens are never served from OpenAI's prompt cache
+            prompt_tokens_details=SimpleNamespace(cached_tokens=0)
+        )
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class FakeOpenAI:
+    def __init__(self, latency=0.0, content=None):
+        self.chat = SimpleNamespace(completions=FakeCompletions(latency, content))
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """The server module wired to an in-memory Mongo and a fake OpenAI client"""
+    from mongomock_motor import AsyncMongoMockClient
+    import server as server_module
+    from circuit_breaker import CircuitBreaker
+    from content_store import ContentStore
+    from idempotency import SingleFlight
+    from job_queue import JobQueue
+    from llm_cache import LLMResponseCache
+    from llm_mode import LLMModeSwitch
+    from webhook_outbox import WebhookOutbox
+
+    db = AsyncMongoMockClient()["test_database"]
+    monkeypatch.setattr(server_module, "db", db)
+    monkeypatch.setattr(server_module, "openai_client", FakeOpenAI())
+    # Workers are not started: queued webhooks stay pending in the fake outbox
+    monkeypatch.setattr(server_module, "webhook_outbox", WebhookOutbox(db.webhook_outbox))
+    monkeypatch.setattr(server_module, "llm_cache", LLMResponseCache(
+        db.llm_cache, ttl_seconds=3600, version=server_module.llm_cache.version
+    ))
+    monkeypatch.setattr(server_module, "content_store", ContentStore(db.content_blocks, version=server_module.content_store.version))
+    monkeypatch.setattr(server_module, "submissions", SingleFlight())
+    # Workers are not started either: tests run queued jobs with process()
+    monkeypatch.setattr(server_module, "job_queue", JobQueue(db.diagnostic_jobs, server_module.run_diagnostic_job))
+    monkeypatch.setattr(server_module, "llm_mode", LLMModeSwitch())
+    # Fresh breaker per test so failures in one test do not open it for the next
+    monkeypatch.setattr(server_module, "openai_breaker", CircuitBreaker("openai"))
+    return server_module
+
+
+@pytest.fixture
+def client(server):
+    """httpx client bound to the app; each asyncio.run() in a test can use it"""
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test")
+    yield client
+    asyncio.run(client.aclose())
+
+
+@pytest.fixture
+def post(client):
+    """`post(url, **kwargs)`: one POST to the app, run to completion"""
+    def post(url, **kwargs):
+        return asyncio.run(client.post(url, **kwargs))
+    return post
+
+
+@pytest.fixture
+def admin_headers(server, monkeypatch):
+    """Back-office credentials accepted by the `server` fixture"""
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "test-admin-token")
+    return {"X-Admin-Token": "test-admin-token"}
+
+
+@pytest.fixture
+def diagnostic_payload():
+    return {
+        "userInfo": {
+            "firstName": "Jean",
+            "lastName": "Martin",
+            "email": "jean@conciergerie.fr",
+            "phone": "0698765432",
+            "city": "Lyon",
+            "units": "30"
+        },
+        "answers": {str(q): 1 for q in range(1, 23)},
+        "scores": {
+            "total": 22,
+            "structure": 10,
+            "acquisition": 9,
+            "value": 3
+        }
+    }
@@ -0,0 +1,110 @@
+"""
+Tests for the precompiled analysis templates
+The digests in fixtures/analysis_digests.json were taken from the original
+f-string implementation of analyze_diagnostic: the template table must
+reproduce its output byte for byte over the whole score grid.
+"""
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+
+import pytest
+
+from analysis_content import TEMPLATES, Var, compile_analysis, compile_template
+
+DIGESTS = json.loads((Path(__file__).parent / "fixtures" / "analysis_digests.json").read_text())
+
+
+class TestTemplateCompilation:
+    """compile_template builds fresh structures from the variables mapping"""
+
+    def test_placeholders_and_vars(self):
+        render = compile_template("t", {"text": "{first_name} à {city}", "pct": Var("pct"), "items": ["a", "{city}"]})
+        result = render({"first_name": "Jean", "city": "Lyon", "pct": 42})
+        assert result == {"text": "Jean à Lyon", "pct": 42, "items": ["a", "Lyon"]}
+
+    def test_user_text_is_not_reinterpreted(self):
+        """A first name containing braces is inserted literally"""
+        render = compile_template("t", "Bonjour {first_name}")
+        assert render({"first_name": "{city}"}) == "Bonjour {city}"
+
+    def test_each_render_returns_new_objects(self):
+        render = compile_template("t", {"items": ["a"]})
+        first, second = render({}), render({})
+        first["items"].append("b")
+        assert second == {"items": ["a"]}
+
+    def test_every_template_compiles(self):
+        for segment in ("artisanal", "transition", "machine"):
+            assert f"{segment}.roadmap" in TEMPLATES
+        compile_analysis.cache_clear()
+        render = compile_analysis(
+            "artisanal", "summary.early", "blocker.acquisition",
+            ("recommendation.intro.early", "recommendation.cta"), "low", "low", "low"
+        )
+        assert compile_analysis.cache_info().currsize == 1
+        assert callable(render)
+
+
+class TestAnalysisParity:
+    """analyze_diagnostic output matches the original implementation"""
+
+    @pytest.mark.parametrize("structure", range(21))
+    def test_output_matches_reference(self, server, structure):
+        user = server.UserInfo(
+            firstName="Jean", lastName="Martin", email="j@x.fr",
+            phone="06", city="Lyon", units="30"
+        )
+
+        async def digest():
+            h = hashlib.sha256()
+            for acquisition in range(19):
+                for value in range(7):
+                    for total in (structure + acquisition + value, 10, 25, 40):
+                        result = await server.analyze_diagnostic(user, {}, {
+                            "total": total,
+                            "structure": structure,
+                            "acquisition": acquisition,
+                            "value": value
+                        })
+                        h.update(json.dumps(result, ensure_ascii=False, sort_keys=True).encode())
+            return h.hexdigest()
+
+        assert asyncio.run(digest()) == DIGESTS[str(structure)]
+
+
+class TestAnalysisCache:
+    """The score-dependent skeleton is shared across leads with the same scores"""
+
+    def test_same_scores_hit_cache_with_own_personal_fields(self, server):
+        server.build_analysis_skeleton.cache_clear()
+        scores = {"total": 22, "structure": 10, "acquisition": 9, "value": 3}
+        jean = server.UserInfo(firstName="Jean", lastName="M", email="j@x.fr", phone="06", city="Lyon", units="3")
+        marie = server.UserInfo(firstName="Marie", lastName="D", email="m@x.fr", phone="06", city="Nice", units="8")
+
+        first = asyncio.run(server.analyze_diagnostic(jean, {}, scores))
+        second = asyncio.run(server.analyze_diagnostic(marie, {}, scores))
+
+        info = server.build_analysis_skeleton.cache_info()
+        assert (info.hits, info.misses) == (1, 1)
+        assert first["investmentLesson"]["message"].startswith("Jean,")
+        assert second["investmentLesson"]["message"].startswith("Marie,")
+        assert "Nice" in second["goodtimeRecommendation"]
+        assert "Lyon" not in second["goodtimeRecommendation"]
+
+    def test_cache_stats_endpoint(self, server, client, diagnostic_payload):
+        server.build_analysis_skeleton.cache_clear()
+
+        async def scenario():
+            for i in range(3):
+                # Distinct leads with the same scores (not deduplicated submissions)
+                lead = {**diagnostic_payload, "userInfo": {**diagnostic_payload["userInfo"], "email": f"lead{i}@conciergerie.fr"}}
+                await client.post("/api/diagnostic/analyze", json=lead)
+            return (await client.get("/api/diagnostic/cache")).json()["analysis"]
+
+        stats = asyncio.run(scenario())
+        assert stats["misses"] == 1
+        assert stats["hits"] == 2
+        assert stats["size"] == 1
+        assert stats["maxSize"] == server.ANALYSIS_CACHE_SIZE
@@ -0,0 +1,99 @@
+"""
+Tests for the NDJSON batch endpoint /api/diagnostic/analyze/batch
+"""
+import asyncio
+import json
+
+from conftest import FakeOpenAI
+
+
+def _batch_items(diagnostic_payload, count):
+    items = []
+    for index in range(count):
+        item = json.loads(json.dumps(diagnostic_payload))
+        item["userInfo"]["email"] = f"lead{index}@partner.fr"
+        item["answers"]["1"] = index % 3
+        items.append(item)
+    return items
+
+
+async def _post_batch(client, items):
+    response = await client.post("/api/diagnostic/analyze/batch", json=items)
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    return response, lines
+
+
+class TestAnalyzeBatch:
+    """Bulk analysis with bounded parallelism and a single insert_many"""
+
+    def test_streams_item_results_and_summary(self, server, client, diagnostic_payload, monkeypatch):
+        monkeypatch.setattr(server.llm_cache, "ttl_seconds", 0)
+        items = _batch_items(diagnostic_payload, 3)
+        items.append({"userInfo": {"firstName": "Incomplet"}})
+
+        inserts = []
+        collection_class = type(server.db.diagnostics)
+        insert_many = collection_class.insert_many
+
+        async def counting_insert_many(collection, docs, **kwargs):
+            if collection.name == "diagnostics":
+                inserts.append(len(docs))
+            return await insert_many(collection, docs, **kwargs)
+
+        monkeypatch.setattr(collection_class, "insert_many", counting_insert_many)
+
+        async def scenario():
+            response, lines = await _post_batch(client, items)
+            saved = await server.db.diagnostics.count_documents({})
+            queued = await server.db.webhook_outbox.count_documents({})
+            return response, lines, saved, queued
+
+        response, lines, saved, queued = asyncio.run(scenario())
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        item_lines = {line["index"]: line for line in lines if "index" in line}
+        assert [item_lines[i]["status"] for i in range(4)] == ["ok", "ok", "ok", "error"]
+        assert item_lines[0]["result"]["email"] == "lead0@partner.fr"
+        assert lines[-1] == {"status": "summary", "total": 4, "succeeded": 3, "failed": 1, "saved": 3}
+        assert inserts == [3]
+        assert saved == 3
+        assert queued == 3
+
+    def test_parallelism_is_bounded(self, server, client, diagnostic_payload, monkeypatch):
+        fake = FakeOpenAI(latency=0.05)
+        monkeypatch.setattr(server, "openai_client", fake)
+        monkeypatch.setattr(server.llm_cache, "ttl_seconds", 0)
+        monkeypatch.setattr(server, "BATCH_CONCURRENCY", 2)
+
+        response, lines = asyncio.run(_post_batch(client, _batch_items(diagnostic_payload, 6)))
+        assert lines[-1]["succeeded"] == 6
+        assert fake.chat.completions.calls == 6
+        assert fake.chat.completions.max_in_flight == 2
+
+    def test_rejects_oversized_batch(self, server, client, diagnostic_payload, monkeypatch):
+        monkeypatch.setattr(server, "BATCH_MAX_ITEMS", 2)
+        response, _ = asyncio.run(_post_batch(client, _batch_items(diagnostic_payload, 3)))
+        assert response.status_code == 413
+
+    def test_item_breaking_scoring_fails_alone(self, server, client, diagnostic_payload, monkeypatch):
+        compute_scores = server.compute_scores
+
+        def failing_compute_scores(answer_sets):
+            if any("bad" in answers for answers in answer_sets):
+                raise OverflowError("Python int too large to convert to C long")
+            return compute_scores(answer_sets)
+
+        monkeypatch.setattr(server, "compute_scores", failing_compute_scores)
+        items = _batch_items(diagnostic_payload, 2)
+        items[1]["answers"]["bad"] = 1
+
+        async def scenario():
+            _, lines = await _post_batch(client, items)
+            return lines, await server.db.diagnostics.count_documents({})
+
+        lines, saved = asyncio.run(scenario())
+        item_lines = {line["index"]: line for line in lines if "index" in line}
+        assert [item_lines[i]["status"] for i in range(2)] == ["ok", "error"]
+        assert lines[-1] == {"status": "summary", "total": 2, "succeeded": 1, "failed": 1, "saved": 1}
+        assert saved == 1
@@ -0,0 +1,26 @@
+"""
+Load-test regression check: the scenarios of benchmarks/thresholds.json must
+stay within their checked-in limits
+
+Throughput and latency depend on the machine, so these only run on request:
+    python -m pytest tests/test_benchmarks.py --benchmarks
+"""
+import asyncio
+
+import pytest
+
+from benchmarks.load_analyze import check, load_thresholds, run_scenario
+
+THRESHOLDS = load_thresholds()
+
+
+@pytest.mark.benchmark
+class TestLoadThresholds:
+    @pytest.mark.parametrize("name", sorted(THRESHOLDS))
+    def test_scenario_within_thresholds(self, name):
+        scenario = THRESHOLDS[name]
+
+        report = asyncio.run(run_scenario(**scenario["scenario"]))
+
+        assert check(report, scenario) == [], report
+        assert report["webhooks_delivered"] == report["requests"]
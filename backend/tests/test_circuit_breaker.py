@@ -0,0 +1,160 @@
+"""
+Tests for the OpenAI circuit breaker (circuit_breaker.py)
+"""
+import asyncio
+import time
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from conftest import GPT_ANALYSIS, FakeOpenAI
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def _call(breaker, clock=None, fail=False, duration=0.0):
+    async with breaker.guard():
+        if clock is not None:
+            clock.now += duration
+        if fail:
+            raise RuntimeError("upstream error")
+
+
+def _failing_calls(breaker, count):
+    for _ in range(count):
+        with pytest.raises(RuntimeError):
+            asyncio.run(_call(breaker, fail=True))
+
+
+class TestCircuitBreaker:
+    """State machine: closed -> open -> half-open -> closed/open"""
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("test", failure_threshold=3)
+
+        _failing_calls(breaker, 2)
+        asyncio.run(_call(breaker))
+        _failing_calls(breaker, 2)
+        assert breaker.state == CLOSED
+
+        _failing_calls(breaker, 1)
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(_call(breaker))
+
+    def test_slow_calls_count_as_failures(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("test", failure_threshold=2, slow_call_seconds=5, clock=clock)
+
+        asyncio.run(_call(breaker, clock, duration=6))
+        asyncio.run(_call(breaker, clock, duration=6))
+
+        assert breaker.state == OPEN
+
+    def test_half_open_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30, clock=clock)
+        _failing_calls(breaker, 1)
+
+        clock.now += 29
+        assert breaker.state == OPEN
+        assert breaker.snapshot()["retryInSeconds"] == 1
+        clock.now += 1
+        assert breaker.state == HALF_OPEN
+
+        async def probe_and_concurrent_call():
+            async with breaker.guard():
+                # Only one probe at a time
+                with pytest.raises(CircuitOpenError):
+                    async with breaker.guard():
+                        pass
+
+        asyncio.run(probe_and_concurrent_call())
+        assert breaker.state == CLOSED
+
+    def test_failed_probe_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30, clock=clock)
+        _failing_calls(breaker, 1)
+        clock.now += 30
+
+        _failing_calls(breaker, 1)
+
+        assert breaker.state == OPEN
+        assert breaker.snapshot()["retryInSeconds"] == 30
+
+
+class TestAnalyzeWithOpenCircuit:
+    """An open circuit serves the deterministic summary without calling OpenAI"""
+
+    def test_fallback_is_immediate(self, server, client, diagnostic_payload, monkeypatch):
+        monkeypatch.setattr(server.llm_cache, "ttl_seconds", 0)
+        monkeypatch.setattr(server, "openai_client", FakeOpenAI(latency=0.5))
+        monkeypatch.setattr(server, "openai_breaker", CircuitBreaker("openai", failure_threshold=1))
+        _failing_calls(server.openai_breaker, 1)
+
+        async def scenario():
+            start = time.perf_counter()
+            response = await client.post("/api/diagnostic/analyze", json=diagnostic_payload)
+            elapsed = time.perf_counter() - start
+            state = (await client.get("/api/circuit-breakers")).json()
+            return response, elapsed, state
+
+        response, elapsed, state = asyncio.run(scenario())
+
+        assert response.status_code == 200
+        assert response.json()["diagSummary"] != GPT_ANALYSIS["diagSummary"]
+        assert elapsed < 0.5
+        assert server.openai_client.chat.completions.calls == 0
+        assert state["openai"]["state"] == OPEN
+
+    def test_timeouts_open_the_circuit(self, server, client, diagnostic_payload, monkeypatch):
+        monkeypatch.setattr(server.llm_cache, "ttl_seconds", 0)
+        monkeypatch.setattr(server, "OPENAI_TIMEOUT", 0.05)
+        monkeypatch.setattr(server, "openai_client", FakeOpenAI(latency=1.0))
+        monkeypatch.setattr(server, "openai_breaker", CircuitBreaker("openai", failure_threshold=2))
+
+        async def scenario():
+            for i in range(3):
+                lead = {**diagnostic_payload, "userInfo": {**diagnostic_payload["userInfo"], "email": f"lead{i}@conciergerie.fr"}}
+                await client.post("/api/diagnostic/analyze", json=lead)
+
+        asyncio.run(scenario())
+
+        assert server.openai_breaker.state == OPEN
+        assert server.openai_client.chat.completions.calls == 2
+
+    def test_waiting_for_a_slot_is_not_a_slow_call(self, server, client, diagnostic_payload, monkeypatch):
+        """Only the upstream call is timed: leads queued behind the semaphore do not open the circuit"""
+        monkeypatch.setattr(server.llm_cache, "ttl_seconds", 0)
+        monkeypatch.setattr(server, "ANALYZE_LATENCY_BUDGET", 0)
+        monkeypatch.setattr(server, "llm_semaphore", asyncio.Semaphore(2))
+        monkeypatch.setattr(server, "openai_client", FakeOpenAI(latency=0.1))
+        monkeypatch.setattr(server, "openai_breaker", CircuitBreaker("openai", failure_threshold=2, slow_call_seconds=0.2))
+        leads = [
+            {**diagnostic_payload, "userInfo": {**diagnostic_payload["userInfo"], "email": f"lead{i}@conciergerie.fr"}}
+            for i in range(16)
+        ]
+
+        async def scenario():
+            await asyncio.gather(*[client.post("/api/diagnostic/analyze", json=lead) for lead in leads[:8]])
+            await asyncio.gather(*[client.post("/api/diagnostic/analyze/stream", json=lead) for lead in leads[8:]])
+
+        asyncio.run(scenario())
+
+        assert server.openai_breaker.state == CLOSED
+        assert server.openai_client.chat.completions.calls == 16
+
+    def test_open_circuit_does_not_queue_for_a_slot(self, server, monkeypatch):
+        monkeypatch.setattr(server, "llm_semaphore", asyncio.Semaphore(0))
+        monkeypatch.setattr(server, "openai_breaker", CircuitBreaker("openai", failure_threshold=1))
+        _failing_calls(server.openai_breaker, 1)
+
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(server.request_gpt_analysis("prompt"))
@@ -0,0 +1,96 @@
+"""
+Tests for negotiated response compression (compression.py)
+"""
+import asyncio
+import gzip
+
+import brotli
+import pytest
+
+from compression import choose_encoding
+
+
+async def _post_raw(client, url, payload, accept_encoding):
+    """The response and its body as sent, before any decoding"""
+    async with client.stream("POST", url, json=payload, headers={"Accept-Encoding": accept_encoding}) as response:
+        raw = b"".join([chunk async for chunk in response.aiter_raw()])
+    return response, raw
+
+
+class TestChooseEncoding:
+    @pytest.mark.parametrize("header, expected", [
+        ("gzip, deflate, br", "br"),
+        ("gzip", "gzip"),
+        ("br;q=0, gzip;q=0.5", "gzip"),
+        ("*", "br"),
+        ("identity", None),
+        ("", None),
+    ])
+    def test_negotiation(self, header, expected):
+        assert choose_encoding(header) == expected
+
+
+class TestCompressedResponses:
+    """Analysis payloads are compressed, small bodies and streams are not"""
+
+    @pytest.mark.parametrize("encoding, decompress", [("br", brotli.decompress), ("gzip", gzip.decompress)])
+    def test_analysis_compressed(self, client, diagnostic_payload, encoding, decompress):
+        response, raw = asyncio.run(_post_raw(client, "/api/diagnostic/analyze", diagnostic_payload, encoding))
+
+        assert response.headers["content-encoding"] == encoding
+        assert int(response.headers["content-length"]) == len(raw)
+        assert "Accept-Encoding" in response.headers.get_list("vary")
+        body = decompress(raw)
+        assert len(raw) < len(body) / 2
+        assert b'"diagSummary"' in body
+
+    def test_identity(self, client, diagnostic_payload):
+        response, raw = asyncio.run(_post_raw(client, "/api/diagnostic/analyze", diagnostic_payload, "identity"))
+
+        assert "content-encoding" not in response.headers
+        assert raw.startswith(b'{"firstName"')
+
+    def test_small_body_not_compressed(self, client):
+        response, raw = asyncio.run(_post_raw(client, "/api/status", {"client_name": "test"}, "br, gzip"))
+
+        assert "content-encoding" not in response.headers
+        assert b"test" in raw
+
+    def test_stream_not_compressed(self, client, diagnostic_payload):
+        response, raw = asyncio.run(_post_raw(client, "/api/diagnostic/analyze/stream", diagnostic_payload, "br, gzip"))
+
+        assert "content-encoding" not in response.headers
+        assert raw.startswith(b"event: analysis")
+
+    def test_vary_and_encoding_specific_etags(self, client):
+        """The bundle's ETag differs per encoding and revalidates in each of them"""
+        from analysis_content import CONTENT_VERSION
+
+        async def scenario():
+            responses = {
+                encoding: await client.get("/api/content/bundle", headers={"Accept-Encoding": encoding})
+                for encoding in ("identity", "gzip", "br")
+            }
+            revalidated = await client.get("/api/content/bundle", headers={
+                "Accept-Encoding": "br", "If-None-Match": responses["br"].headers["etag"]
+            })
+            return responses, revalidated
+
+        responses, revalidated = asyncio.run(scenario())
+
+        assert {encoding: response.headers["etag"] for encoding, response in responses.items()} == {
+            "identity": f'"{CONTENT_VERSION}"',
+            "gzip": f'"{CONTENT_VERSION}-gzip"',
+            "br": f'"{CONTENT_VERSION}-br"'
+        }
+        for response in responses.values():
+            assert "Accept-Encoding" in response.headers["vary"]
+        assert revalidated.status_code == 304
+        assert revalidated.headers["etag"] == f'"{CONTENT_VERSION}-br"'
+        assert "Accept-Encoding" in revalidated.headers["vary"]
+
+    def test_vary_is_merged(self):
+        from compression import _with_vary
+
+        assert _with_vary([(b"vary", b"Origin")]) == [(b"vary", b"Origin, Accept-Encoding")]
+        assert _with_vary([(b"vary", b"accept-encoding")]) == [(b"vary", b"accept-encoding")]
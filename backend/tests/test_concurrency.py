@@ -0,0 +1,83 @@
+"""
+Load test for the async OpenAI path of /api/diagnostic/analyze
+Runs in-process against a fake GPT with fixed latency: if the completion
+blocked the event loop, throughput would stay flat as concurrency grows.
+"""
+import asyncio
+import time
+
+import pytest
+
+from conftest import FakeOpenAI
+
+GPT_LATENCY = 0.2
+
+
+@pytest.fixture(autouse=True)
+def no_llm_cache(server, monkeypatch):
+    """Every request must reach the (fake) model"""
+    monkeypatch.setattr(server.llm_cache, "ttl_seconds", 0)
+
+
+async def _run_burst(client, payload, concurrency):
+    # Distinct leads: duplicates of one submission would be coalesced
+    leads = [
+        {**payload, "userInfo": {**payload["userInfo"], "email": f"lead{concurrency}-{index}@conciergerie.fr"}}
+        for index in range(concurrency)
+    ]
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[client.post("/api/diagnostic/analyze", json=lead) for lead in leads])
+    elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses)
+    assert not any("idempotent-replayed" in r.headers for r in responses)
+    return concurrency / elapsed
+
+
+class TestAnalyzeConcurrency:
+    """Throughput of the analyze endpoint under concurrent submissions"""
+
+    def test_throughput_scales_with_concurrency(self, server, client, diagnostic_payload, monkeypatch):
+        """Concurrent requests overlap their GPT waits instead of queueing"""
+        monkeypatch.setattr(server, "openai_client", FakeOpenAI(latency=GPT_LATENCY))
+
+        throughput = {
+            concurrency: asyncio.run(_run_burst(client, diagnostic_payload, concurrency))
+            for concurrency in (1, 4, 16)
+        }
+        for concurrency, rps in throughput.items():
+            print(f"✓ concurrency={concurrency}: {rps:.1f} req/s")
+
+        # One completion per request: none was coalesced or replayed
+        assert server.openai_client.chat.completions.calls == 1 + 4 + 16
+        assert throughput[4] > 2.5 * throughput[1]
+        assert throughput[16] > 8 * throughput[1]
+
+    def test_status_served_while_gpt_pending(self, server, client, diagnostic_payload, monkeypatch):
+        """/api/status answers immediately while a diagnostic waits on the model"""
+        monkeypatch.setattr(server, "openai_client", FakeOpenAI(latency=1.0))
+
+        async def scenario():
+            analyze = asyncio.create_task(client.post("/api/diagnostic/analyze", json=diagnostic_payload))
+            await asyncio.sleep(0.05)
+            start = time.perf_counter()
+            status = await client.get("/api/status")
+            status_elapsed = time.perf_counter() - start
+            assert not analyze.done()
+            await analyze
+            return status, status_elapsed
+
+        status, status_elapsed = asyncio.run(scenario())
+        assert status.status_code == 200
+        assert status_elapsed < 0.5
+        print(f"✓ /api/status served in {status_elapsed * 1000:.0f} ms during GPT call")
+
+    def test_gpt_timeout_falls_back_to_deterministic(self, server, post, diagnostic_payload, monkeypatch):
+        """A completion slower than OPENAI_TIMEOUT is cut off and the fallback is served"""
+        monkeypatch.setattr(server, "openai_client", FakeOpenAI(latency=5.0))
+        monkeypatch.setattr(server, "OPENAI_TIMEOUT", 0.1)
+
+        start = time.perf_counter()
+        response = post("/api/diagnostic/analyze", json=diagnostic_payload)
+        assert time.perf_counter() - start < 2.0
+        assert response.status_code == 200
+        assert response.json()["diagSummary"].startswith("Jean, avec 22/44")
@@ -0,0 +1,101 @@
+"""
+Tests for the versioned content bundle and `?content=refs` analyses
+"""
+import asyncio
+
+from analysis_content import CONTENT_BUNDLE, CONTENT_VERSION, _content_version
+
+
+def render_from_bundle(node, variables):
+    """What a client does with a bundle template"""
+    if isinstance(node, str):
+        return node.format(**variables)
+    if isinstance(node, list):
+        return [render_from_bundle(item, variables) for item in node]
+    if set(node) == {"$var"}:
+        return variables[node["$var"]]
+    return {key: render_from_bundle(value, variables) for key, value in node.items()}
+
+
+def send(client, *requests):
+    """Responses to `(method, url, kwargs)` requests, sent in order"""
+    async def scenario():
+        return [await client.request(method, url, **kwargs) for method, url, kwargs in requests]
+    return asyncio.run(scenario())
+
+
+class TestContentBundle:
+    """The bundle is served with a strong ETag, revalidated or cached for good"""
+
+    def test_version_is_a_digest_of_the_templates(self):
+        assert CONTENT_BUNDLE["version"] == CONTENT_VERSION
+        changed = {**CONTENT_BUNDLE["templates"], "summary.early": "autre texte"}
+        assert _content_version(changed) != CONTENT_VERSION
+
+    def test_unversioned_url_revalidates(self, server, client):
+        response, = send(client, ("GET", "/api/content/bundle", {"headers": {"Accept-Encoding": "identity"}}))
+        assert response.status_code == 200
+        assert response.headers["etag"] == f'"{CONTENT_VERSION}"'
+        assert response.headers["cache-control"] == f"public, max-age={server.CONTENT_BUNDLE_MAX_AGE}"
+        assert response.json() == CONTENT_BUNDLE
+
+        for if_none_match in (f'"{CONTENT_VERSION}"', f'W/"{CONTENT_VERSION}"', f'"other", "{CONTENT_VERSION}"', "*"):
+            revalidated, = send(client, ("GET", "/api/content/bundle", {"headers": {"If-None-Match": if_none_match}}))
+            assert revalidated.status_code == 304
+            assert revalidated.content == b""
+            assert revalidated.headers["etag"] == f'"{CONTENT_VERSION}"'
+
+        stale, = send(client, ("GET", "/api/content/bundle", {"headers": {"If-None-Match": '"other"'}}))
+        assert stale.status_code == 200
+
+    def test_versioned_url_is_immutable(self, client):
+        current, unknown = send(
+            client,
+            ("GET", f"/api/content/bundle/{CONTENT_VERSION}", {}),
+            ("GET", "/api/content/bundle/0000000000000000", {})
+        )
+        assert current.status_code == 200
+        assert current.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert unknown.status_code == 404
+
+
+class TestContentRefs:
+    """?content=refs returns references that render to the inline analysis"""
+
+    def test_refs_render_to_the_inline_sections(self, server, client, diagnostic_payload):
+        inline, refs, bundle = send(
+            client,
+            ("POST", "/api/diagnostic/analyze", {"json": diagnostic_payload}),
+            ("POST", "/api/diagnostic/analyze?content=refs", {"json": diagnostic_payload}),
+            ("GET", "/api/content/bundle", {})
+        )
+        inline, refs, templates = inline.json(), refs.json(), bundle.json()["templates"]
+        content = refs.pop("content")
+
+        assert content["version"] == CONTENT_VERSION
+        assert content["bundle"] == f"/api/content/bundle/{CONTENT_VERSION}"
+        assert refs == {key: value for key, value in inline.items() if key not in server.BUNDLED_SECTIONS}
+        assert set(content["sections"]) == set(server.BUNDLED_SECTIONS)
+
+        variables = content["variables"]
+        for section, ref in content["sections"].items():
+            if section == "goodtimeRecommendation":
+                rendered = "\n\n".join(render_from_bundle(templates[key], variables) for key in ref)
+            else:
+                rendered = render_from_bundle(templates[ref], variables)
+            assert rendered == inline[section], section
+
+    def test_refs_are_smaller_and_stored_in_full(self, client, diagnostic_payload, admin_headers):
+        inline, refs, saved = send(
+            client,
+            ("POST", "/api/diagnostic/analyze", {"json": diagnostic_payload}),
+            ("POST", "/api/diagnostic/analyze?content=refs", {"json": diagnostic_payload}),
+            ("GET", "/api/diagnostics?fields=roadmap", {"headers": admin_headers})
+        )
+        assert len(refs.content) < len(inline.content) / 4
+        # The second submission is a duplicate of the first: one diagnostic saved
+        assert saved.json() == [{"roadmap": inline.json()["roadmap"]}]
+
+    def test_unknown_format_is_rejected(self, client, diagnostic_payload):
+        response, = send(client, ("POST", "/api/diagnostic/analyze?content=html", {"json": diagnostic_payload}))
+        assert response.status_code == 422
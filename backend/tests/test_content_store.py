@@ -0,0 +1,107 @@
+"""
+Tests for the content-addressed storage of analysis sections
+"""
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from content_store import STORED_SECTIONS, ContentStore
+
+
+def lead(first_name, city, **sections):
+    return {"id": f"{first_name}-{city}", "firstName": first_name, "lastName": "Martin", "city": city, **sections}
+
+
+SECTIONS = {
+    "investmentLesson": "Jean, à Lyon comme ailleurs, ta conciergerie est un actif.",
+    "roadmap": {"phase1": {"title": "Structurer", "actions": ["Process de ménage", "Check-in autonome"]}},
+    "structureAnalysis": {"score": "8/20", "percentage": 40, "quickWins": ["Documenter"]}
+}
+
+
+class TestContentStore:
+    """Sections are stored once per content, personal fields put back on read"""
+
+    def test_leads_share_blocks(self):
+        collection = AsyncMongoMockClient()["test_database"].content_blocks
+        store = ContentStore(collection, version="v1")
+        marie = {
+            **SECTIONS,
+            "investmentLesson": SECTIONS["investmentLesson"].replace("Jean", "Marie").replace("Lyon", "Nice")
+        }
+        docs = [lead("Jean", "Lyon", **SECTIONS), lead("Marie", "Nice", **marie)]
+
+        async def scenario():
+            stored = await store.dehydrate_many(docs)
+            count = await collection.count_documents({})
+            # A fresh process reads the blocks from Mongo
+            fresh = ContentStore(collection, version="v1")
+            rehydrated = await fresh.rehydrate_many([dict(doc) for doc in stored])
+            return stored, count, fresh, rehydrated
+
+        stored, count, fresh, rehydrated = asyncio.run(scenario())
+
+        assert count == 3
+        assert stored[0]["contentRefs"] == stored[1]["contentRefs"]
+        assert all(key.startswith("v1:") for key in stored[0]["contentRefs"].values())
+        assert not set(SECTIONS) & set(stored[0])
+        assert rehydrated == docs
+        # Blocks shared by several documents are read once
+        assert fresh.stats() == {"hits": 0, "misses": 3, "size": 3, "maxSize": 1024}
+
+    def test_known_blocks_are_not_rewritten(self):
+        collection = AsyncMongoMockClient()["test_database"].content_blocks
+        store = ContentStore(collection, version="v1", cache_size=2)
+
+        async def scenario():
+            await store.dehydrate(lead("Jean", "Lyon", **SECTIONS))
+            await collection.delete_many({})
+            again = await store.dehydrate(lead("Jean", "Lyon", **SECTIONS))
+            return again, await collection.count_documents({})
+
+        again, count = asyncio.run(scenario())
+
+        # The LRU kept 2 of the 3 blocks: only the evicted one is written again
+        assert count == 1
+        assert set(again["contentRefs"]) == set(SECTIONS)
+
+    def test_placeholder_lookalikes_stay_inline(self):
+        store = ContentStore(AsyncMongoMockClient()["test_database"].content_blocks, version="v1")
+        doc = lead("Jean", "Lyon", investmentLesson="Jean, tape {city} dans le formulaire", roadmap=SECTIONS["roadmap"])
+
+        stored = asyncio.run(store.dehydrate(doc))
+
+        assert stored["investmentLesson"] == doc["investmentLesson"]
+        assert set(stored["contentRefs"]) == {"roadmap"}
+
+    def test_write_failure_keeps_sections_inline(self):
+        class FailingCollection:
+            async def bulk_write(self, *args, **kwargs):
+                raise RuntimeError("mongo down")
+
+        doc = lead("Jean", "Lyon", **SECTIONS)
+        assert asyncio.run(ContentStore(FailingCollection(), version="v1").dehydrate(doc)) is doc
+
+
+class TestStoredDiagnostics:
+    """db.diagnostics keeps references; the read endpoints return full documents"""
+
+    def test_saved_document_holds_references(self, server, client, diagnostic_payload, admin_headers):
+        async def scenario():
+            analysis = await client.post("/api/diagnostic/analyze", json=diagnostic_payload)
+            raw = await server.db.diagnostics.find_one({}, {"_id": 0})
+            detail = await client.get(f"/api/diagnostics/{raw['id']}", headers=admin_headers)
+            listing = await client.get("/api/diagnostics?fields=id,roadmap,investmentLesson", headers=admin_headers)
+            return analysis.json(), raw, detail.json(), listing.json()
+
+        analysis, raw, detail, listing = asyncio.run(scenario())
+
+        assert set(raw["contentRefs"]) == set(STORED_SECTIONS)
+        assert not set(STORED_SECTIONS) & set(raw)
+        assert {key: detail[key] for key in analysis} == analysis
+        assert "contentRefs" not in detail
+        assert listing == [{
+            "id": raw["id"],
+            "roadmap": analysis["roadmap"],
+            "investmentLesson": analysis["investmentLesson"]
+        }]
@@ -0,0 +1,73 @@
+"""
+Tests for GPT output parsing (gpt_parsing.py)
+"""
+import json
+
+import pytest
+from prometheus_client import REGISTRY
+
+from conftest import GPT_ANALYSIS, FakeOpenAI
+from gpt_parsing import RESPONSE_FORMAT, GPTParseError, parse_analysis
+
+
+def _parse_results(outcome):
+    return REGISTRY.get_sample_value("gpt_parse_results_total", {"outcome": outcome}) or 0.0
+
+
+class TestParseAnalysis:
+    """Schema-conformant output on the fast path, malformed output repaired"""
+
+    def test_valid(self):
+        before = _parse_results("valid")
+
+        analysis = parse_analysis(json.dumps(GPT_ANALYSIS))
+
+        assert analysis.model_dump() == GPT_ANALYSIS
+        assert _parse_results("valid") == before + 1
+
+    @pytest.mark.parametrize("text", [
+        "```json\n" + json.dumps(GPT_ANALYSIS) + "\n```",
+        "Voici l'analyse :\n" + json.dumps(GPT_ANALYSIS) + "\nBonne journée.",
+        json.dumps(GPT_ANALYSIS).replace("de test.", "de\ntest."),
+    ])
+    def test_repaired(self, text):
+        before = _parse_results("repaired")
+
+        analysis = parse_analysis(text)
+
+        assert analysis.diagSummary.replace("\n", " ") == GPT_ANALYSIS["diagSummary"]
+        assert _parse_results("repaired") == before + 1
+
+    def test_truncated_output_keeps_complete_summary(self):
+        text = json.dumps(GPT_ANALYSIS)[:-40]
+
+        analysis = parse_analysis(text)
+
+        assert analysis.diagSummary == GPT_ANALYSIS["diagSummary"]
+        assert analysis.goodtimeRecommendation is None
+
+    @pytest.mark.parametrize("text", [
+        "pas du JSON",
+        '{"diagSummary": ""}',
+        '{"diagSummary": "coup',
+        '{"diagSummary": "abc \\uZZZZ',
+        '{"diagSummary": "abc \\ud83d suite"',
+    ])
+    def test_invalid(self, text):
+        before = _parse_results("invalid")
+
+        with pytest.raises(GPTParseError):
+            parse_analysis(text)
+
+        assert _parse_results("invalid") == before + 1
+
+
+class TestStructuredOutput:
+    def test_completion_requests_json_schema(self, server, post, diagnostic_payload, monkeypatch):
+        fake = FakeOpenAI()
+        monkeypatch.setattr(server, "openai_client", fake)
+
+        response = post("/api/diagnostic/analyze", json=diagnostic_payload)
+
+        assert response.json()["diagSummary"] == GPT_ANALYSIS["diagSummary"]
+        assert fake.chat.completions.last_kwargs["response_format"] == RESPONSE_FORMAT
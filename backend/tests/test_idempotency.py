@@ -0,0 +1,140 @@
+"""
+Tests for idempotent /api/diagnostic/analyze submissions
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from conftest import FakeOpenAI
+from idempotency import IdempotencyConflict, SingleFlight, request_fingerprint, submission_key
+
+
+async def post_all(client, *requests, concurrent=False):
+    calls = [client.post("/api/diagnostic/analyze", json=payload, headers=headers) for payload, headers in requests]
+    if concurrent:
+        return await asyncio.gather(*calls)
+    return [await call for call in calls]
+
+
+class TestSubmissionKeys:
+    """Keys come from the header, else from the lead's email and answers"""
+
+    def test_fingerprint_ignores_email_case_and_answer_order(self):
+        assert request_fingerprint(" Jean@Mail.fr", {"1": 2, "2": 0}) == request_fingerprint("jean@mail.fr", {"2": 0, "1": 2})
+        assert request_fingerprint("jean@mail.fr", {"1": 2}) != request_fingerprint("jean@mail.fr", {"1": 1})
+
+    def test_header_key_wins(self):
+        assert submission_key("abc", "f" * 64) == "key:abc"
+        assert submission_key(None, "f" * 64) == "auto:" + "f" * 64
+        with pytest.raises(ValueError):
+            submission_key("x" * 256, "f" * 64)
+
+
+class TestSingleFlight:
+    """Concurrent calls with one key run once"""
+
+    def test_joined_call_shares_result_and_errors(self):
+        flight = SingleFlight()
+        runs = []
+
+        async def call(result):
+            runs.append(result)
+            await asyncio.sleep(0.05)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        async def scenario():
+            first = await asyncio.gather(flight.run("k", "f", lambda: call(1)), flight.run("k", "f", lambda: call(2)))
+            failed = await asyncio.gather(
+                flight.run("k", "f", lambda: call(RuntimeError("boom"))),
+                flight.run("k", "f", lambda: call(3)),
+                return_exceptions=True
+            )
+            with pytest.raises(IdempotencyConflict):
+                await asyncio.gather(flight.run("c", "f", lambda: call(4)), flight.run("c", "other", lambda: call(5)))
+            await asyncio.sleep(0.1)
+            return first, failed
+
+        first, failed = asyncio.run(scenario())
+
+        assert first == [(1, False), (1, True)]
+        assert [str(error) for error in failed] == ["boom", "boom"]
+        assert runs == [1, failed[0], 4]
+        assert len(flight) == 0
+
+
+class TestIdempotentAnalyze:
+    """Duplicates are answered from the first submission"""
+
+    def test_concurrent_duplicates_share_one_analysis(self, server, client, diagnostic_payload, monkeypatch):
+        monkeypatch.setattr(server, "openai_client", FakeOpenAI(latency=0.2))
+
+        async def scenario():
+            responses = await post_all(client, (diagnostic_payload, {}), (diagnostic_payload, {}), concurrent=True)
+            return responses, await server.db.diagnostics.count_documents({})
+
+        responses, saved = asyncio.run(scenario())
+
+        assert [response.status_code for response in responses] == [200, 200]
+        assert responses[0].content == responses[1].content
+        assert [response.headers.get("idempotent-replayed") for response in responses] == [None, "true"]
+        assert server.openai_client.chat.completions.calls == 1
+        assert saved == 1
+
+    def test_completed_submission_served_from_stored_document(self, server, client, diagnostic_payload):
+        async def scenario():
+            first, retry = await post_all(client, (diagnostic_payload, {}), (diagnostic_payload, {}))
+            webhooks = await server.webhook_outbox.collection.count_documents({})
+            return first, retry, await server.db.diagnostics.count_documents({}), webhooks
+
+        first, retry, saved, webhooks = asyncio.run(scenario())
+
+        assert retry.headers["idempotent-replayed"] == "true"
+        assert retry.json() == first.json()
+        assert server.openai_client.chat.completions.calls == 1
+        assert (saved, webhooks) == (1, 1)
+
+    def test_non_numeric_answer_keys(self, post, diagnostic_payload):
+        """Keys outside 1-22 are accepted and ignored, as before idempotency"""
+        unknown = {**diagnostic_payload, "answers": {**diagnostic_payload["answers"], "q23": 1}}
+
+        first, retry = post("/api/diagnostic/analyze", json=unknown), post("/api/diagnostic/analyze", json=unknown)
+
+        assert first.status_code == 200
+        assert retry.headers["idempotent-replayed"] == "true"
+
+    def test_idempotency_key_header(self, client, diagnostic_payload):
+        changed = {**diagnostic_payload, "answers": {**diagnostic_payload["answers"], "1": 0}}
+
+        async def scenario():
+            return await post_all(
+                client,
+                (diagnostic_payload, {"Idempotency-Key": "submit-1"}),
+                (diagnostic_payload, {"Idempotency-Key": "submit-2"}),
+                (changed, {"Idempotency-Key": "submit-1"}),
+                (diagnostic_payload, {"Idempotency-Key": "x" * 300})
+            )
+
+        first, other_key, conflict, too_long = asyncio.run(scenario())
+
+        assert "idempotent-replayed" not in other_key.headers
+        assert conflict.status_code == 422
+        assert too_long.status_code == 400
+
+    def test_window_expiry_and_disabled(self, server, client, diagnostic_payload, monkeypatch):
+        async def scenario():
+            await post_all(client, (diagnostic_payload, {}))
+            old = datetime.now(timezone.utc) - timedelta(seconds=server.IDEMPOTENCY_WINDOW + 1)
+            await server.db.diagnostics.update_many({}, {"$set": {"timestamp": old}})
+            after_window, = await post_all(client, (diagnostic_payload, {}))
+            monkeypatch.setattr(server, "IDEMPOTENCY_WINDOW", 0)
+            disabled, = await post_all(client, (diagnostic_payload, {}))
+            return after_window, disabled, await server.db.diagnostics.count_documents({})
+
+        after_window, disabled, saved = asyncio.run(scenario())
+
+        assert "idempotent-replayed" not in after_window.headers
+        assert "idempotent-replayed" not in disabled.headers
+        assert saved == 3
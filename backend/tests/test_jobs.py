@@ -0,0 +1,132 @@
+"""
+Tests for the asynchronous job mode (/api/diagnostic/jobs, job_queue.py)
+"""
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+from starlette.testclient import TestClient
+
+from conftest import GPT_ANALYSIS
+from job_queue import DONE, RUNNING, JobQueue
+
+
+async def _run_next_job(server):
+    await server.job_queue.process(await server.job_queue._claim())
+
+
+class TestDiagnosticJobs:
+    """Submit returns a job ID at once; the analysis runs on a worker"""
+
+    def test_submit_then_poll(self, server, client, diagnostic_payload):
+        async def scenario():
+            submitted = await client.post("/api/diagnostic/jobs", json=diagnostic_payload)
+            job_id = submitted.json()["jobId"]
+            queued = await client.get(f"/api/diagnostic/jobs/{job_id}")
+            await _run_next_job(server)
+            done = await client.get(f"/api/diagnostic/jobs/{job_id}")
+            saved = await server.db.diagnostics.find_one({})
+            return submitted, queued, done, saved
+
+        submitted, queued, done, saved = asyncio.run(scenario())
+
+        assert submitted.status_code == 202
+        assert submitted.headers["location"] == f"/api/diagnostic/jobs/{submitted.json()['jobId']}"
+        assert queued.json()["status"] == "queued"
+        assert "result" not in queued.json()
+        body = done.json()
+        assert body["status"] == "done"
+        assert body["result"]["diagSummary"] == GPT_ANALYSIS["diagSummary"]
+        assert saved["email"] == diagnostic_payload["userInfo"]["email"]
+
+    def test_wait_wakes_on_completion(self, server, diagnostic_payload):
+        async def scenario():
+            job_id = await server.job_queue.submit(diagnostic_payload)
+            waiter = asyncio.create_task(server.job_queue.wait(job_id, timeout=5))
+            await asyncio.sleep(0)
+            await _run_next_job(server)
+            return await asyncio.wait_for(waiter, timeout=1)
+
+        job = asyncio.run(scenario())
+
+        assert job["status"] == "done"
+
+    def test_failed_job(self, server, client, diagnostic_payload):
+        async def scenario():
+            job_id = await server.job_queue.submit({**diagnostic_payload, "answers": "invalide"})
+            await _run_next_job(server)
+            return await client.get(f"/api/diagnostic/jobs/{job_id}")
+
+        body = asyncio.run(scenario()).json()
+
+        assert body["status"] == "failed"
+        assert body["error"]
+
+    def test_unknown_job(self, client):
+        response = asyncio.run(client.get("/api/diagnostic/jobs/inconnu"))
+
+        assert response.status_code == 404
+
+    def test_websocket_sends_finished_job(self, server, diagnostic_payload):
+        async def scenario():
+            job_id = await server.job_queue.submit(diagnostic_payload)
+            await _run_next_job(server)
+            return job_id
+
+        job_id = asyncio.run(scenario())
+        # Without the context manager TestClient does not run the lifespan
+        client = TestClient(server.app)
+        with client.websocket_connect(f"/api/diagnostic/jobs/{job_id}/ws") as websocket:
+            update = websocket.receive_json()
+
+        assert update["jobId"] == job_id
+        assert update["status"] == "done"
+        assert update["result"]["diagSummary"] == GPT_ANALYSIS["diagSummary"]
+
+
+class TestJobQueueLifecycle:
+    """Only finished jobs expire; shutdown lets running jobs finish"""
+
+    def test_ttl_applies_to_finished_jobs(self):
+        async def handler(payload):
+            return {"ok": True}
+
+        async def scenario():
+            collection = AsyncMongoMockClient()["test_database"].diagnostic_jobs
+            # Index left by the previous version: TTL on created_at
+            await collection.create_index("created_at", expireAfterSeconds=60)
+            queue = JobQueue(collection, handler, ttl_seconds=60)
+            await queue.ensure_indexes()
+            job_id = await queue.submit({})
+            queued = await collection.find_one({"_id": job_id})
+            await queue.process(await queue._claim())
+            return await collection.index_information(), queued, await collection.find_one({"_id": job_id})
+
+        indexes, queued, done = asyncio.run(scenario())
+        ttls = {index["key"][0][0]: index["expireAfterSeconds"] for index in indexes.values() if "expireAfterSeconds" in index}
+        assert ttls == {"finished_at": 60}
+        assert "finished_at" not in queued
+        assert done["finished_at"] is not None
+
+    def test_stop_waits_for_running_jobs(self):
+        finished = []
+
+        async def handler(payload):
+            await asyncio.sleep(payload["seconds"])
+            finished.append(payload["seconds"])
+            return {}
+
+        async def run(seconds, drain_seconds):
+            collection = AsyncMongoMockClient()["test_database"].diagnostic_jobs
+            queue = JobQueue(collection, handler, workers=2, poll_interval=0.01, drain_seconds=drain_seconds)
+            await queue.start()
+            job_id = await queue.submit({"seconds": seconds})
+            while not queue._busy:
+                await asyncio.sleep(0.01)
+            await queue.stop()
+            return (await collection.find_one({"_id": job_id}))["status"]
+
+        assert asyncio.run(run(0.1, drain_seconds=5)) == DONE
+        assert finished == [0.1]
+        # Past the drain timeout the job is cut off and left for its lease to expire
+        assert asyncio.run(run(5, drain_seconds=0.05)) == RUNNING
+        assert finished == [0.1]
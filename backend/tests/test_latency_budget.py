@@ -0,0 +1,60 @@
+"""
+Tests for the latency budget of /api/diagnostic/analyze
+"""
+import asyncio
+import time
+
+from conftest import GPT_ANALYSIS, FakeOpenAI
+
+
+async def _analyze_and_settle(server, client, payload):
+    """POST an analysis, then wait for its background GPT completion"""
+    start = time.perf_counter()
+    response = await client.post("/api/diagnostic/analyze", json=payload)
+    elapsed = time.perf_counter() - start
+    pending = await server.db.diagnostics.find_one({})
+    await asyncio.gather(*server.analysis_tasks)
+    settled = await server.db.diagnostics.find_one({})
+    webhooks = await server.webhook_outbox.collection.find({}).to_list(None)
+    return response, elapsed, pending, settled, webhooks
+
+
+class TestLatencyBudget:
+    """A slow GPT call no longer holds the response; its summary is stored later"""
+
+    def test_slow_gpt_answers_within_budget_and_patches_document(self, server, client, diagnostic_payload, monkeypatch):
+        monkeypatch.setattr(server, "ANALYZE_LATENCY_BUDGET", 0.05)
+        monkeypatch.setattr(server, "openai_client", FakeOpenAI(latency=0.3))
+
+        response, elapsed, pending, settled, webhooks = asyncio.run(_analyze_and_settle(server, client, diagnostic_payload))
+
+        assert response.status_code == 200
+        assert elapsed < 0.3
+        deterministic_summary = response.json()["diagSummary"]
+        assert deterministic_summary != GPT_ANALYSIS["diagSummary"]
+        assert pending["summaryPending"] is True
+        assert pending["diagSummary"] == deterministic_summary
+        assert "summaryPending" not in settled
+        assert settled["diagSummary"] == GPT_ANALYSIS["diagSummary"]
+        # One webhook, sent once the final text is known
+        assert len(webhooks) == 1
+        assert webhooks[0]["payload"]["diagSummary"] == GPT_ANALYSIS["diagSummary"]
+
+    def test_late_gpt_failure_keeps_deterministic_summary(self, server, client, diagnostic_payload, monkeypatch):
+        monkeypatch.setattr(server, "ANALYZE_LATENCY_BUDGET", 0.05)
+        monkeypatch.setattr(server, "openai_client", FakeOpenAI(latency=0.2, content="pas du JSON"))
+
+        response, _, _, settled, webhooks = asyncio.run(_analyze_and_settle(server, client, diagnostic_payload))
+
+        assert "summaryPending" not in settled
+        assert settled["diagSummary"] == response.json()["diagSummary"]
+        assert webhooks[0]["payload"]["diagSummary"] == response.json()["diagSummary"]
+
+    def test_fast_gpt_within_budget(self, server, client, diagnostic_payload, monkeypatch):
+        monkeypatch.setattr(server, "ANALYZE_LATENCY_BUDGET", 1.0)
+
+        response, _, pending, _, webhooks = asyncio.run(_analyze_and_settle(server, client, diagnostic_payload))
+
+        assert response.json()["diagSummary"] == GPT_ANALYSIS["diagSummary"]
+        assert "summaryPending" not in pending
+        assert len(webhooks) == 1
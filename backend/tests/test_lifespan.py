@@ -0,0 +1,50 @@
+"""
+Tests for the app lifespan and the shared outbound HTTP pool
+"""
+import asyncio
+
+
+class FakeMotorClient:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestLifespan:
+    """Startup wires one pooled client into every outbound caller; shutdown closes it"""
+
+    def test_shared_pool_and_clean_shutdown(self, server, monkeypatch):
+        motor = FakeMotorClient()
+        monkeypatch.setattr(server, "client", motor)
+        # The lifespan swaps in a pooled OpenAI client; restored after the test
+        monkeypatch.setattr(server, "openai_client", server.openai_client)
+
+        async def scenario():
+            async with server.app.router.lifespan_context(server.app):
+                http_client = server.app.state.http_client
+                seen = {
+                    "openai": server.openai_client._client is http_client,
+                    "outbox": server.webhook_outbox._http is http_client,
+                    "running": server.webhook_outbox._running,
+                    "indexes": "id_1" in await server.db.diagnostics.index_information()
+                }
+            return http_client, seen
+
+        http_client, seen = asyncio.run(scenario())
+
+        assert seen == {"openai": True, "outbox": True, "running": True, "indexes": True}
+        assert http_client.is_closed
+        assert not server.webhook_outbox._running
+        assert motor.closed
+
+    def test_pool_limits_from_config(self, server):
+        http_client = server.create_http_client()
+        try:
+            pool = http_client._transport._pool
+            assert pool._max_connections == server.HTTP_MAX_CONNECTIONS
+            assert pool._max_keepalive_connections == server.HTTP_MAX_KEEPALIVE_CONNECTIONS
+            assert pool._http2 == server.HTTP2_AVAILABLE
+        finally:
+            asyncio.run(http_client.aclose())
@@ -0,0 +1,155 @@
+"""
+Tests for the paginated read endpoints (/api/diagnostics, /api/status)
+"""
+import asyncio
+from datetime import datetime, timezone
+
+
+async def _get_all_pages(client, url, params, headers=None):
+    pages = []
+    cursor = None
+    while True:
+        response = await client.get(url, params={**params, **({"cursor": cursor} if cursor else {})}, headers=headers)
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return pages
+
+
+def _seed(server, count):
+    async def insert():
+        await server.db.diagnostics.insert_many([
+            {
+                "id": f"diag-{index}",
+                # Pairs of identical timestamps exercise the _id tie-break
+                "timestamp": datetime(2025, 1, 10 + index // 2, 9, tzinfo=timezone.utc),
+                "email": f"lead{index % 3}@partner.fr",
+                "segment": "transition" if index % 2 else "machine",
+                "firstName": f"Lead {index}",
+                "diagSummary": "Résumé",
+                "roadmap": {"phases": []}
+            }
+            for index in range(count)
+        ])
+    asyncio.run(insert())
+
+
+class TestDiagnosticsListing:
+    """Cursor pagination, filters and projection over saved diagnostics"""
+
+    def test_pages_cover_collection_newest_first(self, server, client, admin_headers):
+        _seed(server, 7)
+
+        pages = asyncio.run(_get_all_pages(client, "/api/diagnostics", {"limit": 3}, admin_headers))
+
+        assert [len(page) for page in pages] == [3, 3, 1]
+        ids = [doc["id"] for page in pages for doc in page]
+        assert ids == [f"diag-{index}" for index in range(6, -1, -1)]
+
+    def test_default_projection_leaves_out_analysis(self, server, client, admin_headers):
+        _seed(server, 1)
+
+        docs = asyncio.run(client.get("/api/diagnostics", headers=admin_headers)).json()
+
+        assert docs[0]["firstName"] == "Lead 0"
+        assert "timestamp" in docs[0]
+        assert "_id" not in docs[0]
+        assert "roadmap" not in docs[0]
+        assert "diagSummary" not in docs[0]
+
+    def test_fields_and_filters(self, server, client, admin_headers):
+        _seed(server, 7)
+
+        docs = asyncio.run(client.get(
+            "/api/diagnostics",
+            params={"email": "lead1@partner.fr", "segment": "transition", "fields": "id,diagSummary"},
+            headers=admin_headers
+        )).json()
+
+        assert docs == [{"id": "diag-1", "diagSummary": "Résumé"}]
+
+    def test_date_range(self, server, client, admin_headers):
+        _seed(server, 7)
+
+        pages = asyncio.run(_get_all_pages(client, "/api/diagnostics", {
+            "from": "2025-01-11T00:00:00Z", "to": "2025-01-13T00:00:00Z", "limit": 1
+        }, admin_headers))
+
+        assert [doc["id"] for page in pages for doc in page] == ["diag-5", "diag-4", "diag-3", "diag-2"]
+
+    def test_timestamps_stored_as_dates(self, server, client, diagnostic_payload):
+        async def scenario():
+            await client.post("/api/diagnostic/analyze", json=diagnostic_payload)
+            await client.post("/api/status", json={"client_name": "probe"})
+            return await server.db.diagnostics.find_one({}), await server.db.status_checks.find_one({})
+
+        diagnostic, status = asyncio.run(scenario())
+        assert isinstance(diagnostic["timestamp"], datetime)
+        assert isinstance(status["timestamp"], datetime)
+
+    def test_bad_fields_and_cursor(self, client, admin_headers):
+        async def scenario():
+            return (
+                await client.get("/api/diagnostics", params={"fields": "id,password"}, headers=admin_headers),
+                await client.get("/api/diagnostics", params={"cursor": "not-a-cursor"}, headers=admin_headers)
+            )
+
+        unknown_field, bad_cursor = asyncio.run(scenario())
+        assert unknown_field.status_code == 400
+        assert bad_cursor.status_code == 400
+
+    def test_get_by_id(self, client, diagnostic_payload, admin_headers):
+        async def scenario():
+            await client.post("/api/diagnostic/analyze", json=diagnostic_payload)
+            listed = (await client.get("/api/diagnostics", headers=admin_headers)).json()
+            found = await client.get(f"/api/diagnostics/{listed[0]['id']}", headers=admin_headers)
+            missing = await client.get("/api/diagnostics/unknown", headers=admin_headers)
+            return found, missing
+
+        found, missing = asyncio.run(scenario())
+        assert found.status_code == 200
+        assert found.json()["email"] == diagnostic_payload["userInfo"]["email"]
+        assert "roadmap" in found.json()
+        assert missing.status_code == 404
+        # Internal fields of the stored document are not exposed
+        assert not {"idempotencyKey", "requestFingerprint", "llmVariant", "contentRefs"} & set(found.json())
+
+    def test_requires_admin_token(self, client, admin_headers):
+        async def scenario():
+            return (
+                await client.get("/api/diagnostics"),
+                await client.get("/api/diagnostics/diag-0", headers={"X-Admin-Token": "wrong"})
+            )
+
+        anonymous, wrong = asyncio.run(scenario())
+        assert anonymous.status_code == 401
+        assert wrong.status_code == 401
+
+
+class TestStatusListing:
+    """GET /api/status is paginated instead of loading up to 1000 documents"""
+
+    def test_pages(self, client):
+        async def scenario():
+            for index in range(5):
+                await client.post("/api/status", json={"client_name": f"client-{index}"})
+            return await _get_all_pages(client, "/api/status", {"limit": 2})
+
+        pages = asyncio.run(scenario())
+        assert [len(page) for page in pages] == [2, 2, 1]
+        names = [check["client_name"] for page in pages for check in page]
+        assert sorted(names) == [f"client-{index}" for index in range(5)]
+
+
+class TestIndexes:
+    def test_startup_indexes(self, server):
+        asyncio.run(server.ensure_indexes())
+
+        async def index_keys():
+            return [[field for field, _ in index["key"]] for index in (await server.db.diagnostics.index_information()).values()]
+
+        keys = asyncio.run(index_keys())
+        assert ["timestamp", "_id"] in keys
+        assert ["email", "timestamp", "_id"] in keys
+        assert ["segment", "timestamp", "_id"] in keys
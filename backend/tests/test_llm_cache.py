@@ -0,0 +1,105 @@
+"""
+Tests for the Mongo-backed GPT response cache
+"""
+import asyncio
+import json
+
+from mongomock_motor import AsyncMongoMockClient
+
+from conftest import FakeOpenAI
+from llm_cache import LLMResponseCache, _from_template, _leaks_personal, _to_template
+
+
+def _cache(ttl_seconds=3600):
+    collection = AsyncMongoMockClient()["test_database"].llm_cache
+    return LLMResponseCache(collection, ttl_seconds=ttl_seconds, version="test")
+
+
+class TestPersonalTemplating:
+    """Name and city are stored as placeholders, not baked into entries"""
+
+    def test_round_trip(self):
+        personal = {"first_name": "Jean", "city": "Lyon"}
+        text = "Jean, à Lyon tu es à un tournant. Jeanne n'est pas Jean."
+        templated = _to_template(text, personal)
+        assert templated == "{first_name}, à {city} tu es à un tournant. Jeanne n'est pas {first_name}."
+        assert _from_template(templated, {"first_name": "Marie", "city": "Nice"}) == (
+            "Marie, à Nice tu es à un tournant. Jeanne n'est pas Marie."
+        )
+
+    def test_matching_ignores_case(self):
+        templated = _to_template("Jean, à LYON tu es à un tournant.", {"first_name": "jean", "city": "lyon"})
+        assert templated == "{first_name}, à {city} tu es à un tournant."
+
+    def test_untemplatable_analyses_are_refused(self):
+        personal = {"first_name": "Jean", "city": "Lyon"}
+        assert not _leaks_personal({"diagSummary": "{first_name}, à {city}."}, personal)
+        # Name written in a form the templating misses
+        assert _leaks_personal({"diagSummary": "Jeannot, à {city}."}, personal)
+        assert _leaks_personal({"diagSummary": "{first_name}, vise le marché lyonnais."}, personal)
+
+    def test_key_ignores_answer_order_and_personal_fields(self):
+        cache = _cache()
+        scores = {"total": 3, "structure": 1, "acquisition": 1, "value": 1}
+        first = cache.key_for({"1": 1, "2": 0, "10": 2}, scores, "artisanal", "30")
+        second = cache.key_for({"10": 2, "1": 1, "2": 0}, scores, "artisanal", " 30 ")
+        assert first == second
+        assert first != cache.key_for({"1": 1, "2": 0, "10": 1}, scores, "artisanal", "30")
+
+
+class TestAnalyzeUsesCache:
+    """Identical diagnostics from different leads share one completion"""
+
+    def test_second_lead_served_from_cache(self, server, client, diagnostic_payload, monkeypatch):
+        gpt_text = {
+            "diagSummary": "Jean, à Lyon ta conciergerie est en transition.",
+            "mainBlocker": "Acquisition", "priority": "Structurer.", "goodtimeRecommendation": "Goodtime."
+        }
+        fake = FakeOpenAI(content=json.dumps(gpt_text, ensure_ascii=False))
+        monkeypatch.setattr(server, "openai_client", fake)
+        other_lead = {**diagnostic_payload, "userInfo": {**diagnostic_payload["userInfo"], "firstName": "Marie", "city": "Nice", "email": "marie@conciergerie.fr"}}
+
+        async def scenario():
+            first = await client.post("/api/diagnostic/analyze", json=diagnostic_payload)
+            second = await client.post("/api/diagnostic/analyze", json=other_lead)
+            stats = await client.get("/api/diagnostic/cache")
+            stored = await server.db.llm_cache.find_one({})
+            return first.json(), second.json(), stats.json()["llm"], stored
+
+        first, second, stats, stored = asyncio.run(scenario())
+        assert fake.chat.completions.calls == 1
+        assert first["diagSummary"] == "Jean, à Lyon ta conciergerie est en transition."
+        assert second["diagSummary"] == "Marie, à Nice ta conciergerie est en transition."
+        assert stored["analysis"]["diagSummary"] == "{first_name}, à {city} ta conciergerie est en transition."
+        assert stats == {"hits": 1, "misses": 1}
+
+    def test_lowercase_lead_details_do_not_leak(self, server, client, diagnostic_payload, monkeypatch):
+        gpt_text = {
+            "diagSummary": "Jean, ta conciergerie à Lyon repose sur toi.",
+            "mainBlocker": "Acquisition", "priority": "Structurer.", "goodtimeRecommendation": "Goodtime."
+        }
+        monkeypatch.setattr(server, "openai_client", FakeOpenAI(content=json.dumps(gpt_text, ensure_ascii=False)))
+        lowercase = {**diagnostic_payload, "userInfo": {**diagnostic_payload["userInfo"], "firstName": "jean", "city": "lyon"}}
+        other_lead = {**diagnostic_payload, "userInfo": {**diagnostic_payload["userInfo"], "firstName": "Marie", "city": "Nice", "email": "marie@conciergerie.fr"}}
+
+        async def scenario():
+            await client.post("/api/diagnostic/analyze", json=lowercase)
+            second = await client.post("/api/diagnostic/analyze", json=other_lead)
+            return second.json(), await server.db.llm_cache.find_one({})
+
+        second, stored = asyncio.run(scenario())
+        assert stored["analysis"]["diagSummary"] == "{first_name}, ta conciergerie à {city} repose sur toi."
+        assert second["diagSummary"] == "Marie, ta conciergerie à Nice repose sur toi."
+
+    def test_ttl_index_and_disabled_cache(self):
+        async def scenario():
+            cache = _cache(ttl_seconds=60)
+            await cache.ensure_indexes()
+            indexes = await cache.collection.index_information()
+            disabled = _cache(ttl_seconds=0)
+            await disabled.put("k", {"diagSummary": "x"}, None)
+            return indexes, await disabled.collection.count_documents({})
+
+        indexes, stored = asyncio.run(scenario())
+        assert any(index.get("expireAfterSeconds") == 60 for index in indexes.values())
+        assert stored == 0
@@ -0,0 +1,99 @@
+"""
+Tests for the LLM mode switch (llm_mode.py) and its use by the analyze endpoints
+"""
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from conftest import GPT_ANALYSIS
+from llm_mode import DETERMINISTIC, GPT, LLMModeSwitch, rollout_bucket
+
+
+async def _stored(server):
+    saved = await server.db.diagnostics.find_one({})
+    webhook = await server.webhook_outbox.collection.find_one({})
+    return saved, webhook
+
+
+def _put_mode(client, body, token=None):
+    headers = {"X-Admin-Token": token} if token else {}
+    return asyncio.run(client.put("/api/llm-mode", json=body, headers=headers))
+
+
+class TestLLMModeSwitch:
+    def test_rollout_is_stable_per_lead(self):
+        switch = LLMModeSwitch("rollout", 50)
+        emails = [f"lead{i}@conciergerie.fr" for i in range(200)]
+
+        variants = [switch.variant_for(email) for email in emails]
+
+        assert variants == [switch.variant_for(email.upper()) for email in emails]
+        assert 60 < variants.count(GPT) < 140
+        assert all((variant == GPT) == (rollout_bucket(email) < 50) for email, variant in zip(emails, variants))
+
+    def test_request_can_only_opt_out_of_gpt(self):
+        assert LLMModeSwitch(DETERMINISTIC).variant_for("a@b.fr", GPT) == DETERMINISTIC
+        # A request cannot pick GPT outside its rollout bucket
+        assert LLMModeSwitch("rollout", 0).variant_for("a@b.fr", GPT) == DETERMINISTIC
+        assert LLMModeSwitch("rollout", 100).variant_for("a@b.fr", DETERMINISTIC) == DETERMINISTIC
+        assert LLMModeSwitch(GPT).variant_for("a@b.fr", DETERMINISTIC) == DETERMINISTIC
+
+    def test_invalid_settings(self):
+        with pytest.raises(ValueError):
+            LLMModeSwitch("off")
+        with pytest.raises(ValueError):
+            LLMModeSwitch("rollout", 120)
+
+
+class TestDeterministicAnalysis:
+    """The deterministic variant takes the GPT fallback path without calling OpenAI"""
+
+    def test_mode_skips_gpt(self, server, post, diagnostic_payload):
+        server.llm_mode.set(DETERMINISTIC)
+        before = REGISTRY.get_sample_value("diagnostic_gpt_fallbacks_total", {"reason": "disabled"})
+
+        response = post("/api/diagnostic/analyze", json=diagnostic_payload)
+        saved, webhook = asyncio.run(_stored(server))
+
+        assert response.status_code == 200
+        assert response.json()["diagSummary"] != GPT_ANALYSIS["diagSummary"]
+        assert server.openai_client.chat.completions.calls == 0
+        assert saved["llmVariant"] == DETERMINISTIC
+        assert webhook["payload"]["llmVariant"] == DETERMINISTIC
+        assert REGISTRY.get_sample_value("diagnostic_gpt_fallbacks_total", {"reason": "disabled"}) == before + 1
+
+    def test_per_request_option(self, server, post, diagnostic_payload):
+        payload = {**diagnostic_payload, "llm": "deterministic"}
+
+        response = post("/api/diagnostic/analyze/stream", json=payload)
+        saved, _ = asyncio.run(_stored(server))
+
+        assert "event: done" in response.text
+        assert server.openai_client.chat.completions.calls == 0
+        assert saved["llmVariant"] == DETERMINISTIC
+
+    def test_gpt_variant_recorded(self, server, post, diagnostic_payload):
+        response = post("/api/diagnostic/analyze", json=diagnostic_payload)
+        saved, webhook = asyncio.run(_stored(server))
+
+        assert response.json()["diagSummary"] == GPT_ANALYSIS["diagSummary"]
+        assert saved["llmVariant"] == GPT
+        assert webhook["payload"]["llmVariant"] == GPT
+
+
+class TestLLMModeEndpoint:
+    def test_requires_admin_token(self, server, client, monkeypatch):
+        assert _put_mode(client, {"mode": "deterministic"}).status_code == 403
+
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+        assert _put_mode(client, {"mode": "deterministic"}, "wrong").status_code == 401
+        assert server.llm_mode.mode == GPT
+
+    def test_switch_mode(self, server, client, monkeypatch):
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+
+        response = _put_mode(client, {"mode": "rollout", "rolloutPercent": 25}, "secret")
+
+        assert response.json() == {"mode": "rollout", "rolloutPercent": 25}
+        assert server.llm_mode.snapshot() == {"mode": "rollout", "rolloutPercent": 25}
@@ -0,0 +1,85 @@
+"""
+Tests for the Prometheus metrics of the analyze pipeline
+"""
+import asyncio
+
+import httpx
+from mongomock_motor import AsyncMongoMockClient
+from prometheus_client import REGISTRY
+
+from conftest import FakeOpenAI
+from webhook_outbox import WebhookOutbox
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestAnalyzeMetrics:
+    """Stage latencies and failure counters exposed on /metrics"""
+
+    def test_stage_histograms(self, client, post, diagnostic_payload):
+        before = {
+            stage: _sample("diagnostic_stage_duration_seconds_count", stage=stage)
+            for stage in ("prompt", "openai", "deterministic", "persist")
+        }
+
+        response = post("/api/diagnostic/analyze", json=diagnostic_payload)
+        scrape = asyncio.run(client.get("/metrics"))
+
+        assert response.status_code == 200
+        assert scrape.status_code == 200
+        assert scrape.headers["content-type"].startswith("text/plain")
+        assert 'diagnostic_stage_duration_seconds_bucket{le="0.001",stage="prompt"}' in scrape.text
+        for stage, count in before.items():
+            assert _sample("diagnostic_stage_duration_seconds_count", stage=stage) == count + 1
+
+    def test_gpt_fallback_counter(self, server, post, diagnostic_payload, monkeypatch):
+        monkeypatch.setattr(server, "openai_client", FakeOpenAI(content="pas du JSON"))
+        before = _sample("diagnostic_gpt_fallbacks_total", reason="invalid_response")
+
+        post("/api/diagnostic/analyze", json=diagnostic_payload)
+
+        assert _sample("diagnostic_gpt_fallbacks_total", reason="invalid_response") == before + 1
+
+    def test_db_and_webhook_failure_counters(self, server, post, diagnostic_payload, monkeypatch):
+        async def failing(*args, **kwargs):
+            raise RuntimeError("unavailable")
+
+        collection_class = type(server.db.diagnostics)
+        monkeypatch.setattr(collection_class, "insert_one", failing)
+        monkeypatch.setattr(server.webhook_outbox, "enqueue", failing)
+        db_before = _sample("diagnostic_db_save_failures_total")
+        webhook_before = _sample("webhook_failures_total", kind="enqueue")
+
+        response = post("/api/diagnostic/analyze", json=diagnostic_payload)
+
+        assert response.status_code == 200
+        assert _sample("diagnostic_db_save_failures_total") == db_before + 1
+        assert _sample("webhook_failures_total", kind="enqueue") == webhook_before + 1
+
+    def test_webhook_delivery_failures(self):
+        collection = AsyncMongoMockClient()["test_database"].webhook_outbox
+        # No workers: the test drives deliver() itself
+        outbox = WebhookOutbox(
+            collection, workers=0, max_attempts=2,
+            transport=httpx.MockTransport(lambda request: httpx.Response(500))
+        )
+        retry_before = _sample("webhook_failures_total", kind="retry")
+        dead_before = _sample("webhook_failures_total", kind="dead")
+
+        async def scenario():
+            await outbox.start()
+            try:
+                await outbox.enqueue("https://n8n.example.test/webhook", {"email": "a@b.fr"})
+                entry = await outbox._claim()
+                await outbox.deliver(entry)
+                entry = await collection.find_one({})
+                await outbox.deliver(entry)
+            finally:
+                await outbox.stop()
+
+        asyncio.run(scenario())
+
+        assert _sample("webhook_failures_total", kind="retry") == retry_before + 1
+        assert _sample("webhook_failures_total", kind="dead") == dead_before + 1
@@ -0,0 +1,42 @@
+"""
+Tests for the one-shot ISO-string -> BSON date timestamp migration
+"""
+import asyncio
+from datetime import datetime, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+from migrations.timestamps_to_dates import migrate
+
+
+class TestTimestampsToDates:
+    """String timestamps are converted in place, dates are left alone"""
+
+    def test_migrates_strings_and_is_rerunnable(self):
+        db = AsyncMongoMockClient()["test_database"]
+        already = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+        async def scenario():
+            await db.diagnostics.insert_many([
+                {"id": "a", "timestamp": "2025-01-10T09:00:00.123456+00:00"},
+                {"id": "b", "timestamp": "2025-01-11T10:30:00"},
+                {"id": "c", "timestamp": already},
+                {"id": "d", "timestamp": "hier"}
+            ])
+            await db.status_checks.insert_one({"id": "s", "timestamp": "2025-02-01T08:00:00+00:00"})
+
+            dry = await migrate(db, batch_size=2, dry_run=True)
+            first = await migrate(db, batch_size=2)
+            second = await migrate(db, batch_size=2)
+            docs = {doc["id"]: doc["timestamp"] async for doc in db.diagnostics.find({})}
+            return dry, first, second, docs
+
+        dry, first, second, docs = asyncio.run(scenario())
+
+        assert dry["diagnostics"] == {"converted": 3, "failed": 0}
+        assert first == {"diagnostics": {"converted": 2, "failed": 1}, "status_checks": {"converted": 1, "failed": 0}}
+        assert second["diagnostics"] == {"converted": 0, "failed": 1}
+        assert docs["a"].replace(tzinfo=timezone.utc) == datetime(2025, 1, 10, 9, 0, 0, 123000, tzinfo=timezone.utc)
+        assert docs["b"].replace(tzinfo=timezone.utc) == datetime(2025, 1, 11, 10, 30, tzinfo=timezone.utc)
+        assert docs["c"].replace(tzinfo=timezone.utc) == already
+        assert docs["d"] == "hier"
@@ -0,0 +1,64 @@
+"""
+Tests for the compact GPT prompt and token accounting (prompt_budget.py)
+"""
+from prometheus_client import REGISTRY
+
+from prompt_budget import count_message_tokens, count_tokens
+
+# Offline count (tiktoken, or the 4 chars/token estimate) of a whole request
+PROMPT_TOKEN_BUDGET = 600
+
+
+def _prompt(server, payload, answers=None):
+    request = server.DiagnosticRequest.model_validate({**payload, "answers": answers or payload["answers"]})
+    segment, = server.score_requests([request])
+    return server.gpt_messages(server.generate_analysis_prompt(request.userInfo, request.answers, request.scores, segment))
+
+
+class TestAnalysisPrompt:
+    """Static system prefix, lead-specific user message limited to the weakest block"""
+
+    def test_within_token_budget(self, server, diagnostic_payload):
+        messages = _prompt(server, diagnostic_payload)
+
+        assert count_message_tokens(messages) <= PROMPT_TOKEN_BUDGET
+        assert count_tokens("Bonjour") > 0
+
+    def test_only_weakest_block_questions(self, server, diagnostic_payload):
+        answers = {str(q): 2 for q in range(1, 23)}
+        answers.update({"11": 0, "12": 0, "13": 0})
+
+        prompt = _prompt(server, diagnostic_payload, answers)[1]["content"]
+
+        assert "MOTEUR D'ACQUISITION" in prompt
+        assert "Q11: Origine des nouveaux propriétaires : 0/2" in prompt
+        assert "Q19:" in prompt
+        assert "Q1:" not in prompt
+        assert "Q20:" not in prompt
+
+    def test_system_prefix_is_static(self, server, diagnostic_payload):
+        other = {**diagnostic_payload, "userInfo": {**diagnostic_payload["userInfo"], "firstName": "Marie", "city": "Nice"}}
+
+        first = _prompt(server, diagnostic_payload)
+        second = _prompt(server, other, {str(q): 0 for q in range(1, 23)})
+
+        assert first[0] == second[0]
+        assert "Jean" not in first[0]["content"]
+
+
+class TestTokenUsage:
+    def test_usage_recorded(self, post, diagnostic_payload):
+        def count(kind):
+            return REGISTRY.get_sample_value("gpt_tokens_per_request_count", {"kind": kind}) or 0.0
+
+        def total(kind):
+            return REGISTRY.get_sample_value("gpt_tokens_per_request_sum", {"kind": kind}) or 0.0
+
+        before = {kind: (count(kind), total(kind)) for kind in ("prompt", "cached_prompt", "completion")}
+
+        post("/api/diagnostic/analyze", json=diagnostic_payload)
+
+        for kind, (calls, tokens) in before.items():
+            assert count(kind) == calls + 1
+        assert total("prompt") == before["prompt"][1] + 500
+        assert total("cached_prompt") == before["cached_prompt"][1]
@@ -0,0 +1,89 @@
+"""
+Tests for the server-side scoring of answers (scoring.py)
+"""
+import asyncio
+import random
+
+import scoring
+from scoring import compute_scores, segment_for
+
+
+def _reference_scores(answers):
+    """Per-question loop, as in the frontend's calculateScores"""
+    scores = {"total": 0, "structure": 0, "acquisition": 0, "value": 0}
+    for q_id, value in answers.items():
+        q = int(q_id)
+        value = min(max(value, 0), 2)
+        scores["total"] += value
+        if 1 <= q <= 10:
+            scores["structure"] += value
+        elif 11 <= q <= 19:
+            scores["acquisition"] += value
+        elif 20 <= q <= 22:
+            scores["value"] += value
+    return scores
+
+
+class TestComputeScores:
+    """Weight-matrix scoring matches the per-question definition"""
+
+    def test_batch_matches_reference(self):
+        rng = random.Random(8)
+        answer_sets = [
+            {str(q): rng.randint(0, 2) for q in range(1, 23)}
+            for _ in range(500)
+        ]
+
+        results = compute_scores(answer_sets)
+
+        assert len(results) == 500
+        for answers, (scores, segment) in zip(answer_sets, results):
+            assert scores == _reference_scores(answers)
+            assert segment == segment_for(scores["total"])
+
+    def test_single_sample_and_batch_agree(self):
+        answers = {str(q): q % 3 for q in range(1, 23)}
+        assert compute_scores([answers]) == compute_scores([answers, {}])[:1]
+
+    def test_missing_unknown_and_out_of_range_answers(self):
+        (scores, segment), = compute_scores([{"1": 5, "2": -1, "11": 2, "99": 2}])
+        assert scores == {"total": 4, "structure": 2, "acquisition": 2, "value": 0}
+        assert segment == "artisanal"
+
+    def test_segment_thresholds(self):
+        assert [segment_for(total) for total in (0, 18, 19, 32, 33, 44)] == [
+            "artisanal", "artisanal", "transition", "transition", "machine", "machine"
+        ]
+        assert scoring.segments_for([18, 19, 32, 33]) == ["artisanal", "transition", "transition", "machine"]
+
+    def test_empty_batch(self):
+        assert compute_scores([]) == []
+
+
+class TestServerScoring:
+    """The API derives scores from the answers instead of trusting the client"""
+
+    def test_client_scores_are_ignored(self, post, diagnostic_payload):
+        diagnostic_payload["scores"] = {"total": 44, "structure": 20, "acquisition": 18, "value": 6}
+
+        data = post("/api/diagnostic/analyze", json=diagnostic_payload).json()
+        assert (data["score"], data["structureScore"], data["acquisitionScore"], data["valueScore"]) == (22, 10, 9, 3)
+        assert data["segment"] == "transition"
+
+    def test_scores_are_optional(self, server, diagnostic_payload):
+        del diagnostic_payload["scores"]
+        request = server.DiagnosticRequest.model_validate(diagnostic_payload)
+
+        assert server.score_requests([request]) == ["transition"]
+        assert request.scores == {"total": 22, "structure": 10, "acquisition": 9, "value": 3}
+
+    def test_oversized_answers_are_clamped(self, server, post, diagnostic_payload):
+        """Ints beyond int64 used to overflow numpy and fail with a 500"""
+        diagnostic_payload["answers"] = {"1": 10**20, "2": -10**20, "11": 2}
+
+        response = post("/api/diagnostic/analyze", json=diagnostic_payload)
+        saved = asyncio.run(server.db.diagnostics.find_one({}))
+        assert response.status_code == 200
+        assert (response.json()["structureScore"], response.json()["acquisitionScore"]) == (2, 2)
+        assert saved["answers"] == {"1": 2, "2": 0, "11": 2}
+        assert compute_scores([{"1": 10**20}])[0][0]["structure"] == 2
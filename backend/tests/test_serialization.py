@@ -0,0 +1,41 @@
+"""
+Tests for the single serialization of an analyzed diagnostic (SerializedDiagnostic)
+"""
+import asyncio
+import json
+
+
+
+class TestSerializedDiagnostic:
+    """Response body, Mongo document and webhook payload come from one dict"""
+
+    def test_views_share_one_serialization(self, server, diagnostic_payload):
+        async def scenario():
+            request = server.DiagnosticRequest.model_validate(diagnostic_payload)
+            segment, = server.score_requests([request])
+            analysis = await server.run_analysis(request, segment)
+            return request, server.serialize_diagnostic(request, analysis)
+
+        request, diagnostic = asyncio.run(scenario())
+        doc = server.build_diagnostic_document(request, diagnostic)
+        webhook = server.build_webhook_payload(request, diagnostic)
+
+        assert json.loads(diagnostic.json) == server.DiagnosticResponse(**diagnostic.data).model_dump()
+        assert diagnostic.json is diagnostic.json
+        for view in (doc, webhook):
+            assert view["roadmap"] is diagnostic.data["roadmap"]
+            assert view["llmVariant"] == "gpt"
+
+    def test_response_matches_stored_document(self, server, client, diagnostic_payload):
+        async def scenario():
+            response = await client.post("/api/diagnostic/analyze", json=diagnostic_payload)
+            saved = await server.content_store.rehydrate(await server.db.diagnostics.find_one({}, {"_id": 0}))
+            webhook = await server.webhook_outbox.collection.find_one({})
+            return response, saved, webhook
+
+        response, saved, webhook = asyncio.run(scenario())
+
+        assert response.headers["content-type"] == "application/json"
+        body = response.json()
+        assert {key: saved[key] for key in body} == body
+        assert {key: webhook["payload"][key] for key in body} == body
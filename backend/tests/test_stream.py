@@ -0,0 +1,90 @@
+"""
+Tests for the SSE endpoint /api/diagnostic/analyze/stream
+"""
+import asyncio
+import json
+
+from conftest import GPT_ANALYSIS, FakeOpenAI
+from gpt_parsing import JSONStringFieldExtractor
+
+
+def _post_stream(post, payload):
+    response = post("/api/diagnostic/analyze/stream", json=payload)
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return response, events
+
+
+class TestJSONStringFieldExtractor:
+    """Incremental decoding of one field from a streamed JSON object"""
+
+    def test_decodes_field_across_arbitrary_chunks(self):
+        text = json.dumps({"diagSummary": "Jean, ta conciergerie à \"Lyon\"\n→ 🚀 prête.", "priority": "x"})
+        for size in (1, 2, 3, 5, 13):
+            extractor = JSONStringFieldExtractor("diagSummary")
+            decoded = "".join(extractor.feed(text[i:i + size]) for i in range(0, len(text), size))
+            assert decoded == "Jean, ta conciergerie à \"Lyon\"\n→ 🚀 prête."
+            assert extractor.done
+
+    def test_ignores_other_fields(self):
+        extractor = JSONStringFieldExtractor("diagSummary")
+        assert extractor.feed('```json\n{"priority": "Haute", ') == ""
+        assert not extractor.started
+        assert extractor.feed('"diagSummary" : "Bon') == "Bon"
+        assert extractor.feed('jour", "mainBlocker": "z"}') == "jour"
+
+
+class TestAnalyzeStream:
+    """Deterministic sections first, then the GPT summary as it is generated"""
+
+    def test_event_sequence(self, server, post, diagnostic_payload):
+        response, events = _post_stream(post, diagnostic_payload)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        names = [name for name, _ in events]
+        assert names[0] == "analysis"
+        assert names[-1] == "done"
+        assert set(names[1:-1]) == {"summary"}
+        assert len(names) > 3
+
+        first = events[0][1]
+        done = events[-1][1]
+        streamed = "".join(data["delta"] for name, data in events if name == "summary")
+        assert streamed == GPT_ANALYSIS["diagSummary"]
+        assert done["diagSummary"] == GPT_ANALYSIS["diagSummary"]
+        # Everything but the summary is final from the first event
+        for field in ("segment", "mainBlocker", "priority", "goodtimeRecommendation", "roadmap"):
+            assert first[field] == done[field]
+        assert server.openai_client.chat.completions.streams[0].closed
+        print("✓ SSE stream emits analysis, summary deltas and done")
+
+    def test_persists_and_queues_webhook(self, server, post, diagnostic_payload):
+        _post_stream(post, diagnostic_payload)
+
+        async def stored():
+            doc = await server.db.diagnostics.find_one({"email": diagnostic_payload["userInfo"]["email"]})
+            entry = await server.webhook_outbox.collection.find_one({})
+            return doc, entry
+
+        doc, entry = asyncio.run(stored())
+        assert doc["diagSummary"] == GPT_ANALYSIS["diagSummary"]
+        assert entry["payload"]["diagSummary"] == GPT_ANALYSIS["diagSummary"]
+
+    def test_invalid_gpt_output_falls_back_to_deterministic(self, server, post, diagnostic_payload, monkeypatch):
+        monkeypatch.setattr(server, "openai_client", FakeOpenAI(content="pas du JSON"))
+
+        _, events = _post_stream(post, diagnostic_payload)
+
+        assert [name for name, _ in events] == ["analysis", "done"]
+        assert events[-1][1] == events[0][1]
+
+    def test_cached_summary_sent_in_one_event(self, server, post, diagnostic_payload):
+        _post_stream(post, diagnostic_payload)
+        _, events = _post_stream(post, diagnostic_payload)
+
+        assert [name for name, _ in events] == ["analysis", "summary", "done"]
+        assert events[1][1]["delta"] == GPT_ANALYSIS["diagSummary"]
+        assert server.openai_client.chat.completions.calls == 1
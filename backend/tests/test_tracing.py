@@ -0,0 +1,117 @@
+"""
+Tests for request tracing (tracing.py)
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from tracing import FileSpanExporter, SpanExporter, span, tracer
+from webhook_outbox import WebhookOutbox
+
+
+class MemoryExporter(SpanExporter):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    async def write(self, records):
+        self.records.extend(records)
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = MemoryExporter()
+    monkeypatch.setattr(tracer, "exporter", exporter)
+    monkeypatch.setattr(tracer, "min_duration", 0.0)
+    return exporter
+
+
+class TestRequestTracing:
+    """One trace per request, with a child span per pipeline step"""
+
+    def test_analyze_spans(self, post, diagnostic_payload, exporter):
+        response = post("/api/diagnostic/analyze", json=diagnostic_payload)
+        asyncio.run(exporter.flush())
+
+        trace_id = response.headers["x-trace-id"]
+        spans = {record["name"]: record for record in exporter.records}
+        assert {record["traceId"] for record in exporter.records} == {trace_id}
+        root = spans["POST /api/diagnostic/analyze"]
+        assert root["parentId"] is None
+        assert root["attributes"]["http.status_code"] == 200
+        for name in ("llm_cache.get", "openai.completion", "gpt.parse", "analyze_diagnostic", "mongo.insert_one", "webhook.enqueue"):
+            assert spans[name]["parentId"] == root["spanId"], name
+        assert spans["llm_cache.get"]["attributes"]["hit"] is False
+
+    def test_incoming_trace_id_is_kept(self, post, diagnostic_payload, exporter):
+        trace_id = "0af7651916cd43dd8448eb211c80319c"
+
+        response = post("/api/diagnostic/analyze", json=diagnostic_payload, headers={"X-Trace-Id": trace_id})
+
+        assert response.headers["x-trace-id"] == trace_id
+
+    def test_fast_traces_dropped_with_min_duration(self, post, diagnostic_payload, exporter, monkeypatch):
+        monkeypatch.setattr(tracer, "min_duration", 60.0)
+
+        post("/api/diagnostic/analyze", json=diagnostic_payload)
+        asyncio.run(exporter.flush())
+
+        assert exporter.records == []
+
+    def test_errors_recorded(self, exporter):
+        async def scenario():
+            with pytest.raises(ValueError):
+                with span("outer"):
+                    with span("inner"):
+                        raise ValueError("boom")
+            await exporter.flush()
+
+        asyncio.run(scenario())
+        inner = exporter.records[0]
+        assert inner["name"] == "inner"
+        assert inner["status"] == "error"
+        assert inner["error"] == "ValueError: boom"
+
+    def test_webhook_delivery_continues_trace(self, exporter):
+        from mongomock_motor import AsyncMongoMockClient
+
+        collection = AsyncMongoMockClient()["test_database"].webhook_outbox
+        outbox = WebhookOutbox(collection, workers=0, transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+
+        async def scenario():
+            await outbox.start()
+            try:
+                with span("request") as root:
+                    await outbox.enqueue("https://n8n.example.test/webhook", {"email": "a@b.fr"})
+                await outbox.deliver(await outbox._claim())
+            finally:
+                await outbox.stop()
+            await exporter.flush()
+            return root
+
+        root = asyncio.run(scenario())
+        delivery = next(record for record in exporter.records if record["name"] == "webhook.deliver")
+        assert delivery["traceId"] == root.trace_id
+        assert delivery["parentId"] == root.span_id
+        assert delivery["attributes"]["http.status_code"] == 200
+
+
+class TestFileSpanExporter:
+    def test_writes_json_lines(self, tmp_path, monkeypatch):
+        path = tmp_path / "spans.jsonl"
+        exporter = FileSpanExporter(str(path))
+        monkeypatch.setattr(tracer, "exporter", exporter)
+
+        async def scenario():
+            with span("root"):
+                with span("child", answer=42):
+                    pass
+            await exporter.flush()
+
+        asyncio.run(scenario())
+        records = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [record["name"] for record in records] == ["child", "root"]
+        assert records[0]["attributes"] == {"answer": 42}
+        assert records[0]["parentId"] == records[1]["spanId"]
@@ -0,0 +1,137 @@
+"""
+Tests for the Mongo-backed webhook outbox
+Delivery runs against an httpx MockTransport and mongomock-motor.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from mongomock_motor import AsyncMongoMockClient
+
+from webhook_outbox import WebhookOutbox, DELIVERED, DEAD, PENDING
+
+WEBHOOK_URL = "https://n8n.example.test/webhook/audit"
+
+
+def _outbox(handler, **kwargs):
+    collection = AsyncMongoMockClient()["test_database"].webhook_outbox
+    return WebhookOutbox(collection, transport=httpx.MockTransport(handler), **kwargs)
+
+
+async def _wait_for_status(outbox, entry_id, status, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        entry = await outbox.collection.find_one({"_id": entry_id})
+        if entry["status"] == status:
+            return entry
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"entry {entry_id} never reached {status}: {entry}")
+
+
+class TestWebhookOutbox:
+    """Queueing, retries and dead-lettering of audit webhooks"""
+
+    def test_worker_delivers_queued_payload(self):
+        """A queued payload is POSTed by the background worker"""
+        received = []
+
+        def handler(request):
+            received.append(request.read())
+            return httpx.Response(200)
+
+        async def scenario():
+            outbox = _outbox(handler)
+            await outbox.start()
+            try:
+                entry_id = await outbox.enqueue(WEBHOOK_URL, {"email": "a@b.fr"})
+                return await _wait_for_status(outbox, entry_id, DELIVERED)
+            finally:
+                await outbox.stop()
+
+        entry = asyncio.run(scenario())
+        assert entry["attempts"] == 1
+        assert received == [b'{"email":"a@b.fr"}']
+
+    def test_failure_schedules_retry_with_backoff(self):
+        """A failed delivery goes back to pending with a later next_attempt_at"""
+
+        async def scenario():
+            outbox = _outbox(lambda request: httpx.Response(502), base_delay=60)
+            await outbox.start()
+            try:
+                entry_id = await outbox.enqueue(WEBHOOK_URL, {"email": "a@b.fr"})
+                for _ in range(200):
+                    entry = await outbox.collection.find_one({"_id": entry_id})
+                    if entry["attempts"] == 1 and entry["status"] == PENDING:
+                        return entry
+                    await asyncio.sleep(0.01)
+            finally:
+                await outbox.stop()
+
+        entry = asyncio.run(scenario())
+        assert entry["last_error"] == "HTTP 502"
+        next_attempt = entry["next_attempt_at"].replace(tzinfo=timezone.utc)
+        assert next_attempt > datetime.now(timezone.utc) + timedelta(seconds=30)
+
+    def test_dead_letter_after_max_attempts(self):
+        """An entry that keeps failing ends up in the dead state"""
+
+        def handler(request):
+            raise httpx.ConnectError("n8n unreachable")
+
+        async def scenario():
+            outbox = _outbox(handler, max_attempts=3, base_delay=0.01)
+            await outbox.start()
+            try:
+                entry_id = await outbox.enqueue(WEBHOOK_URL, {"email": "a@b.fr"})
+                # Retries are scheduled in the future: poke the worker until dead
+                for _ in range(300):
+                    entry = await outbox.collection.find_one({"_id": entry_id})
+                    if entry["status"] == DEAD:
+                        return entry, await outbox.stats()
+                    outbox._wakeup.set()
+                    await asyncio.sleep(0.01)
+            finally:
+                await outbox.stop()
+
+        entry, stats = asyncio.run(scenario())
+        assert entry["attempts"] == 3
+        assert "n8n unreachable" in entry["last_error"]
+        assert stats[DEAD] == 1
+        assert entry["dead_at"] is not None
+
+    def test_ttl_indexes_prune_finished_entries(self):
+        """Delivered and dead entries expire; a zero TTL keeps them"""
+
+        async def scenario():
+            outbox = _outbox(lambda request: httpx.Response(200), delivered_ttl=60, dead_ttl=3600)
+            await outbox.ensure_indexes()
+            kept = _outbox(lambda request: httpx.Response(200), delivered_ttl=60, dead_ttl=0)
+            await kept.ensure_indexes()
+            return await outbox.collection.index_information(), await kept.collection.index_information()
+
+        indexes, kept = asyncio.run(scenario())
+        ttls = {index["key"][0][0]: index.get("expireAfterSeconds") for index in indexes.values()}
+        assert ttls["delivered_at"] == 60
+        assert ttls["dead_at"] == 3600
+        assert not any(index["key"][0][0] == "dead_at" for index in kept.values())
+
+
+class TestAnalyzeQueuesWebhook:
+    """The analyze endpoint persists and queues instead of POSTing inline"""
+
+    def test_analyze_returns_with_webhook_pending(self, server, client, diagnostic_payload):
+        async def scenario():
+            response = await client.post("/api/diagnostic/analyze", json=diagnostic_payload)
+            stats = await client.get("/api/webhooks/outbox")
+            saved = await server.db.diagnostics.count_documents({})
+            queued = await server.db.webhook_outbox.find_one({})
+            return response, stats.json(), saved, queued
+
+        response, stats, saved, queued = asyncio.run(scenario())
+        assert response.status_code == 200
+        assert saved == 1
+        assert stats[PENDING] == 1
+        assert queued["url"] == server.WEBHOOK_AUDIT_URL
+        assert queued["payload"]["email"] == "jean@conciergerie.fr"
+        assert queued["payload"]["source"] == "backend_api"
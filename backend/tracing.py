@@ -0,0 +1,268 @@
+"""
+Lightweight request tracing for the analyze pipeline.
+
+Every HTTP request gets a trace (ID taken from an incoming X-Trace-Id header
+or generated, and echoed back in the response). `span(name)` opens a child
+span of whatever span is current; the current span lives in a contextvar, so
+tasks created while handling a request (SSE streams, batches) stay in its
+trace.
+
+Finished spans are handed to an exporter, which writes them as JSON lines to
+a local file or POSTs them in batches to a collector. With `min_duration`,
+only traces whose root span took at least that long are exported (tail
+sampling: keep the slow requests, drop the rest).
+
+Span records:
+    {"traceId", "spanId", "parentId", "name", "start" (unix seconds),
+     "durationMs", "status": "ok"|"error", "error", "attributes"}
+"""
+import abc
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = "x-trace-id"
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class _Trace:
+    """Spans of one trace, held until its root span decides whether it is kept"""
+
+    __slots__ = ("spans", "keep")
+
+    def __init__(self):
+        self.spans = []
+        self.keep: Optional[bool] = None
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "start", "_start_perf", "duration", "error", "_trace", "_root")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], trace: _Trace, root: bool, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self._start_perf = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self._trace = trace
+        self._root = root
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentId": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "durationMs": round(self.duration * 1000, 3),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+class SpanExporter(abc.ABC):
+    """Buffers finished spans and ships them from a background task"""
+
+    def __init__(self, *, flush_interval: float = 5.0, max_buffer: int = 10000):
+        self.flush_interval = flush_interval
+        # Oldest spans are dropped if the destination cannot keep up
+        self._buffer = deque(maxlen=max_buffer)
+        self._task: Optional[asyncio.Task] = None
+
+    def export(self, spans: List[Span]):
+        self._buffer.extend(span.to_dict() for span in spans)
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        records = list(self._buffer)
+        self._buffer.clear()
+        try:
+            await self.write(records)
+        except Exception as e:
+            logger.warning(f"Failed to export {len(records)} span(s): {e}")
+
+    @abc.abstractmethod
+    async def write(self, records: List[dict]):
+        """Ship one batch of span records to the destination"""
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start(self, http_client: Optional[httpx.AsyncClient] = None):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends spans as JSON lines to a local file"""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def _append(self, lines: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    async def write(self, records: List[dict]):
+        lines = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+        await asyncio.to_thread(self._append, lines)
+
+
+class HTTPSpanExporter(SpanExporter):
+    """POSTs batches of spans ({"spans": [...]}) to a collector"""
+
+    def __init__(self, url: str, *, timeout: float = 5.0, transport: Optional[httpx.AsyncBaseTransport] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.timeout = timeout
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        self._owns_http = False
+
+    async def start(self, http_client: Optional[httpx.AsyncClient] = None):
+        """Start flushing, posting through `http_client` (the app's shared pool) if given"""
+        if self._http is None:
+            self._owns_http = http_client is None
+            self._http = http_client or httpx.AsyncClient(timeout=self.timeout, transport=self._transport)
+        await super().start()
+
+    async def stop(self):
+        await super().stop()
+        if self._http is not None:
+            if self._owns_http:
+                await self._http.aclose()
+            self._http = None
+
+    async def write(self, records: List[dict]):
+        response = await self._http.post(
+            self.url,
+            content=json.dumps({"spans": records}, default=str),
+            headers={"Content-Type": "application/json"},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+
+
+class Tracer:
+    def __init__(self):
+        self.exporter: Optional[SpanExporter] = None
+        self.min_duration = 0.0
+
+    def configure(self, exporter: Optional[SpanExporter], min_duration: float = 0.0):
+        self.exporter = exporter
+        self.min_duration = min_duration
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def _finish(self, span: Span):
+        trace = span._trace
+        if span._root:
+            trace.keep = span.duration >= self.min_duration
+            if trace.keep:
+                self.exporter.export(trace.spans + [span])
+            trace.spans = []
+        elif trace.keep is None:
+            trace.spans.append(span)
+        elif trace.keep:
+            # Finished after its request (e.g. a stream that outlived the client)
+            self.exporter.export([span])
+
+    @contextmanager
+    def span(self, name: str, *, trace_id: Optional[str] = None, parent_id: Optional[str] = None, **attributes):
+        """Child of the current span, or a new root when there is none (or `trace_id` is given)"""
+        if not self.enabled:
+            yield None
+            return
+        parent = _current_span.get()
+        if trace_id is None and parent is not None:
+            new = Span(name, parent.trace_id, parent.span_id, parent._trace, False, attributes)
+        else:
+            new = Span(name, trace_id or uuid.uuid4().hex, parent_id, _Trace(), True, attributes)
+        token = _current_span.set(new)
+        try:
+            yield new
+        except BaseException as e:
+            new.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            new.duration = time.perf_counter() - new._start_perf
+            self._finish(new)
+
+
+tracer = Tracer()
+
+
+def span(name: str, **attributes):
+    return tracer.span(name, **attributes)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_context() -> Optional[Dict[str, str]]:
+    """IDs to resume the current trace elsewhere (e.g. in an outbox worker)"""
+    current = _current_span.get()
+    if current is None:
+        return None
+    return {"trace_id": current.trace_id, "span_id": current.span_id}
+
+
+class TracingMiddleware:
+    """ASGI middleware opening the root span of every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(TRACE_HEADER.encode(), b"").decode().lower()
+        trace_id = incoming if _TRACE_ID.match(incoming) else uuid.uuid4().hex
+
+        with tracer.span(f"{scope['method']} {scope['path']}", trace_id=trace_id) as root:
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    root.set("http.status_code", message["status"])
+                    message = {**message, "headers": [*message.get("headers", []), (TRACE_HEADER.encode(), trace_id.encode())]}
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace)
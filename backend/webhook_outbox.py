@@ -0,0 +1,218 @@
+"""
+Durable outbound delivery for the audit webhook.
+
+Payloads are written to a Mongo collection (the outbox) and delivered by
+background workers with a pooled HTTP client. Failed deliveries are retried
+with exponential backoff; once `max_attempts` is exhausted the entry is moved
+to the `dead` state and kept for inspection.
+
+Delivered entries are pruned by a TTL index on `delivered_at` after
+`delivered_ttl` seconds; dead entries are kept longer, `dead_ttl` seconds
+after `dead_at` (0 keeps them forever).
+
+Entry lifecycle: pending -> delivering -> delivered
+                                      \\-> pending (retry) -> ... -> dead
+"""
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import httpx
+from pymongo import ASCENDING, ReturnDocument
+
+from metrics import WEBHOOK_FAILURES
+from tracing import current_context, span
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DELIVERING = "delivering"
+DELIVERED = "delivered"
+DEAD = "dead"
+
+
+class WebhookOutbox:
+    """Mongo-backed outbox with background delivery workers"""
+
+    def __init__(
+        self,
+        collection,
+        *,
+        workers: int = 2,
+        max_attempts: int = 8,
+        base_delay: float = 2.0,
+        max_delay: float = 600.0,
+        timeout: float = 10.0,
+        poll_interval: float = 5.0,
+        delivered_ttl: int = 7 * 24 * 3600,
+        dead_ttl: int = 90 * 24 * 3600,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.collection = collection
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.delivered_ttl = delivered_ttl
+        self.dead_ttl = dead_ttl
+        # An entry stuck in `delivering` longer than this (worker crashed
+        # mid-delivery) is picked up again.
+        self.lease = timedelta(seconds=timeout * 3)
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        self._owns_http = False
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._running = False
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("status", ASCENDING), ("next_attempt_at", ASCENDING)])
+        # Only entries holding the field expire: pending ones never do
+        if self.delivered_ttl > 0:
+            await self.collection.create_index("delivered_at", expireAfterSeconds=self.delivered_ttl)
+        if self.dead_ttl > 0:
+            await self.collection.create_index("dead_at", expireAfterSeconds=self.dead_ttl)
+
+    def _entry(self, url: str, payload: dict, now: datetime) -> dict:
+        return {
+            "_id": str(uuid.uuid4()),
+            "url": url,
+            "payload": payload,
+            "status": PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+            "updated_at": now,
+            "last_error": None,
+            # Deliveries are traced as part of the request that queued them
+            "trace": current_context()
+        }
+
+    async def enqueue(self, url: str, payload: dict) -> str:
+        """Persist a payload for delivery and wake a worker"""
+        entry = self._entry(url, payload, datetime.now(timezone.utc))
+        await self.collection.insert_one(entry)
+        self._wakeup.set()
+        return entry["_id"]
+
+    async def enqueue_many(self, url: str, payloads: List[dict]) -> List[str]:
+        """Persist several payloads with a single write"""
+        if not payloads:
+            return []
+        now = datetime.now(timezone.utc)
+        entries = [self._entry(url, payload, now) for payload in payloads]
+        await self.collection.insert_many(entries, ordered=False)
+        self._wakeup.set()
+        return [entry["_id"] for entry in entries]
+
+    async def start(self, http_client: Optional[httpx.AsyncClient] = None):
+        """Start the workers, posting through `http_client` (the app's shared pool) if given"""
+        if self._running:
+            return
+        self._running = True
+        self._owns_http = http_client is None
+        self._http = http_client or httpx.AsyncClient(timeout=self.timeout, transport=self._transport)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        logger.info(f"Webhook outbox started with {self.workers} worker(s)")
+
+    async def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._owns_http:
+            await self._http.aclose()
+        self._http = None
+
+    async def stats(self) -> Dict[str, int]:
+        counts = {PENDING: 0, DELIVERING: 0, DELIVERED: 0, DEAD: 0}
+        async for row in self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+    async def _run(self):
+        while self._running:
+            try:
+                entry = await self._claim()
+                if entry is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self.deliver(entry)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook outbox worker error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _claim(self) -> Optional[dict]:
+        """Atomically take the oldest due entry so concurrent workers never share one"""
+        now = datetime.now(timezone.utc)
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": PENDING, "next_attempt_at": {"$lte": now}},
+                {"status": DELIVERING, "updated_at": {"$lte": now - self.lease}}
+            ]},
+            {"$set": {"status": DELIVERING, "updated_at": now}},
+            sort=[("next_attempt_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    async def deliver(self, entry: dict):
+        """POST one claimed entry and record the outcome"""
+        attempts = entry["attempts"] + 1
+        error = None
+        trace = entry.get("trace") or {}
+        try:
+            with span(
+                "webhook.deliver",
+                trace_id=trace.get("trace_id"),
+                parent_id=trace.get("span_id"),
+                url=entry["url"],
+                attempt=attempts
+            ) as delivery:
+                response = await self._http.post(entry["url"], json=entry["payload"], timeout=self.timeout)
+                if delivery:
+                    delivery.set("http.status_code", response.status_code)
+            if 200 <= response.status_code < 300:
+                logger.info(f"Webhook sent successfully to {entry['url']}")
+            else:
+                error = f"HTTP {response.status_code}"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+
+        now = datetime.now(timezone.utc)
+        if error is None:
+            update = {"status": DELIVERED, "attempts": attempts, "updated_at": now, "delivered_at": now, "last_error": None}
+        elif attempts >= self.max_attempts:
+            logger.error(f"Webhook {entry['_id']} dead-lettered after {attempts} attempts: {error}")
+            WEBHOOK_FAILURES.labels("dead").inc()
+            update = {"status": DEAD, "attempts": attempts, "updated_at": now, "dead_at": now, "last_error": error}
+        else:
+            WEBHOOK_FAILURES.labels("retry").inc()
+            delay = self._backoff(attempts)
+            logger.warning(f"Webhook {entry['_id']} failed ({error}), retry {attempts}/{self.max_attempts} in {delay:.0f}s")
+            update = {
+                "status": PENDING,
+                "attempts": attempts,
+                "updated_at": now,
+                "next_attempt_at": now + timedelta(seconds=delay),
+                "last_error": error
+            }
+        await self.collection.update_one({"_id": entry["_id"]}, {"$set": update})